@@ -5,6 +5,7 @@ from datetime import datetime
 from mtm.util.VarManager import VarManager
 
 import re
+import threading
 import mtm.util.Util as Util
 
 import mtm.ioc.Container as Container
@@ -65,7 +66,11 @@ class Logger:
     ''' Simple log class to use with build scripts '''
     def __init__(self):
         self._totalStartTime = None
-        self._headingBlocks = []
+
+        # Headings are tracked per thread so that work done on background threads
+        # can use headings without corrupting the heading stack of the main thread
+        self._threadState = threading.local()
+        self._streamLock = threading.RLock()
 
         self.goodPatterns = self._getPatterns('GoodPatterns')
         self.goodMaps = self._getPatternMaps('GoodPatternMaps')
@@ -83,6 +88,16 @@ class Logger:
         self.debugPatterns = self._getPatterns('DebugPatterns')
         self.debugMaps = self._getPatternMaps('DebugPatternMaps')
 
+    @property
+    def _headingBlocks(self):
+        blocks = getattr(self._threadState, 'headingBlocks', None)
+
+        if blocks == None:
+            blocks = []
+            self._threadState.headingBlocks = blocks
+
+        return blocks
+
     @property
     def totalStartTime(self):
         return self._totalStartTime
@@ -133,8 +148,9 @@ class Logger:
 
         newLogType, newMessage = self.classifyMessage(logType, message)
 
-        for stream in self._streams:
-            stream.log(newLogType, newMessage)
+        with self._streamLock:
+            for stream in self._streams:
+                stream.log(newLogType, newMessage)
 
     def _getPatternMaps(self, settingName):
         maps = self._config.tryGetDictionary({}, 'Log', settingName)
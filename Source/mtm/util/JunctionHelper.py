@@ -31,6 +31,15 @@ class JunctionHelper:
 
         return False
 
+    # Returns the path that the given junction points to, or None if it is not a junction
+    def tryGetJunctionTarget(self, linkDir):
+        linkDir = self._varMgr.expand(linkDir)
+
+        if not os.path.isdir(linkDir) or not JunctionUtil.islink(linkDir):
+            return None
+
+        return JunctionUtil.readlink(linkDir)
+
     def makeJunction(self, actualPath, linkPath):
         actualPath = self._varMgr.expandPath(actualPath)
         linkPath = self._varMgr.expandPath(linkPath)
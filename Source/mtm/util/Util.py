@@ -1,6 +1,7 @@
 
 import os
 import stat
+import hashlib
 from mtm.util.Assert import *
 
 def printVisualStudioFriendlyError(msg):
@@ -61,3 +62,17 @@ def formatTimeDelta(seconds):
     msg += '{:.1f}'.format(seconds) + ' seconds'
 
     return msg
+
+def computeFileSha256(filePath, bufferSize = 1024 * 1024):
+    hasher = hashlib.sha256()
+
+    with open(filePath, 'rb') as f:
+        while True:
+            chunk = f.read(bufferSize)
+
+            if not chunk:
+                break
+
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
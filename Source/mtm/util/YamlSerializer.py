@@ -11,7 +11,11 @@ def serialize(obj):
     return yaml.dump(_serializeObj(obj), width=9999999, default_flow_style=False)
 
 def deserialize(yamlStr):
-    return _deserializeObj(yaml.load(yamlStr))
+    return deserializeData(yaml.load(yamlStr))
+
+# Same as deserialize except for yaml that has already been parsed
+def deserializeData(data):
+    return _deserializeObj(data)
 
 def _deserializeObj(data):
     dataType = type(data)
@@ -0,0 +1,227 @@
+
+import os
+import re
+import json
+import sqlite3
+import threading
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.util.Assert import *
+
+# Increment this whenever the database schema changes
+IndexVersion = 1
+
+IndexFileName = 'AssetGuidIndex.sqlite'
+
+_GuidRegex = re.compile(r'^guid:\s*([0-9a-fA-F]+)\s*$', re.MULTILINE)
+
+# Returns the guid in the given contents of a .meta file, or None if it doesn't have one
+def parseGuid(metaText):
+    match = _GuidRegex.search(metaText)
+    return match.group(1).lower() if match else None
+
+class AssetGuidIndex:
+    '''
+    Keeps track of the guid inside every .meta file of every package, so that we can find packages that
+    use the same guid for different assets.  Unity silently gives one of them a new guid when this happens,
+    which breaks any references to it and causes a full re-import
+    The index is updated incrementally - a directory is only listed again when its modification time changes,
+    and a meta file is only read again when its size or modification time changes
+    This is shared between all projects, since package folders are often shared as well
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
+
+    def __init__(self):
+        self._connection = None
+        self._lock = threading.RLock()
+
+    def _getDatabasePath(self):
+        if not self._varMgr.hasKey('ProjenyCacheDir'):
+            return None
+
+        return self._varMgr.expandPath(os.path.join('[ProjenyCacheDir]', IndexFileName))
+
+    def _tryGetConnection(self):
+        if self._connection != None:
+            return self._connection
+
+        dbPath = self._getDatabasePath()
+
+        if dbPath == None:
+            return None
+
+        self._sys.makeMissingDirectoriesInPath(dbPath)
+
+        try:
+            # Other projeny processes (eg. from other open unity projects) can use it at the same time so wait for their writes
+            connection = sqlite3.connect(dbPath, timeout = 30, check_same_thread = False)
+
+            with connection:
+                if connection.execute('PRAGMA user_version').fetchone()[0] != IndexVersion:
+                    connection.execute('DROP TABLE IF EXISTS Dirs')
+                    connection.execute('DROP TABLE IF EXISTS MetaFiles')
+                    connection.execute('PRAGMA user_version = {0}'.format(IndexVersion))
+
+                connection.execute('CREATE TABLE IF NOT EXISTS Dirs (Path TEXT PRIMARY KEY, PackageDir TEXT NOT NULL, Mtime INTEGER NOT NULL, SubDirs TEXT NOT NULL, MetaFiles TEXT NOT NULL)')
+                connection.execute('CREATE TABLE IF NOT EXISTS MetaFiles (Path TEXT PRIMARY KEY, PackageDir TEXT NOT NULL, FileKey TEXT NOT NULL, Guid TEXT)')
+                connection.execute('CREATE INDEX IF NOT EXISTS DirsByPackage ON Dirs (PackageDir)')
+                connection.execute('CREATE INDEX IF NOT EXISTS MetaFilesByPackage ON MetaFiles (PackageDir)')
+        except sqlite3.Error as e:
+            self._log.warn("Failed to open asset guid index at '{0}', packages will be read directly instead.  Details: {1}", dbPath, e)
+            return None
+
+        self._connection = connection
+        return connection
+
+    # Returns a dictionary of guid -> list of asset paths (relative to the package directory) for every
+    # meta file inside the given package directory
+    def getAssetGuids(self, packageDir):
+        packageDir = self._varMgr.expandPath(packageDir)
+
+        with self._lock:
+            connection = self._tryGetConnection()
+
+            if connection == None:
+                return self._groupByGuid(packageDir, self._scanPackage(packageDir, {}, {})[1])
+
+            with connection:
+                return self._groupByGuid(packageDir, self._getMetaFilesInternal(connection, packageDir))
+
+    # Returns a dictionary of guid -> list of (packageDir, assetPath) for every meta file inside the given package directories
+    def getGuidLocations(self, packageDirs):
+        result = {}
+
+        for packageDir in packageDirs:
+            for guid, assetPaths in self.getAssetGuids(packageDir).items():
+                result.setdefault(guid, []).extend((packageDir, x) for x in assetPaths)
+
+        return result
+
+    # Returns a list of (guid, locations) for every guid that is used by more than one asset in the given
+    # package directories, where locations is a list of (packageDir, assetPath)
+    def findCollisions(self, packageDirs):
+        return sorted((guid, locations) for guid, locations in self.getGuidLocations(packageDirs).items() if len(locations) > 1)
+
+    def _groupByGuid(self, packageDir, metaFiles):
+        result = {}
+
+        for metaPath, (fileKey, guid) in metaFiles.items():
+            if guid == None:
+                continue
+
+            # Strip the '.meta' to get the path of the asset itself
+            result.setdefault(guid, []).append(os.path.relpath(metaPath[:-5], packageDir))
+
+        for assetPaths in result.values():
+            assetPaths.sort()
+
+        return result
+
+    # Returns a dictionary of meta file path -> (fileKey, guid)
+    def _getMetaFilesInternal(self, connection, packageDir):
+        cachedDirs = {}
+        for path, mtime, subDirsJson, metaFilesJson in connection.execute('SELECT Path, Mtime, SubDirs, MetaFiles FROM Dirs WHERE PackageDir = ?', (packageDir,)):
+            cachedDirs[path] = (mtime, json.loads(subDirsJson), json.loads(metaFilesJson))
+
+        cachedMetaFiles = {}
+        for path, fileKey, guid in connection.execute('SELECT Path, FileKey, Guid FROM MetaFiles WHERE PackageDir = ?', (packageDir,)):
+            cachedMetaFiles[path] = (fileKey, guid)
+
+        dirs, metaFiles = self._scanPackage(packageDir, cachedDirs, cachedMetaFiles)
+
+        if dirs != cachedDirs:
+            connection.execute('DELETE FROM Dirs WHERE PackageDir = ?', (packageDir,))
+            connection.executemany('INSERT INTO Dirs (Path, PackageDir, Mtime, SubDirs, MetaFiles) VALUES (?, ?, ?, ?, ?)',
+                [(path, packageDir, entry[0], json.dumps(entry[1]), json.dumps(entry[2])) for path, entry in dirs.items()])
+
+        if metaFiles != cachedMetaFiles:
+            connection.execute('DELETE FROM MetaFiles WHERE PackageDir = ?', (packageDir,))
+            connection.executemany('INSERT INTO MetaFiles (Path, PackageDir, FileKey, Guid) VALUES (?, ?, ?, ?)',
+                [(path, packageDir, entry[0], entry[1]) for path, entry in metaFiles.items()])
+
+        return metaFiles
+
+    # Returns a tuple of (dirs, metaFiles) for everything inside the given package directory
+    # dirs is a dictionary of directory path -> (mtime, subDirNames, metaFileNames)
+    # metaFiles is a dictionary of meta file path -> (fileKey, guid)
+    # cachedDirs and cachedMetaFiles are the results of the previous scan, if any
+    def _scanPackage(self, packageDir, cachedDirs, cachedMetaFiles):
+        dirs = {}
+        metaFiles = {}
+
+        if not os.path.isdir(packageDir):
+            return (dirs, metaFiles)
+
+        dirsToScan = [packageDir]
+
+        while dirsToScan:
+            dirPath = dirsToScan.pop()
+
+            try:
+                dirMtime = os.stat(dirPath).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+            cachedDir = cachedDirs.get(dirPath)
+
+            # Adding, removing or renaming a file changes the modification time of the directory it is in
+            if cachedDir != None and cachedDir[0] == dirMtime:
+                dirEntry = cachedDir
+            else:
+                dirEntry = self._listDirectory(dirPath, dirMtime)
+
+            dirs[dirPath] = dirEntry
+
+            for metaFileName in dirEntry[2]:
+                metaPath = os.path.join(dirPath, metaFileName)
+                metaFile = self._readMetaFile(metaPath, cachedMetaFiles.get(metaPath))
+
+                if metaFile != None:
+                    metaFiles[metaPath] = metaFile
+
+            dirsToScan.extend(os.path.join(dirPath, x) for x in dirEntry[1])
+
+        return (dirs, metaFiles)
+
+    def _listDirectory(self, dirPath, dirMtime):
+        subDirNames = []
+        metaFileNames = []
+
+        with os.scandir(dirPath) as entries:
+            for entry in entries:
+                # Unity ignores anything that is hidden or ends with ~
+                if entry.name.startswith('.') or entry.name.endswith('~'):
+                    continue
+
+                if entry.is_dir():
+                    subDirNames.append(entry.name)
+                elif entry.name.endswith('.meta'):
+                    metaFileNames.append(entry.name)
+
+        # Sort so that the stored entry is the same no matter what order the file system lists them in
+        return (dirMtime, sorted(subDirNames), sorted(metaFileNames))
+
+    # Returns (fileKey, guid), or None if the file no longer exists
+    # cachedEntry is the result from the previous scan, if any
+    def _readMetaFile(self, metaPath, cachedEntry):
+        try:
+            fileStat = os.stat(metaPath)
+        except FileNotFoundError:
+            return None
+
+        fileKey = '{0}:{1}'.format(fileStat.st_size, fileStat.st_mtime_ns)
+
+        if cachedEntry != None and cachedEntry[0] == fileKey:
+            return cachedEntry
+
+        try:
+            with open(metaPath, 'r', encoding='utf-8', errors='replace') as f:
+                return (fileKey, parseGuid(f.read()))
+        except OSError as e:
+            self._log.debug("Could not read meta file '{0}'.  Details: {1}", metaPath, e)
+            return (fileKey, None)
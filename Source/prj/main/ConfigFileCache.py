@@ -0,0 +1,75 @@
+
+import os
+import copy
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.YamlConfigLoader import loadYamlFile
+
+from prj.main.ProjectSchemaLoader import getPathStamp
+
+from mtm.util.Assert import *
+
+class ConfigFileCache:
+    '''
+    Keeps the parsed contents of every project and package yaml file that has been read during this run,
+    so that operations that touch every project (eg. updating the links for all projects, or generating
+    the change project menu) only parse each file once
+    Every entry is stored with the size and modification time of the file, and the file is parsed again
+    if those change (eg. when a release is re-installed over a package during the run)
+    Anything in Projeny that writes one of these files should still call invalidate (or clear) afterwards,
+    since a change within the resolution of the file system timestamps would otherwise be missed
+    '''
+    _varMgr = Inject('VarManager')
+
+    def __init__(self):
+        # Maps path -> (stamp, parsed yaml data)
+        # The stamp is None if the file does not exist, and the data is None if it doesn't exist or is empty
+        self._entries = {}
+
+    # Returns the parsed contents of the given yaml file, which is None if the file is empty
+    # Callers are free to modify the result since it is always a copy
+    def loadYamlFile(self, path):
+        stamp, data = self._getEntry(path)
+        assertThat(stamp != None, "Could not find config file at '{0}'", path)
+        return copy.deepcopy(data)
+
+    # Same as loadYamlFilesThatExist in YamlConfigLoader
+    # If stamps is given then it is filled in with path -> the stamp of each file at the time its
+    # contents were read (see getPathStamp), including the ones that do not exist
+    def loadYamlFilesThatExist(self, *paths, stamps = None):
+        configs = []
+
+        for path in paths:
+            stamp, data = self._getEntry(path)
+
+            if stamps != None:
+                stamps[path] = stamp
+
+            if data != None:
+                configs.append(copy.deepcopy(data))
+
+        return configs
+
+    def _getEntry(self, path):
+        path = self._varMgr.expandPath(path)
+
+        # Get the stamp before reading, so that if the file changes while we read it the stamp is the one
+        # that is out of date and the file is just read again next time
+        stamp = getPathStamp(path)
+        entry = self._entries.get(path)
+
+        if entry == None or entry[0] != stamp:
+            entry = (stamp, loadYamlFile(path) if stamp != None and os.path.isfile(path) else None)
+            self._entries[path] = entry
+
+        return entry
+
+    # Should be called whenever the given file is written or deleted
+    def invalidate(self, path):
+        self._entries.pop(self._varMgr.expandPath(path), None)
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,117 @@
+
+from mtm.util.Assert import *
+
+class DependencyGraph:
+    '''
+    Dependency graph between packages, built with a single topological sort
+    Dependencies on names that are not in the graph (eg. packages that are skipped for the current platform) are kept
+    in the dependency lists but are never followed
+    The transitive dependencies of every package are stored as a bitset over the package indices, which keeps them
+    small even for thousands of packages, and are only converted to lists of names when asked for
+    '''
+    def __init__(self, dependencies):
+        # dependencies is a dictionary of name -> list of dependency names
+        self._names = list(dependencies.keys())
+        self._indices = { name: i for i, name in enumerate(self._names) }
+
+        # Give every dependency that is not in the graph an index as well, so that they can be included in the closures
+        for dependNames in dependencies.values():
+            for dependName in dependNames:
+                if dependName not in self._indices:
+                    self._indices[dependName] = len(self._names)
+                    self._names.append(dependName)
+
+        self._numNodes = len(dependencies)
+
+        # Only the first _numNodes entries have edges
+        self._edges = [[self._indices[x] for x in dependencies[name]] for name in self._names[:self._numNodes]]
+
+        self._reverseEdges = [[] for _ in range(self._numNodes)]
+
+        for i, dependIndices in enumerate(self._edges):
+            for dependIndex in dependIndices:
+                if dependIndex < self._numNodes:
+                    self._reverseEdges[dependIndex].append(i)
+
+        self._order = self._sortTopologically()
+        self._closures = self._calculateClosures()
+
+    # Returns the names in the graph ordered so that every package comes after all of its dependencies
+    def getSortedNames(self):
+        return [self._names[x] for x in self._order]
+
+    # Returns the names of all direct and indirect dependencies of the given package, in the same order as the graph
+    def getAllDependencies(self, name):
+        bits = self._closures[self._indices[name]]
+
+        # Reading the binary string is linear in the number of packages, unlike looking up each set bit one at a time
+        return [self._names[i] for i, bit in enumerate(reversed(bin(bits)[2:])) if bit == '1']
+
+    # Returns the set of names in the graph that directly or indirectly depend on any of the given names
+    def getAllDependents(self, names):
+        found = [False] * self._numNodes
+        stack = [self._indices[x] for x in names if x in self._indices and self._indices[x] < self._numNodes]
+
+        while stack:
+            for dependentIndex in self._reverseEdges[stack.pop()]:
+                if not found[dependentIndex]:
+                    found[dependentIndex] = True
+                    stack.append(dependentIndex)
+
+        return set(self._names[i] for i in range(self._numNodes) if found[i])
+
+    def _sortTopologically(self):
+        # 0 = not visited, 1 = in progress, 2 = done
+        states = [0] * self._numNodes
+        order = []
+
+        for rootIndex in range(self._numNodes):
+            if states[rootIndex] != 0:
+                continue
+
+            # Iterative depth first search so that long dependency chains do not hit the recursion limit
+            # Each entry is (node index, position of the next dependency to visit)
+            stack = [(rootIndex, 0)]
+            states[rootIndex] = 1
+
+            while stack:
+                nodeIndex, edgePos = stack[-1]
+                edges = self._edges[nodeIndex]
+
+                if edgePos == len(edges):
+                    stack.pop()
+                    states[nodeIndex] = 2
+                    order.append(nodeIndex)
+                    continue
+
+                stack[-1] = (nodeIndex, edgePos + 1)
+                dependIndex = edges[edgePos]
+
+                if dependIndex >= self._numNodes or states[dependIndex] == 2:
+                    continue
+
+                if states[dependIndex] == 1:
+                    cycle = [self._names[x[0]] for x in stack[[x[0] for x in stack].index(dependIndex):]] + [self._names[dependIndex]]
+                    assertThat(False, "Found circular dependency when processing package {0}.  Dependency list: {1}", self._names[dependIndex], ' -> '.join(cycle))
+
+                states[dependIndex] = 1
+                stack.append((dependIndex, 0))
+
+        return order
+
+    def _calculateClosures(self):
+        closures = [0] * self._numNodes
+
+        # Dependencies always come first in the topological order so their closures are already complete
+        for nodeIndex in self._order:
+            bits = 0
+
+            for dependIndex in self._edges[nodeIndex]:
+                bits |= 1 << dependIndex
+
+                if dependIndex < self._numNodes:
+                    bits |= closures[dependIndex]
+
+            closures[nodeIndex] = bits
+
+        return closures
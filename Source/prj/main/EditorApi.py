@@ -5,6 +5,7 @@ from mtm.log.LogStreamFile import LogStreamFile
 import prj.main.Prj as Prj
 
 import mtm.util.YamlSerializer as YamlSerializer
+import prj.reg.ReleaseSourceManager as ReleaseSourceManager
 from mtm.log.LogStreamConsoleHeadingsOnly import LogStreamConsoleHeadingsOnly
 import mtm.ioc.Container as Container
 from mtm.ioc.Inject import Inject
@@ -99,6 +100,23 @@ class Runner:
                 self._outputContent('---\n')
                 self._outputContent(YamlSerializer.serialize(release) + '\n')
 
+        elif self._requestId == 'searchReleases':
+            query = self._param1
+            offset = int(self._param2) if self._param2 else 0
+            limit = int(self._param3) if self._param3 else ReleaseSourceManager.DefaultSearchLimit
+
+            totalNumMatches, releases = self._releaseSourceManager.searchReleases(query, offset, limit)
+
+            self._log.info("Found {0} releases matching '{1}', returning {2} starting at {3}", totalNumMatches, query, len(releases), offset)
+
+            # The first document has the total so that the editor can show how many pages there are
+            self._outputContent('---\n')
+            self._outputContent(YamlSerializer.serialize({ 'totalNumMatches': totalNumMatches, 'offset': offset }) + '\n')
+
+            for release in releases:
+                self._outputContent('---\n')
+                self._outputContent(YamlSerializer.serialize(release) + '\n')
+
         elif self._requestId == 'installRelease':
             releaseName = self._param1
             packageRoot = self._param2
@@ -110,6 +128,20 @@ class Runner:
             self._log.info("Installing release '{0}' into package dir '{1}' with version code '{2}'", releaseName, packageRoot, versionCode)
             self._releaseSourceManager.installReleaseById(releaseName, self._project, packageRoot, versionCode, True)
 
+        elif self._requestId == 'installReleases':
+            packageRoot = self._param1
+
+            # param2 is a list of releases in the form 'ID:VERSION_CODE' separated by '|'
+            # We use '|' since it can't appear in the file names that ids are usually based on
+            releaseRequests = []
+            for value in self._param2.split('|'):
+                releaseId, separator, versionCode = value.rpartition(':')
+                assertThat(separator, "Invalid release '{0}' given to installReleases - expected 'ID:VERSION_CODE'", value)
+                releaseRequests.append((releaseId, versionCode))
+
+            self._log.info("Installing {0} releases into package dir '{1}'", len(releaseRequests), packageRoot)
+            self._releaseSourceManager.installReleases(self._project, packageRoot, releaseRequests, True)
+
         elif self._requestId == 'createProject':
             newProjName = self._param1
             duplicateSettings = (self._param2 == 'True')
@@ -131,7 +163,7 @@ def main():
     parser.add_argument("configPath", help="")
     parser.add_argument("project", help="")
     parser.add_argument('platform', type=str, choices=[x.lower() for x in Platforms.All], help='')
-    parser.add_argument('requestId', type=str, choices=['createProject', 'installRelease', 'listReleases', 'listProjects', 'listPackages', 'updateLinks', 'updateCustomSolution', 'openCustomSolution', 'openUnity', 'getPathVars'], help='')
+    parser.add_argument('requestId', type=str, choices=['createProject', 'installRelease', 'installReleases', 'listReleases', 'searchReleases', 'listProjects', 'listPackages', 'updateLinks', 'updateCustomSolution', 'openCustomSolution', 'openUnity', 'getPathVars'], help='')
     parser.add_argument("param1", nargs='?', help="")
     parser.add_argument("param2", nargs='?', help="")
     parser.add_argument("param3", nargs='?', help="")
@@ -0,0 +1,186 @@
+
+import os
+import json
+import sqlite3
+import threading
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+import mtm.util.YamlSerializer as YamlSerializer
+import prj.reg.PackageInfo as PackageInfoUtil
+from prj.reg.PackageInfo import PackageInfo
+
+from prj.main.PackageManager import InstallInfoFileName
+
+from mtm.util.Assert import *
+
+# Increment this whenever the database schema or the format of the stored install infos changes
+InventoryVersion = 1
+
+InventoryFileName = 'PackageInventory.sqlite'
+
+class PackageInventory:
+    '''
+    Keeps track of the packages inside every package folder along with their install info, so that listing
+    the installed packages does not need to list every folder and parse every ProjenyInstall.yaml again
+    Entries are validated lazily - a package folder is only listed again when its modification time changes,
+    and an install info file is only parsed again when its size or modification time changes
+    This is shared between all projects, since package folders are often shared as well
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
+
+    def __init__(self):
+        self._connection = None
+        # Releases are installed on multiple threads so guard access to the connection
+        self._lock = threading.RLock()
+
+    def _getDatabasePath(self):
+        if not self._varMgr.hasKey('ProjenyCacheDir'):
+            return None
+
+        return self._varMgr.expandPath(os.path.join('[ProjenyCacheDir]', InventoryFileName))
+
+    def _tryGetConnection(self):
+        if self._connection != None:
+            return self._connection
+
+        dbPath = self._getDatabasePath()
+
+        if dbPath == None:
+            return None
+
+        self._sys.makeMissingDirectoriesInPath(dbPath)
+
+        try:
+            # Other projeny processes (eg. from other open unity projects) can use it at the same time so wait for their writes
+            connection = sqlite3.connect(dbPath, timeout = 30, check_same_thread = False)
+
+            with connection:
+                if connection.execute('PRAGMA user_version').fetchone()[0] != InventoryVersion:
+                    connection.execute('DROP TABLE IF EXISTS Folders')
+                    connection.execute('DROP TABLE IF EXISTS Packages')
+                    connection.execute('PRAGMA user_version = {0}'.format(InventoryVersion))
+
+                connection.execute('CREATE TABLE IF NOT EXISTS Folders (Path TEXT PRIMARY KEY, Mtime INTEGER NOT NULL)')
+                connection.execute('CREATE TABLE IF NOT EXISTS Packages (FolderPath TEXT NOT NULL, Name TEXT NOT NULL, InstallInfoKey TEXT, InstallInfo TEXT, PRIMARY KEY (FolderPath, Name))')
+        except sqlite3.Error as e:
+            self._log.warn("Failed to open package inventory at '{0}', package folders will be read directly instead.  Details: {1}", dbPath, e)
+            return None
+
+        self._connection = connection
+        return connection
+
+    # Returns a list of PackageInfo for every package directory inside the given package folder
+    def getPackages(self, folderPath):
+        folderPath = self._varMgr.expandPath(folderPath)
+
+        with self._lock:
+            connection = self._tryGetConnection()
+
+            if connection == None:
+                return [self._readPackage(folderPath, x, None)[0] for x in self._listPackageNames(folderPath)]
+
+            with connection:
+                return self._getPackagesInternal(connection, folderPath, False)
+
+    # Forces the given package folder to be read again, eg. after installing or deleting packages
+    def updateFolder(self, folderPath):
+        folderPath = self._varMgr.expandPath(folderPath)
+
+        with self._lock:
+            connection = self._tryGetConnection()
+
+            if connection != None:
+                with connection:
+                    self._getPackagesInternal(connection, folderPath, True)
+
+    def _getPackagesInternal(self, connection, folderPath, forceRefresh):
+        if not os.path.isdir(folderPath):
+            connection.execute('DELETE FROM Folders WHERE Path = ?', (folderPath,))
+            connection.execute('DELETE FROM Packages WHERE FolderPath = ?', (folderPath,))
+            return []
+
+        folderMtime = os.stat(folderPath).st_mtime_ns
+
+        row = connection.execute('SELECT Mtime FROM Folders WHERE Path = ?', (folderPath,)).fetchone()
+
+        cachedEntries = {}
+        for name, installInfoKey, installInfoJson in connection.execute('SELECT Name, InstallInfoKey, InstallInfo FROM Packages WHERE FolderPath = ?', (folderPath,)):
+            cachedEntries[name] = (installInfoKey, installInfoJson)
+
+        # Adding, removing or renaming a package changes the modification time of the folder
+        if not forceRefresh and row != None and row[0] == folderMtime:
+            packageNames = sorted(cachedEntries.keys())
+        else:
+            packageNames = self._listPackageNames(folderPath)
+
+        results = []
+        newEntries = {}
+
+        for packageName in packageNames:
+            packageInfo, entry = self._readPackage(folderPath, packageName, None if forceRefresh else cachedEntries.get(packageName))
+
+            if packageInfo == None:
+                # Removed since we last listed the folder
+                continue
+
+            results.append(packageInfo)
+            newEntries[packageName] = entry
+
+        if newEntries != cachedEntries:
+            connection.execute('DELETE FROM Packages WHERE FolderPath = ?', (folderPath,))
+            connection.executemany('INSERT INTO Packages (FolderPath, Name, InstallInfoKey, InstallInfo) VALUES (?, ?, ?, ?)',
+                [(folderPath, name, entry[0], entry[1]) for name, entry in newEntries.items()])
+
+        if row == None or row[0] != folderMtime:
+            connection.execute('INSERT OR REPLACE INTO Folders (Path, Mtime) VALUES (?, ?)', (folderPath, folderMtime))
+
+        return results
+
+    def _listPackageNames(self, folderPath):
+        if not self._sys.directoryExists(folderPath):
+            return []
+
+        # Sort so that the order is the same whether or not the folder was listed again
+        # Hidden directories are never packages (eg. the staging directories used while extracting releases)
+        return sorted(x for x in self._sys.walkDir(folderPath) if not x.startswith('.') and self._sys.IsDir(os.path.join(folderPath, x)))
+
+    # Returns a tuple of (packageInfo, (installInfoKey, installInfoJson))
+    # cachedEntry is the stored value of the second part, if any
+    def _readPackage(self, folderPath, packageName, cachedEntry):
+        packageDirPath = os.path.join(folderPath, packageName)
+
+        if not os.path.isdir(packageDirPath):
+            return (None, None)
+
+        installInfoFilePath = os.path.join(packageDirPath, InstallInfoFileName)
+
+        packageInfo = PackageInfo()
+        packageInfo.name = packageName
+
+        try:
+            fileStat = os.stat(installInfoFilePath)
+        except FileNotFoundError:
+            return (packageInfo, (None, None))
+
+        installInfoKey = '{0}:{1}'.format(fileStat.st_size, fileStat.st_mtime_ns)
+
+        if cachedEntry != None and cachedEntry[0] == installInfoKey and cachedEntry[1] != None:
+            packageInfo.installInfo = PackageInfoUtil.installInfoFromJsonDict(json.loads(cachedEntry[1]))
+            return (packageInfo, cachedEntry)
+
+        yamlData = YamlSerializer.deserialize(self._sys.readFileAsText(installInfoFilePath))
+        packageInfo.installInfo = PackageInfoUtil.installInfoFromYamlData(yamlData)
+
+        try:
+            installInfoJson = json.dumps(PackageInfoUtil.installInfoToJsonDict(packageInfo.installInfo), separators=(',', ':'))
+        except Exception as e:
+            # Still return it, but it will be parsed from yaml every time
+            self._log.debug("Could not store install info for package '{0}' in package inventory.  Details: {1}", packageDirPath, e)
+            return (packageInfo, (None, None))
+
+        return (packageInfo, (installInfoKey, installInfoJson))
@@ -0,0 +1,79 @@
+
+import os
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.util.Assert import *
+
+class PackageLocationIndex:
+    '''
+    Keeps the list of packages inside each package folder for the rest of the run, so that finding a package
+    only needs a dictionary lookup instead of checking for it in every package folder
+    Each folder is listed with a single scandir, and listed again whenever its modification time changes
+    (eg. after installing or deleting a package)
+    '''
+    _varMgr = Inject('VarManager')
+
+    def __init__(self):
+        # Maps expanded folder path -> (folder mtime, package names, dictionary of normalized package name -> package directory)
+        self._folders = {}
+
+    # Returns the full path to the given package, or None if it is not in any of the given package folders
+    # When the package exists in more than one folder, the first one wins
+    def tryGetPackageDir(self, packageFolders, packageName):
+        key = os.path.normcase(packageName)
+
+        for packageFolder in packageFolders:
+            packageDir = self._getFolderEntries(packageFolder)[1].get(key)
+
+            if packageDir != None:
+                return packageDir
+
+        return None
+
+    # Returns the names of the packages in each of the given folders, in order
+    def getAllPackageNames(self, packageFolders):
+        results = []
+
+        for packageFolder in packageFolders:
+            results.extend(self._getFolderEntries(packageFolder)[0])
+
+        return results
+
+    # Returns a tuple of (package names, dictionary of normalized package name -> package directory)
+    def _getFolderEntries(self, packageFolder):
+        folderPath = self._varMgr.expandPath(packageFolder)
+
+        try:
+            folderMtime = os.stat(folderPath).st_mtime_ns
+        except OSError:
+            self._folders.pop(folderPath, None)
+            return ([], {})
+
+        cached = self._folders.get(folderPath)
+
+        if cached != None and cached[0] == folderMtime:
+            return cached[1:]
+
+        names = []
+        entries = {}
+
+        with os.scandir(folderPath) as dirEntries:
+            for entry in dirEntries:
+                # Hidden directories are never packages (eg. the staging directories used while extracting releases)
+                if entry.name.startswith('.') or not entry.is_dir():
+                    continue
+
+                packageDir = os.path.join(folderPath, entry.name)
+
+                # Match the behaviour of expandPath, which resolves links to the real directory
+                if entry.is_symlink() or (hasattr(entry, 'is_junction') and entry.is_junction()):
+                    packageDir = os.path.realpath(packageDir)
+
+                names.append(entry.name)
+                entries[os.path.normcase(entry.name)] = packageDir
+
+        self._folders[folderPath] = (folderMtime, names, entries)
+        return (names, entries)
@@ -52,6 +52,10 @@ class PackageManager:
     _commonSettings = Inject('CommonSettings')
     _projectConfigChanger = Inject('ProjectConfigChanger')
     _unityEditorMenuGenerator = Inject('UnityEditorMenuGenerator')
+    _packageInventory = Inject('PackageInventory')
+    _assetGuidIndex = Inject('AssetGuidIndex')
+    _configFileCache = Inject('ConfigFileCache')
+    _packageLocationIndex = Inject('PackageLocationIndex')
 
     def projectExists(self, projectName):
         return self._sys.directoryExists('[UnityProjectsDir]/{0}'.format(projectName))
@@ -111,7 +115,9 @@ class PackageManager:
             newUnityPackagesDir = os.path.join(projDirPath, 'UnityPackages')
             self._sys.createDirectory(newUnityPackagesDir)
 
-            with self._sys.openOutputFile(os.path.join(projDirPath, ProjectConfigFileName)) as outFile:
+            projConfigPath = os.path.join(projDirPath, ProjectConfigFileName)
+
+            with self._sys.openOutputFile(projConfigPath) as outFile:
                 outFile.write(
 """
 ProjectSettingsPath: '{0}'
@@ -120,6 +126,8 @@ UnityPackagesPath: '{1}'
     # Uncomment and Add package names here
 """.format(settingsPath, unityPackagesPath))
 
+            self._configFileCache.invalidate(projConfigPath)
+
             self.updateProjectJunctions(projName, platform)
             self.updateLinksForAllProjects()
 
@@ -195,23 +203,7 @@ UnityPackagesPath: '{1}'
             folderInfo = PackageFolderInfo()
             folderInfo.path = packageFolder
 
-            if self._sys.directoryExists(packageFolder):
-                for packageName in self._sys.walkDir(packageFolder):
-                    packageDirPath = os.path.join(packageFolder, packageName)
-
-                    if not self._sys.IsDir(packageDirPath):
-                        continue
-
-                    installInfoFilePath = os.path.join(packageDirPath, InstallInfoFileName)
-
-                    packageInfo = PackageInfo()
-                    packageInfo.name = packageName
-
-                    if self._sys.fileExists(installInfoFilePath):
-                        installInfo = YamlSerializer.deserialize(self._sys.readFileAsText(installInfoFilePath))
-                        packageInfo.installInfo = installInfo
-
-                    folderInfo.packages.append(packageInfo)
+            folderInfo.packages = self._packageInventory.getPackages(packageFolder)
 
             folderInfos.append(folderInfo)
 
@@ -226,22 +218,18 @@ UnityPackagesPath: '{1}'
 
             self.clearProjectGeneratedFiles(projName)
             self._sys.deleteDirectory(fullPath)
+            self._configFileCache.clear()
             self.updateLinksForAllProjects()
 
+    def getPackageFolders(self, projectName):
+        self.setPathsForProject(projectName)
+        return self._schemaLoader.loadProjectConfig(projectName).packageFolders
+
     def getAllPackageNames(self, projectName):
-        results = []
         self.setPathsForProject(projectName)
         projConfig = self._schemaLoader.loadProjectConfig(projectName)
 
-        for packageFolder in projConfig.packageFolders:
-            if not self._sys.directoryExists(packageFolder):
-                continue
-
-            for name in self._sys.walkDir(packageFolder):
-                if self._sys.IsDir(os.path.join(packageFolder, name)):
-                    results.append(name)
-
-        return results
+        return self._packageLocationIndex.getAllPackageNames(projConfig.packageFolders)
 
     def getAllProjectNames(self):
         assertThat(self._varMgr.hasKey('UnityProjectsDir'), "Could not find 'UnityProjectsDir' in PathVars.  Have you set up your {0} file?", ConfigFileName)
@@ -291,7 +279,40 @@ UnityPackagesPath: '{1}'
         self._sys.copyFile('[PlaceholderFile2]', placeholderOutPath2)
         self._sys.copyFile('[PlaceholderFile2].meta', placeholderOutPath2 + ".meta")
 
+    # Fails if any assets in the packages of the given project share the same guid
+    def checkAssetGuids(self, projectName, platform):
+        with self._log.heading('Checking asset guids for project {0}'.format(projectName)):
+            self.setPathsForProjectPlatform(projectName, platform)
+            schema = self._schemaLoader.loadSchema(projectName, platform)
+
+            collisions = self._findGuidCollisionsForSchema(schema)
+
+            assertThat(len(collisions) == 0, "Found {0} asset guid(s) that are used by more than one asset in project '{1}'.  See above for details", len(collisions), projectName)
+
+            self._log.good('Found no duplicate asset guids in project "{0}"'.format(projectName))
+
+    # Logs a warning for every guid that is used by more than one asset in the packages of the given schema
+    # Unity would otherwise silently assign one of them a new guid, breaking any references to it
+    def _findGuidCollisionsForSchema(self, schema):
+        packageDirs = [self._varMgr.expandPath(x.dirPath) for x in schema.packages.values()]
+
+        # Missing packages are reported when the links are created
+        collisions = self._assetGuidIndex.findCollisions([x for x in packageDirs if os.path.isdir(x)])
+
+        for guid, locations in collisions:
+            self._log.warn("Found guid '{0}' used by more than one asset:\n  {1}", guid,
+                "\n  ".join([os.path.join(os.path.basename(packageDir), assetPath) for packageDir, assetPath in locations]))
+
+        return collisions
+
     def _updateDirLinksForSchema(self, schema):
+        # The guid index only re-reads the .meta files that changed since the last run, so this is cheap
+        # Collisions are always logged, and only fail the update when we are asked to
+        collisions = self._findGuidCollisionsForSchema(schema)
+
+        assertThat(len(collisions) == 0 or not self._config.tryGetBool(False, 'FailOnAssetGuidCollisions'),
+            "Found {0} asset guid(s) that are used by more than one asset in project '{1}'.  See above for details", len(collisions), schema.name)
+
         self._removeProjectPlatformJunctions()
 
         self._sys.deleteDirectoryIfExists('[PluginsDir]/Projeny')
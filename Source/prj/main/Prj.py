@@ -21,10 +21,17 @@ from prj.main.VisualStudioSolutionGenerator import VisualStudioSolutionGenerator
 from prj.main.VisualStudioHelper import VisualStudioHelper
 from prj.main.ProjenyVisualStudioHelper import ProjenyVisualStudioHelper
 from prj.main.ProjectSchemaLoader import ProjectSchemaLoader
+from prj.main.ProjectSchemaCache import ProjectSchemaCache
+from prj.main.ConfigFileCache import ConfigFileCache
+from prj.main.PackageLocationIndex import PackageLocationIndex
 from mtm.util.ScriptRunner import ScriptRunner
 from mtm.util.CommonSettings import CommonSettings
 from prj.reg.UnityPackageExtractor import UnityPackageExtractor
 from prj.reg.UnityPackageAnalyzer import UnityPackageAnalyzer
+from prj.reg.ReleaseInfoCache import ReleaseInfoCache
+from prj.reg.ReleaseFolderScanner import ReleaseFolderScanner
+from prj.reg.ReleaseDownloadCache import ReleaseDownloadCache
+from prj.reg.ReleaseStore import ReleaseStore
 from prj.main.UnityEditorMenuGenerator import UnityEditorMenuGenerator
 
 import traceback
@@ -42,6 +49,8 @@ from mtm.util.Assert import *
 
 from mtm.util.PlatformUtil import Platforms
 from prj.main.PackageManager import PackageManager
+from prj.main.PackageInventory import PackageInventory
+from prj.main.AssetGuidIndex import AssetGuidIndex
 
 import mtm.ioc.Container as Container
 from mtm.ioc.Inject import Inject
@@ -74,11 +83,20 @@ def addArguments(parser):
 
     # Packages
     parser.add_argument('-lpa', '--listPackages', action='store_true', help='Lists all the directories found in the UnityPackages directory')
+    parser.add_argument('-cag', '--checkAssetGuids', action='store_true', help='Lists any assets in the packages of the given project that share the same guid, and fails if there are any')
 
     parser.add_argument('-il', '--initLinks', action='store_true', help="This is the same as -ul except it will only update the directories if they haven't been updated at all yet")
 
     # Releases
     parser.add_argument('-lr', '--listReleases', action='store_true', help='Lists all releases found from all release sources')
+    parser.add_argument('-ir', '--installReleases', metavar='RELEASE_ID[:VERSION_CODE]', type=str, nargs='+', help='Installs the given releases into the given project.  If the version code is left out then the latest version is installed.  All the releases are downloaded and extracted in parallel')
+    parser.add_argument('-lrc', '--listReleaseContents', metavar='RELEASE_ID[:VERSION_CODE]', type=str, help='Lists the path and size of every asset in the given release without installing it.  If the version code is left out then the latest version is used')
+    parser.add_argument('-sr', '--searchReleases', metavar='QUERY', type=str, help='Lists the releases whose name, publisher, category or version match the given words, with the best matches first')
+    parser.add_argument('-srp', '--searchPage', metavar='PAGE', type=int, default=1, help='The page of results to show when using -sr')
+    parser.add_argument('-srn', '--searchPageSize', metavar='PAGE_SIZE', type=int, default=20, help='The number of results per page when using -sr')
+    parser.add_argument('-lor', '--listOutdatedReleases', action='store_true', help='Lists the packages in every project that were installed from a release that has a newer version available')
+    parser.add_argument('-uor', '--upgradeOutdatedReleases', action='store_true', help='Upgrades every package in every project that was installed from a release that has a newer version available')
+    parser.add_argument('-ipr', '--installPackageRoot', metavar='PACKAGE_ROOT', type=str, help='The directory to install releases into when using -ir.  If unspecified, the first of the PackageFolders for the given project is used')
 
     # Project manipulation
     parser.add_argument('-prapp', '--projectAddPackagePlugins', metavar='PACKAGE_NAME', type=str, help="Adds the given package to the AssetsFolder list in {0} for the given project".format(ProjectConfigFileName))
@@ -137,16 +155,25 @@ def installBindings(mainConfigPath):
     Container.bind('UnityHelper').toSingle(UnityHelper)
     Container.bind('ScriptRunner').toSingle(ScriptRunner)
     Container.bind('PackageManager').toSingle(PackageManager)
+    Container.bind('PackageInventory').toSingle(PackageInventory)
+    Container.bind('AssetGuidIndex').toSingle(AssetGuidIndex)
     Container.bind('ProcessRunner').toSingle(ProcessRunner)
     Container.bind('JunctionHelper').toSingle(JunctionHelper)
     Container.bind('VisualStudioSolutionGenerator').toSingle(VisualStudioSolutionGenerator)
     Container.bind('VisualStudioHelper').toSingle(VisualStudioHelper)
     Container.bind('ProjenyVisualStudioHelper').toSingle(ProjenyVisualStudioHelper)
     Container.bind('ProjectSchemaLoader').toSingle(ProjectSchemaLoader)
+    Container.bind('ProjectSchemaCache').toSingle(ProjectSchemaCache)
+    Container.bind('ConfigFileCache').toSingle(ConfigFileCache)
+    Container.bind('PackageLocationIndex').toSingle(PackageLocationIndex)
     Container.bind('CommonSettings').toSingle(CommonSettings)
     Container.bind('UnityPackageExtractor').toSingle(UnityPackageExtractor)
     Container.bind('ZipHelper').toSingle(ZipHelper)
     Container.bind('UnityPackageAnalyzer').toSingle(UnityPackageAnalyzer)
+    Container.bind('ReleaseInfoCache').toSingle(ReleaseInfoCache)
+    Container.bind('ReleaseFolderScanner').toSingle(ReleaseFolderScanner)
+    Container.bind('ReleaseDownloadCache').toSingle(ReleaseDownloadCache)
+    Container.bind('ReleaseStore').toSingle(ReleaseStore)
     Container.bind('ProjectConfigChanger').toSingle(ProjectConfigChanger)
     Container.bind('PrjRunner').toSingle(PrjRunner)
     Container.bind('UnityEditorMenuGenerator').toSingle(UnityEditorMenuGenerator)
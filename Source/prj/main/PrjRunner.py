@@ -136,12 +136,32 @@ class PrjRunner:
         if self._args.listReleases:
             self._releaseSourceManager.listAllReleases()
 
+        if self._args.searchReleases:
+            assertThat(self._args.searchPage >= 1 and self._args.searchPageSize >= 1, "Invalid search page given")
+            self._releaseSourceManager.listSearchResults(self._args.searchReleases, (self._args.searchPage - 1) * self._args.searchPageSize, self._args.searchPageSize)
+
+        if self._args.listReleaseContents:
+            releaseId, versionCode = self._parseReleaseRequest(self._args.listReleaseContents)
+            self._releaseSourceManager.listReleaseContents(releaseId, versionCode)
+
+        if self._args.installReleases:
+            self._installReleases()
+
+        if self._args.listOutdatedReleases:
+            self._releaseSourceManager.listOutdatedReleases(self._packageMgr.getAllProjectNames())
+
+        if self._args.upgradeOutdatedReleases:
+            self._releaseSourceManager.upgradeOutdatedReleases(self._packageMgr.getAllProjectNames(), self._args.suppressPrompts)
+
         if self._args.listProjects:
             self._packageMgr.listAllProjects()
 
         if self._args.listPackages:
             self._packageMgr.listAllPackages(self._args.project)
 
+        if self._args.checkAssetGuids:
+            self._packageMgr.checkAssetGuids(self._args.project, self._platform)
+
         if self._args.openUnity:
             self._packageMgr.checkProjectInitialized(self._args.project, self._platform)
             self._unityHelper.openUnity(self._args.project, self._platform)
@@ -152,6 +172,28 @@ class PrjRunner:
         if self._args.editProjectYaml:
             self._editProjectYaml()
 
+    def _installReleases(self):
+        packageRoot = self._args.installPackageRoot
+
+        if not packageRoot:
+            packageFolders = self._packageMgr.getPackageFolders(self._args.project)
+            assertThat(len(packageFolders) > 0, "Could not find any PackageFolders for project '{0}' to install releases into", self._args.project)
+            packageRoot = packageFolders[0]
+
+        releaseRequests = [self._parseReleaseRequest(x) for x in self._args.installReleases]
+
+        self._releaseSourceManager.installReleases(self._args.project, packageRoot, releaseRequests, self._args.suppressPrompts)
+
+    # Returns a tuple of (releaseId, versionCode) for a value of the form RELEASE_ID[:VERSION_CODE]
+    def _parseReleaseRequest(self, value):
+        # Use rpartition since the version code is always last
+        releaseId, separator, versionCode = value.rpartition(':')
+
+        if not separator:
+            return (value, None)
+
+        return (releaseId, versionCode)
+
     def _editProjectYaml(self):
         assertThat(self._args.project)
         schemaPath = self._varMgr.expandPath('[UnityProjectsDir]/{0}/{1}'.format(self._args.project, ProjectConfigFileName))
@@ -180,7 +222,9 @@ class PrjRunner:
            or self._args.openUnity or self._args.openCustomSolution \
            or self._args.editProjectYaml or self._args.createProject \
            or self._args.projectAddPackageAssets or self._args.projectAddPackagePlugins \
-           or self._args.deleteProject or self._args.listPackages
+           or self._args.deleteProject or self._args.listPackages \
+           or self._args.checkAssetGuids \
+           or self._args.installReleases
 
     def _validateRequest(self):
 
@@ -18,6 +18,7 @@ class ProjectConfigChanger:
     _sys = Inject('SystemHelper')
     _packageManager = Inject('PackageManager')
     _varMgr = Inject('VarManager')
+    _configFileCache = Inject('ConfigFileCache')
 
     def _getProjectConfigPath(self, projectName):
         return self._varMgr.expandPath('[UnityProjectsDir]/{0}/{1}'.format(projectName, ProjectConfigFileName))
@@ -25,7 +26,7 @@ class ProjectConfigChanger:
     def _loadProjectConfig(self, projectName):
         configPath = self._getProjectConfigPath(projectName)
 
-        yamlData = YamlSerializer.deserialize(self._sys.readFileAsText(configPath))
+        yamlData = YamlSerializer.deserializeData(self._configFileCache.loadYamlFile(configPath))
 
         result = ProjectConfig()
 
@@ -37,6 +38,7 @@ class ProjectConfigChanger:
     def _saveProjectConfig(self, projectName, projectConfig):
         configPath = self._getProjectConfigPath(projectName)
         self._sys.writeFileAsText(configPath, YamlSerializer.serialize(projectConfig))
+        self._configFileCache.invalidate(configPath)
 
     def addPackage(self, projectName, packageName, addToAssetsFolder):
         with self._log.heading('Adding package {0} to project {1}'.format(packageName, projectName)):
@@ -0,0 +1,111 @@
+
+import os
+import json
+import hashlib
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+import prj.main.ProjectSchemaLoader as ProjectSchemaLoader
+
+from mtm.util.Assert import *
+
+# Increment this whenever the format of the stored schemas changes so that old caches are discarded
+CacheVersion = 1
+
+class ProjectSchemaCache:
+    '''
+    Stores the fully resolved schema for each project and platform, along with the path and modification time
+    of every file and directory that it was loaded from, and the value of every path var that was used
+    A stored schema is used for as long as none of those have changed, so loading the schema for a project
+    that hasn't changed only needs to check those paths and read a single file
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
+
+    def _getCachePath(self, projectName, platform):
+        if not self._varMgr.hasKey('ProjenyCacheDir') or not self._varMgr.hasKey('UnityProjectsDir'):
+            return None
+
+        # Include the projects directory since the cache directory is shared between every projeny repository
+        key = '{0}|{1}|{2}'.format(self._varMgr.expandPath('[UnityProjectsDir]'), projectName, platform)
+        keyHash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        return self._varMgr.expandPath(os.path.join('[ProjenyCacheDir]', 'Schemas', keyHash + '.json'))
+
+    # Returns None if there is no stored schema or if any of its inputs have changed
+    def tryGetSchema(self, projectName, platform):
+        cachePath = self._getCachePath(projectName, platform)
+
+        if cachePath == None or not os.path.isfile(cachePath):
+            return None
+
+        try:
+            with open(cachePath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self._log.warn("Failed to load cached schema at '{0}'.  Details: {1}", cachePath, e)
+            return None
+
+        if data.get('version') != CacheVersion or data.get('project') != projectName or data.get('platform') != platform:
+            return None
+
+        if not self._areInputsUnchanged(data):
+            return None
+
+        self._log.debug("Loaded schema for project '{0}' (platform '{1}') from cache", projectName, platform)
+
+        return ProjectSchemaLoader.schemaFromJsonDict(data['schema'])
+
+    def _areInputsUnchanged(self, data):
+        for value, expandedValue in data['expansions'].items():
+            try:
+                if self._varMgr.expand(value) != expandedValue:
+                    return False
+            except Exception:
+                # For eg. a path var that no longer exists
+                return False
+
+        for path, stamp in data['paths'].items():
+            if ProjectSchemaLoader.getPathStamp(path) != stamp:
+                return False
+
+        return True
+
+    def saveSchema(self, projectName, platform, schema, inputs):
+        cachePath = self._getCachePath(projectName, platform)
+
+        if cachePath == None:
+            return
+
+        data = {
+            'version': CacheVersion,
+            'project': projectName,
+            'platform': platform,
+            'paths': inputs.paths,
+            'expansions': inputs.expansions,
+            'schema': ProjectSchemaLoader.schemaToJsonDict(schema),
+        }
+
+        try:
+            text = json.dumps(data, separators=(',', ':'))
+
+            # Some yaml values (eg. dates or non-string keys) do not survive being converted to json, and in that case
+            # it's better to load the schema from scratch every time than to use one that is subtly different
+            if json.loads(text)['schema'] != data['schema']:
+                self._log.debug("Could not store schema for project '{0}' since its config cannot be converted to json", projectName)
+                return
+
+            self._sys.makeMissingDirectoriesInPath(cachePath)
+
+            # Write to a temporary file first so that we never leave a half written cache behind
+            tempPath = cachePath + '.tmp'
+
+            with open(tempPath, 'w', encoding='utf-8') as f:
+                f.write(text)
+
+            os.replace(tempPath, cachePath)
+        except Exception as e:
+            self._log.warn("Failed to save cached schema at '{0}'.  Details: {1}", cachePath, e)
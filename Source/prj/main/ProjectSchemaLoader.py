@@ -2,20 +2,22 @@
 import sys
 import re
 import os
+import stat
 
 from mtm.util.Assert import *
 from mtm.util.Platforms import Platforms
 import mtm.util.Util as Util
 import mtm.ioc.Container as Container
 from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectOptional
 import mtm.ioc.IocAssertions as Assertions
 import mtm.util.JunctionUtil as JunctionUtil
 from mtm.config.Config import Config
-from mtm.config.YamlConfigLoader import loadYamlFilesThatExist
 
 from prj.main.CsProjAnalyzer import NsPrefix, CsProjAnalyzer
 from prj.main.ProjenyConstants import ProjectConfigFileName, PackageConfigFileName, ProjectUserConfigFileName
 from prj.main.ProjectConfig import ProjectConfig
+from prj.main.DependencyGraph import DependencyGraph
 
 from collections import OrderedDict
 import xml.etree.ElementTree as ET
@@ -24,21 +26,52 @@ class ProjectSchemaLoader:
     _varMgr = Inject('VarManager')
     _log = Inject('Logger')
     _sys = Inject('SystemHelper')
+    _schemaCache = InjectOptional('ProjectSchemaCache', None)
+    _configFileCache = Inject('ConfigFileCache')
+    _packageLocationIndex = Inject('PackageLocationIndex')
+
+    def __init__(self):
+        # See _getPackageGraph
+        self._packageGraphs = {}
 
     def loadSchema(self, name, platform):
         try:
-            return self._loadSchemaInternal(name, platform)
+            if self._schemaCache != None:
+                schema = self._schemaCache.tryGetSchema(name, platform)
+
+                if schema != None:
+                    return schema
+
+            inputs = SchemaInputs()
+            schema = self._loadSchemaInternal(name, platform, inputs)
+
+            if self._schemaCache != None:
+                self._schemaCache.saveSchema(name, platform, schema, inputs)
+
+            return schema
         except Exception as e:
             raise Exception("Failed while processing config yaml for project '{0}' (platform '{1}'). Details: {2}".format(name, platform, str(e))) from e
 
-    def loadProjectConfig(self, name):
-        schemaPath = self._varMgr.expandPath('[UnityProjectsDir]/{0}/{1}'.format(name, ProjectConfigFileName))
-        schemaPathUser = self._varMgr.expandPath('[UnityProjectsDir]/{0}/{1}'.format(name, ProjectUserConfigFileName))
-        schemaPathGlobal = self._varMgr.expandPath('[UnityProjectsDir]/{0}'.format(ProjectConfigFileName))
-        schemaPathUserGlobal = self._varMgr.expandPath('[UnityProjectsDir]/{0}'.format(ProjectUserConfigFileName))
+    # Returns the paths of all the yaml files that make up the config for the given project, in order of precedence
+    def getProjectConfigPaths(self, name):
+        return [
+            self._varMgr.expandPath('[UnityProjectsDir]/{0}/{1}'.format(name, ProjectConfigFileName)),
+            self._varMgr.expandPath('[UnityProjectsDir]/{0}/{1}'.format(name, ProjectUserConfigFileName)),
+            self._varMgr.expandPath('[UnityProjectsDir]/{0}'.format(ProjectConfigFileName)),
+            self._varMgr.expandPath('[UnityProjectsDir]/{0}'.format(ProjectUserConfigFileName)),
+        ]
 
-        self._log.debug('Loading schema at path "{0}"'.format(schemaPath))
-        yamlConfig = Config(loadYamlFilesThatExist(schemaPath, schemaPathUser, schemaPathGlobal, schemaPathUserGlobal))
+    # If inputs is given then the config files are added to it
+    def loadProjectConfig(self, name, inputs = None):
+        configPaths = self.getProjectConfigPaths(name)
+
+        self._log.debug('Loading schema at path "{0}"'.format(configPaths[0]))
+
+        stamps = {}
+        yamlConfig = Config(self._configFileCache.loadYamlFilesThatExist(*configPaths, stamps = stamps))
+
+        if inputs != None:
+            inputs.addPaths(stamps)
 
         config = ProjectConfig()
 
@@ -60,21 +93,21 @@ class ProjectSchemaLoader:
 
         return config
 
-    def _loadSchemaInternal(self, name, platform):
+    def _loadSchemaInternal(self, name, platform, inputs):
 
-        config = self.loadProjectConfig(name)
+        inputs.addExpansion('[UnityProjectsDir]', self._varMgr.expand('[UnityProjectsDir]'))
+
+        config = self.loadProjectConfig(name, inputs)
 
         # Search all the given packages and any new packages that are dependencies and create PackageInfo() objects for each
-        packageMap = self._getAllPackageInfos(config, platform)
+        packageMap = self._getAllPackageInfos(config, platform, inputs)
 
         self._addGroupedDependenciesAsExplicitDependencies(packageMap)
 
-        self._ensurePrebuiltProjectsHaveNoScripts(packageMap)
-
         self._ensurePrebuiltProjectDependenciesArePrebuilt(packageMap)
 
         # We have all the package infos, but we don't know which packages depend on what so calculate that
-        self._calculateDependencyListForEachPackage(packageMap)
+        dependencyGraph = self._calculateDependencyListForEachPackage(packageMap)
 
         # For the pre-built assembly projects, if we add one of them to our solution,
         # then we need to add all the pre-built dependencies, since unlike generated projects
@@ -90,9 +123,9 @@ class ProjectSchemaLoader:
 
         # In Unity, the plugins folder can not have any dependencies on anything in the scripts folder
         # So if dependencies exist then just automatically move those packages to the scripts folder
-        self._ensurePluginPackagesDoNotHaveDependenciesInAssets(packageMap)
+        self._ensurePluginPackagesDoNotHaveDependenciesInAssets(packageMap, dependencyGraph)
 
-        self._ensurePackagesThatAreNotProjectsDoNotHaveProjectDependencies(packageMap)
+        self._ensurePackagesThatAreNotProjectsDoNotHaveProjectDependencies(packageMap, dependencyGraph)
 
         for info in packageMap.values():
             if info.forcePluginsDir and not info.isPluginDir:
@@ -146,38 +179,33 @@ class ProjectSchemaLoader:
         assertThat(False, "Unrecognized folder type '{0}'".format(value))
         return ""
 
-    def _getAllPackageInfos(self, projectConfig, platform):
+    def _getAllPackageInfos(self, projectConfig, platform, inputs):
         configRefDesc = "'{0}' or '{1}'".format(ProjectConfigFileName, ProjectUserConfigFileName)
         allPackageRefs = [PackageReference(x, configRefDesc) for x in projectConfig.pluginsFolder + projectConfig.assetsFolder]
 
         packageMap = {}
 
+        # Adding, removing or renaming a package changes the modification time of the package folder, which
+        # covers every lookup below
+        for packageFolder in projectConfig.packageFolders:
+            inputs.addExpansion(packageFolder, self._varMgr.expand(packageFolder))
+            inputs.addPath(self._varMgr.expandPath(packageFolder))
+
+        packageGraph = self._getPackageGraph(projectConfig.packageFolders)
+
         # Resolve all dependencies for each package
         # by default, put any dependencies that are not declared explicitly into the plugins folder
+        # Everything that doesn't depend on the platform is read once in _getPackageNode and shared between platforms
         for packageRef in allPackageRefs:
 
             packageName = packageRef.name
-            packageDir = None
-
-            for packageFolder in projectConfig.packageFolders:
-                candidatePackageDir = os.path.join(packageFolder, packageName)
-
-                if self._sys.directoryExists(candidatePackageDir):
-                    packageDir = self._varMgr.expandPath(candidatePackageDir)
-                    break
-
-            assertIsNotNone(packageDir, "Could not find package '{0}' in any of the package directories!  Referenced in {1}", packageName, packageRef.sourceDesc)
+            node = self._getPackageNode(packageGraph, projectConfig.packageFolders, packageName)
 
-            configPath = os.path.join(packageDir, PackageConfigFileName)
+            assertIsNotNone(node, "Could not find package '{0}' in any of the package directories!  Referenced in {1}", packageName, packageRef.sourceDesc)
 
-            if os.path.exists(configPath):
-                packageConfig = Config(loadYamlFilesThatExist(configPath))
-            else:
-                packageConfig = Config([])
+            inputs.merge(node.inputs)
 
-            folderType = self._getFolderTypeFromString(packageConfig.tryGetString('', 'FolderType'))
-
-            if not self._shouldIncludeForPlatform(packageName, packageConfig, folderType, platform):
+            if not self._shouldIncludeForPlatform(packageName, node.config, node.folderType, platform):
                 continue
 
             createCustomVsProject = self._shouldCreateVsProjectForName(packageName, projectConfig.solutionProjects)
@@ -188,32 +216,39 @@ class ProjectSchemaLoader:
                 assertThat(not packageName in projectConfig.pluginsFolder)
                 isPluginsDir = False
 
-            if packageConfig.tryGetBool(False, 'ForceAssetsDirectory'):
+            if node.config.tryGetBool(False, 'ForceAssetsDirectory'):
                 isPluginsDir = False
 
-            explicitDependencies = packageConfig.tryGetList([], 'Dependencies')
+            # Copy since these are changed below and the node is shared between platforms
+            explicitDependencies = list(node.config.tryGetList([], 'Dependencies'))
+
+            forcePluginsDir = node.config.tryGetBool(False, 'ForcePluginsDirectory')
 
-            forcePluginsDir = packageConfig.tryGetBool(False, 'ForcePluginsDirectory')
+            assemblyProjInfo = self._tryGetAssemblyProjectInfo(node)
 
-            assemblyProjInfo = self._tryGetAssemblyProjectInfo(packageConfig, packageName)
+            # This is only filled in once the assembly project has been loaded
+            inputs.merge(node.inputs)
 
-            sourceDesc = '"{0}"'.format(configPath)
+            sourceDesc = '"{0}"'.format(node.configPath)
 
             if assemblyProjInfo != None:
+                assertThat(not node.hasScripts,
+                   "Found C# scripts in assembly project '{0}'.  This is not allowed - please move to a separate package.", packageName)
+
                 for assemblyDependName in assemblyProjInfo.dependencies:
                     if assemblyDependName not in [x.name for x in allPackageRefs]:
                         allPackageRefs.append(PackageReference(assemblyDependName, sourceDesc))
 
                 explicitDependencies += assemblyProjInfo.dependencies
 
-            groupedDependencies = packageConfig.tryGetList([], 'GroupWith')
-            extraDependencies = packageConfig.tryGetList([], 'Extras')
+            groupedDependencies = list(node.config.tryGetList([], 'GroupWith'))
+            extraDependencies = node.config.tryGetList([], 'Extras')
 
             assertThat(not packageName in packageMap, "Found duplicate package with name '{0}'", packageName)
 
             packageMap[packageName] = PackageInfo(
-                isPluginsDir, packageName, packageConfig, createCustomVsProject,
-                explicitDependencies, forcePluginsDir, folderType, assemblyProjInfo, packageDir, groupedDependencies)
+                isPluginsDir, packageName, node.config, createCustomVsProject,
+                explicitDependencies, forcePluginsDir, node.folderType, assemblyProjInfo, node.dirPath, groupedDependencies)
 
             for dependName in (explicitDependencies + groupedDependencies + extraDependencies):
                 if dependName not in [x.name for x in allPackageRefs]:
@@ -222,7 +257,74 @@ class ProjectSchemaLoader:
 
         return packageMap
 
-    def _tryGetAssemblyProjectInfo(self, packageConfig, packageName):
+    # Returns a dictionary of package name -> _PackageNode (or None if the package could not be found) that is shared
+    # by every schema that uses the same package folders, so that projects that target several platforms only
+    # read each package once
+    # Installing or removing a package changes the modification time of its package folder, which gives us a new graph
+    def _getPackageGraph(self, packageFolders):
+        graphKey = tuple((x, getPathStamp(x)) for x in (self._varMgr.expandPath(y) for y in packageFolders))
+
+        packageGraph = self._packageGraphs.get(graphKey)
+
+        if packageGraph == None:
+            packageGraph = {}
+            self._packageGraphs[graphKey] = packageGraph
+
+        return packageGraph
+
+    def _getPackageNode(self, packageGraph, packageFolders, packageName):
+        if packageName in packageGraph:
+            node = packageGraph[packageName]
+
+            # Re-installing a package over itself does not change the modification time of the package folder, so
+            # check everything that the node was read from as well
+            if node == None or self._areInputsUnchanged(node.inputs):
+                return node
+
+        node = self._createPackageNode(packageFolders, packageName)
+        packageGraph[packageName] = node
+        return node
+
+    def _areInputsUnchanged(self, inputs):
+        return all(self._varMgr.expand(value) == expandedValue for value, expandedValue in inputs.expansions.items()) \
+            and all(getPathStamp(path) == stamp for path, stamp in inputs.paths.items())
+
+    def _createPackageNode(self, packageFolders, packageName):
+        packageDir = self._packageLocationIndex.tryGetPackageDir(packageFolders, packageName)
+
+        if packageDir == None:
+            return None
+
+        node = _PackageNode(packageName, packageDir)
+
+        node.configPath = os.path.join(packageDir, PackageConfigFileName)
+
+        # Use the stamps from when the file was read rather than the current ones, so that the schema is never
+        # stored with the stamp of a newer version of the file than the one it was built from
+        stamps = {}
+        node.config = Config(self._configFileCache.loadYamlFilesThatExist(node.configPath, stamps = stamps))
+        node.inputs.addPaths(stamps)
+        node.folderType = self._getFolderTypeFromString(node.config.tryGetString('', 'FolderType'))
+
+        return node
+
+    # The assembly project is only loaded once the package is actually used, since packages that are skipped
+    # for the current platform are not required to have a valid one
+    def _tryGetAssemblyProjectInfo(self, node):
+        if not node.hasLoadedAssemblyProject:
+            node.assemblyProjectInfo = self._loadAssemblyProjectInfo(node.config, node.name, node.dirPath, node.inputs)
+
+            if node.assemblyProjectInfo != None:
+                node.hasScripts = any(self._sys.findFilesByPattern(node.dirPath, '*.cs'))
+
+                # Assembly projects are not allowed to contain any scripts, so we need to know when one is added anywhere inside them
+                node.inputs.addDirectoryTree(node.dirPath)
+
+            node.hasLoadedAssemblyProject = True
+
+        return node.assemblyProjectInfo
+
+    def _loadAssemblyProjectInfo(self, packageConfig, packageName, packageDir, inputs):
         assemblyProjectRelativePath = packageConfig.tryGetString(None, 'AssemblyProject', 'Path')
 
         if assemblyProjectRelativePath == None:
@@ -230,9 +332,13 @@ class ProjectSchemaLoader:
 
         projFullPath = self._varMgr.expand(assemblyProjectRelativePath)
 
+        inputs.addExpansion(assemblyProjectRelativePath, projFullPath)
+
         if not os.path.isabs(projFullPath):
             projFullPath = os.path.join(packageDir, assemblyProjectRelativePath)
 
+        inputs.addPath(projFullPath)
+
         assertThat(self._sys.fileExists(projFullPath), "Expected to find file at '{0}'.", projFullPath)
 
         projAnalyzer = CsProjAnalyzer(projFullPath)
@@ -266,12 +372,15 @@ class ProjectSchemaLoader:
                 self._makeAllPrebuiltDependenciesVisible(package, packageMap)
 
     def _makeAllPrebuiltDependenciesVisible(self, package, packageMap):
-        for dependName in package.explicitDependencies:
-            depend = packageMap[dependName]
+        packagesToVisit = [package]
 
-            if not depend.createCustomVsProject:
-                depend.createCustomVsProject = True
-                self._makeAllPrebuiltDependenciesVisible(depend, packageMap)
+        while packagesToVisit:
+            for dependName in packagesToVisit.pop().explicitDependencies:
+                depend = packageMap[dependName]
+
+                if not depend.createCustomVsProject:
+                    depend.createCustomVsProject = True
+                    packagesToVisit.append(depend)
 
     def _ensurePrebuiltProjectDependenciesArePrebuilt(self, packageMap):
         for packageInfo in packageMap.values():
@@ -285,61 +394,28 @@ class ProjectSchemaLoader:
                 assertThat(depend.assemblyProjectInfo != None,
                    "Expected package '{0}' to have an assembly project defined, since another assembly project ({1}) depends on it", dependName, packageInfo.name)
 
-    def _ensurePrebuiltProjectsHaveNoScripts(self, packageMap):
-        for package in packageMap.values():
-            if package.assemblyProjectInfo != None:
-                assertThat(not any(self._sys.findFilesByPattern(package.dirPath, '*.cs')),
-                   "Found C# scripts in assembly project '{0}'.  This is not allowed - please move to a separate package.", package.name)
-
-    def _ensurePackagesThatAreNotProjectsDoNotHaveProjectDependencies(self, packageMap):
-        changedOne = True
-
-        while changedOne:
-            changedOne = False
-
-            for info in packageMap.values():
-                if not info.createCustomVsProject and self._hasVsProjectDependency(info, packageMap):
-                    info.createCustomVsProject = True
-                    self._log.debug('Created visual studio project for {0} package even though it wasnt marked as one, because it has csproj dependencies'.format(info.name))
-                    changedOne = True
-
-    def _hasVsProjectDependency(self, info, packageMap):
-        for dependName in info.allDependencies:
-            if not dependName in packageMap:
-                # For eg. a platform specific dependency
-                continue
-
-            dependInfo = packageMap[dependName]
+    # Rather than checking every package against its dependencies until nothing changes, start from the packages that
+    # have projects and walk backwards to everything that depends on them
+    def _ensurePackagesThatAreNotProjectsDoNotHaveProjectDependencies(self, packageMap, dependencyGraph):
+        projectNames = [x.name for x in packageMap.values() if x.createCustomVsProject]
 
-            if dependInfo.createCustomVsProject:
-                return True
-
-        return False
-
-    def _ensurePluginPackagesDoNotHaveDependenciesInAssets(self, packageMap):
-        movedProject = True
-
-        while movedProject:
-            movedProject = False
+        dependents = dependencyGraph.getAllDependents(projectNames)
 
-            for info in packageMap.values():
-                if info.isPluginDir and self._hasAssetsDependency(info, packageMap):
-                    info.isPluginDir = False
-                    self._log.debug('Moved {0} package to scripts folder since it has dependencies there and therefore cannot be in plugins'.format(info.name))
-                    movedProject = True
-
-    def _hasAssetsDependency(self, info, packageMap):
-        for dependName in info.allDependencies:
-            if not dependName in packageMap:
-                # For eg. a platform specific dependency
-                continue
+        for info in packageMap.values():
+            if not info.createCustomVsProject and info.name in dependents:
+                info.createCustomVsProject = True
+                self._log.debug('Created visual studio project for {0} package even though it wasnt marked as one, because it has csproj dependencies'.format(info.name))
 
-            dependInfo = packageMap[dependName]
+    # Same as above, starting from the packages in the assets folder
+    def _ensurePluginPackagesDoNotHaveDependenciesInAssets(self, packageMap, dependencyGraph):
+        assetsNames = [x.name for x in packageMap.values() if not x.isPluginDir]
 
-            if not dependInfo.isPluginDir:
-                return True
+        dependents = dependencyGraph.getAllDependents(assetsNames)
 
-        return False
+        for info in packageMap.values():
+            if info.isPluginDir and info.name in dependents:
+                info.isPluginDir = False
+                self._log.debug('Moved {0} package to scripts folder since it has dependencies there and therefore cannot be in plugins'.format(info.name))
 
     def _printDependencyTree(self, packageMap):
         packages = sorted(packageMap.values(), key = lambda p: (p.isPluginDir, -len(p.explicitDependencies)))
@@ -404,34 +480,133 @@ class ProjectSchemaLoader:
 
         self._log.debug('Processing dependency tree')
 
-        inProgress = set()
+        # Dependencies on packages that are not in the map can happen if a package depends on another package that is platform specific
+        dependencyGraph = DependencyGraph({ x.name: x.explicitDependencies for x in packageMap.values() })
 
         for info in packageMap.values():
-            self._calculateDependencyListForPackage(info, packageMap, inProgress)
-
-    def _calculateDependencyListForPackage(self, packageInfo, packageMap, inProgress):
-
-        if packageInfo.name in inProgress:
-            assertThat(False, "Found circular dependency when processing package {0}.  Dependency list: {1}".format(packageInfo.name, ' -> '.join([x for x in inProgress]) + '-> ' + packageInfo.name))
-
-        inProgress.add(packageInfo.name)
-        allDependencies = set(packageInfo.explicitDependencies)
-
-        for explicitDependName in packageInfo.explicitDependencies:
-            if explicitDependName not in packageMap:
-                # This can happen if a package depends on another package that is platform specific
-                continue
-
-            explicitDependInfo = packageMap[explicitDependName]
-
-            if explicitDependInfo.allDependencies == None:
-                self._calculateDependencyListForPackage(explicitDependInfo, packageMap, inProgress)
-
-            for dependName in explicitDependInfo.allDependencies:
-                allDependencies.add(dependName)
-
-        packageInfo.allDependencies = list(allDependencies)
-        inProgress.remove(packageInfo.name)
+            info.setDependencyGraph(dependencyGraph)
+
+        return dependencyGraph
+
+# Returns a string that changes whenever the file or directory at the given path changes, or None if it doesn't exist
+def getPathStamp(path):
+    try:
+        pathStat = os.stat(path)
+    except OSError:
+        return None
+
+    if stat.S_ISDIR(pathStat.st_mode):
+        return 'd{0}'.format(pathStat.st_mtime_ns)
+
+    return '{0}:{1}'.format(pathStat.st_size, pathStat.st_mtime_ns)
+
+class SchemaInputs:
+    '''
+    Records everything that a schema was loaded from, so that a stored copy of the schema can be used
+    until one of them changes
+    '''
+    def __init__(self):
+        # Maps path -> stamp (see getPathStamp)
+        self.paths = {}
+        # Maps unexpanded value -> expanded value for every path var that was expanded
+        self.expansions = {}
+
+    def addPath(self, path):
+        if path not in self.paths:
+            self.paths[path] = getPathStamp(path)
+
+    # Adds the given dictionary of path -> stamp, for paths that were stamped when they were read
+    def addPaths(self, stamps):
+        for path, stamp in stamps.items():
+            self.paths.setdefault(path, stamp)
+
+    def addDirectoryTree(self, dirPath):
+        for root, dirs, files in os.walk(dirPath):
+            self.addPath(root)
+
+    def addExpansion(self, value, expandedValue):
+        self.expansions[value] = expandedValue
+
+    def merge(self, other):
+        for path, stamp in other.paths.items():
+            self.paths.setdefault(path, stamp)
+
+        self.expansions.update(other.expansions)
+
+def schemaToJsonDict(schema):
+    return {
+        'name': schema.name,
+        'packages': [_packageInfoToJsonDict(x) for x in schema.packages.values()],
+        'customFolderMap': [[key, value] for key, value in schema.customFolderMap.items()],
+        'projectSettingsPath': schema.projectSettingsPath,
+        'unityPackagesPath': schema.unityPackagesPath,
+        'platform': schema.platform,
+        'targetPlatforms': schema.targetPlatforms,
+    }
+
+def schemaFromJsonDict(data):
+    packages = {}
+
+    for packageData in data['packages']:
+        packageInfo = _packageInfoFromJsonDict(packageData)
+        packages[packageInfo.name] = packageInfo
+
+    return ProjectSchema(
+        data['name'], packages, OrderedDict(data['customFolderMap']), data['projectSettingsPath'],
+        data['unityPackagesPath'], data['platform'], data['targetPlatforms'])
+
+def _packageInfoToJsonDict(info):
+    assInfo = info.assemblyProjectInfo
+
+    return {
+        'isPluginDir': info.isPluginDir,
+        'name': info.name,
+        # Config reverses the list it is given, so undo that here
+        'config': list(reversed(info.config.configs)),
+        'createCustomVsProject': info.createCustomVsProject,
+        'explicitDependencies': info.explicitDependencies,
+        'allDependencies': info.allDependencies,
+        'forcePluginsDir': info.forcePluginsDir,
+        'folderType': info.folderType,
+        'dirPath': info.dirPath,
+        'groupedDependencies': info.groupedDependencies,
+        'assemblyProject': None if assInfo == None else {
+            'path': assInfo.path,
+            'xml': ET.tostring(assInfo.root, encoding='unicode'),
+            'config': assInfo.config,
+            'dependencies': assInfo.dependencies,
+        },
+    }
+
+def _packageInfoFromJsonDict(data):
+    assData = data['assemblyProject']
+    assInfo = None
+
+    if assData != None:
+        assInfo = AssemblyProjectInfo(assData['path'], ET.fromstring(assData['xml']), assData['config'], assData['dependencies'])
+
+    info = PackageInfo(
+        data['isPluginDir'], data['name'], Config(data['config']), data['createCustomVsProject'],
+        data['explicitDependencies'], data['forcePluginsDir'], data['folderType'], assInfo, data['dirPath'], data['groupedDependencies'])
+
+    info.allDependencies = data['allDependencies']
+    return info
+
+class _PackageNode:
+    '''
+    Everything about a package that does not depend on the project or the platform
+    '''
+    def __init__(self, name, dirPath):
+        self.name = name
+        self.dirPath = dirPath
+        self.configPath = None
+        self.config = None
+        self.folderType = None
+        self.hasLoadedAssemblyProject = False
+        self.assemblyProjectInfo = None
+        self.hasScripts = False
+        # The files and path vars that this node was read from
+        self.inputs = SchemaInputs()
 
 class PackageReference:
     def __init__(self, name, sourceDesc):
@@ -473,12 +648,31 @@ class PackageInfo:
         self.explicitDependencies = explicitDependencies
         self.config = config
         self.createCustomVsProject = createCustomVsProject
-        self.allDependencies = None
         self.folderType = folderType
         self.assemblyProjectInfo = assemblyProjectInfo
         self.forcePluginsDir = forcePluginsDir
         self.dirPath = dirPath
         self.groupedDependencies = groupedDependencies
+        self._allDependencies = None
+        self._dependencyGraph = None
+
+    # The dependency lists are only created when they are used, since storing them for every package takes
+    # a lot of memory for large projects
+    def setDependencyGraph(self, dependencyGraph):
+        self._dependencyGraph = dependencyGraph
+        self._allDependencies = None
+
+    @property
+    def allDependencies(self):
+        if self._allDependencies == None and self._dependencyGraph != None:
+            self._allDependencies = self._dependencyGraph.getAllDependencies(self.name)
+
+        return self._allDependencies
+
+    @allDependencies.setter
+    def allDependencies(self, value):
+        self._allDependencies = value
+        self._dependencyGraph = None
 
     @property
     def outputDirVar(self):
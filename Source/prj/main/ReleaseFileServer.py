@@ -0,0 +1,283 @@
+
+import os
+import re
+import gzip
+import threading
+import urllib.parse
+import email.utils
+import http.server
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+from prj.reg.ReleaseManifestFormat import ReleaseManifestFileName
+
+from mtm.util.Assert import *
+
+_CopyBufferSize = 1024 * 1024
+
+_RangeRegex = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+class ReleaseFileServer:
+    '''
+    Serves the files in a release directory over http, so that it can be used directly as the ManifestUrl
+    of a FileServer release source without setting up a separate web server
+    Supports keep-alive, range requests (used to resume downloads), ETag/Last-Modified so that unchanged
+    manifests are not downloaded again, and gzip encoding of the yaml manifest
+    Every request is handled on its own thread
+    '''
+    _log = Inject('Logger')
+
+    def __init__(self):
+        self._server = None
+        self._thread = None
+        self._rootDir = None
+        # Maps manifest path -> (etag, compressed bytes) so that it is only compressed once per change
+        self._compressedManifests = {}
+        self._lock = threading.Lock()
+
+    def isRunning(self):
+        return self._server != None
+
+    # Starts serving the given directory on a background thread
+    def start(self, rootDir, host, port):
+        assertThat(self._server == None, "Release file server is already running")
+
+        self._rootDir = os.path.realpath(rootDir)
+
+        self._server = _Server((host, port), _RequestHandler)
+        self._server.releaseServer = self
+
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        self._log.info("Serving '{0}' at http://{1}:{2}/{3}", self._rootDir, host or 'localhost', self._server.server_address[1], ReleaseManifestFileName)
+
+    # Blocks until the server is stopped
+    def wait(self):
+        # Use a timeout so that CTRL+C still works while waiting
+        while self._thread.is_alive():
+            self._thread.join(1)
+
+    def stop(self):
+        if self._server == None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+        self._server = None
+        self._thread = None
+
+    # Returns the full path of the file for the given url path, or None if it is outside the root directory
+    def tryGetFilePath(self, urlPath):
+        relativePath = urllib.parse.unquote(urlPath).lstrip('/')
+        fullPath = os.path.realpath(os.path.join(self._rootDir, relativePath))
+
+        if not fullPath.startswith(os.path.join(self._rootDir, '')):
+            return None
+
+        if not os.path.isfile(fullPath):
+            return None
+
+        return fullPath
+
+    # Only the yaml manifest is worth compressing - the unitypackage files and the compact manifest are already compressed
+    def shouldCompress(self, filePath):
+        return os.path.basename(filePath) == ReleaseManifestFileName
+
+    def getCompressedData(self, filePath, etag):
+        with self._lock:
+            cached = self._compressedManifests.get(filePath)
+
+            if cached != None and cached[0] == etag:
+                return cached[1]
+
+        with open(filePath, 'rb') as f:
+            data = gzip.compress(f.read(), mtime=0)
+
+        with self._lock:
+            self._compressedManifests[filePath] = (etag, data)
+
+        return data
+
+    def logRequest(self, message):
+        self._log.debug(message)
+
+class _Server(http.server.ThreadingHTTPServer):
+    # Do not wait for open keep-alive connections when shutting down
+    daemon_threads = True
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    # Required for keep-alive
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ProjenyReleaseServer'
+
+    def do_GET(self):
+        self._handleRequest(True)
+
+    def do_HEAD(self):
+        self._handleRequest(False)
+
+    def log_message(self, format, *args):
+        self.server.releaseServer.logRequest("{0} - {1}".format(self.address_string(), format % args))
+
+    def _handleRequest(self, sendBody):
+        releaseServer = self.server.releaseServer
+
+        filePath = releaseServer.tryGetFilePath(urllib.parse.urlparse(self.path).path)
+
+        if filePath == None:
+            self._sendEmptyResponse(404)
+            return
+
+        fileStat = os.stat(filePath)
+        etag = '"{0:x}-{1:x}"'.format(fileStat.st_size, fileStat.st_mtime_ns)
+        lastModified = email.utils.formatdate(fileStat.st_mtime, usegmt=True)
+
+        # Ranges are only used for the unitypackage files so never compress those requests
+        useGzip = releaseServer.shouldCompress(filePath) and self._acceptsGzip() and not self.headers.get('Range')
+
+        if useGzip:
+            # Each encoding needs its own etag
+            etag = etag[:-1] + '-gz"'
+
+        if self._isNotModified(etag, fileStat.st_mtime):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', lastModified)
+            self.end_headers()
+            return
+
+        if useGzip:
+            data = releaseServer.getCompressedData(filePath, etag)
+
+            self.send_response(200)
+            self._sendCommonHeaders(filePath, etag, lastModified)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+
+            if sendBody:
+                self.wfile.write(data)
+            return
+
+        fileSize = fileStat.st_size
+        byteRange = self._tryGetRange(etag, fileSize)
+
+        if byteRange == False:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */{0}'.format(fileSize))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if byteRange == None:
+            start, length = 0, fileSize
+            self.send_response(200)
+        else:
+            start, length = byteRange
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, start + length - 1, fileSize))
+
+        self._sendCommonHeaders(filePath, etag, lastModified)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+
+        if sendBody:
+            self._sendFile(filePath, start, length)
+
+    def _sendCommonHeaders(self, filePath, etag, lastModified):
+        self.send_header('Content-Type', 'text/plain; charset=utf-8' if filePath.endswith('.txt') else 'application/octet-stream')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', lastModified)
+        self.send_header('Accept-Ranges', 'bytes')
+
+    def _sendEmptyResponse(self, code):
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _acceptsGzip(self):
+        encodings = [x.split(';')[0].strip() for x in self.headers.get('Accept-Encoding', '').split(',')]
+        return 'gzip' in encodings
+
+    def _isNotModified(self, etag, mtime):
+        ifNoneMatch = self.headers.get('If-None-Match')
+
+        # If-None-Match takes precedence over If-Modified-Since when both are given
+        if ifNoneMatch:
+            return ifNoneMatch.strip() == '*' or etag in [x.strip() for x in ifNoneMatch.split(',')]
+
+        ifModifiedSince = self.headers.get('If-Modified-Since')
+
+        if ifModifiedSince:
+            try:
+                return int(mtime) <= email.utils.parsedate_to_datetime(ifModifiedSince).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+    # Returns a tuple of (start, length) for the requested range, None to send the whole file,
+    # or False if the range cannot be satisfied
+    def _tryGetRange(self, etag, fileSize):
+        rangeHeader = self.headers.get('Range')
+
+        if not rangeHeader:
+            return None
+
+        # The client only wants the range if the file is still the same one it got the first part from
+        ifRange = self.headers.get('If-Range')
+
+        if ifRange and ifRange.strip() != etag:
+            return None
+
+        match = _RangeRegex.match(rangeHeader.strip())
+
+        # Multiple ranges are allowed to be ignored
+        if not match or (not match.group(1) and not match.group(2)):
+            return None
+
+        if not match.group(1):
+            # Suffix range, eg. the last 500 bytes
+            length = min(int(match.group(2)), fileSize)
+
+            if length == 0:
+                return False
+
+            return (fileSize - length, length)
+
+        start = int(match.group(1))
+
+        if start >= fileSize:
+            return False
+
+        end = min(int(match.group(2)), fileSize - 1) if match.group(2) else fileSize - 1
+
+        if end < start:
+            return None
+
+        return (start, end - start + 1)
+
+    def _sendFile(self, filePath, start, length):
+        try:
+            with open(filePath, 'rb') as f:
+                f.seek(start)
+
+                while length > 0:
+                    chunk = f.read(min(_CopyBufferSize, length))
+
+                    if not chunk:
+                        # The file was truncated after we sent the headers, so the client can't use this connection any more
+                        self.close_connection = True
+                        break
+
+                    self.wfile.write(chunk)
+                    length -= len(chunk)
+        except (ConnectionResetError, BrokenPipeError):
+            # The client went away, eg. the download was cancelled
+            self.close_connection = True
@@ -24,8 +24,23 @@ from mtm.util.ScriptRunner import ScriptRunner
 from mtm.util.CommonSettings import CommonSettings
 from prj.reg.UnityPackageExtractor import UnityPackageExtractor
 from prj.reg.UnityPackageAnalyzer import UnityPackageAnalyzer
+from prj.reg.ReleaseFolderScanner import ReleaseFolderScanner
+from prj.reg.UnityPackageExporter import UnityPackageExporter
+from prj.main.ReleaseFileServer import ReleaseFileServer
+import prj.reg.UnityPackageExporter as UnityPackageExporterUtil
+import prj.reg.UnityPackageAnalyzer as UnityPackageAnalyzerUtil
+from prj.main.ProjenyConstants import PackageConfigFileName
 
 import time
+import threading
+from datetime import datetime
+
+# Optional - when available, this is used to wake up as soon as the release directory changes
+# instead of only checking once every polling interval
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
 
 from mtm.util.CommonSettings import ConfigFileName
 from prj.reg.ReleaseSourceManager import ReleaseSourceManager
@@ -44,8 +59,9 @@ from mtm.ioc.Inject import Inject
 
 from mtm.util.UnityHelper import UnityHelper
 
-# Use TXT to play nicely with MIME types
-ReleaseManifestFileName = 'ProjenyReleaseManifest.txt'
+from prj.reg.ReleaseManifestFormat import ReleaseManifestFileName
+from prj.reg.ReleaseManifestFormat import CompactManifestFileName
+import prj.reg.ReleaseManifestFormat as ReleaseManifestFormat
 
 class ReleaseManifest:
     def __init__(self):
@@ -55,69 +71,266 @@ class Runner:
     _scriptRunner = Inject('ScriptRunner')
     _log = Inject('Logger')
     _sys = Inject('SystemHelper')
-    _packageAnalyzer = Inject('UnityPackageAnalyzer')
+    _folderScanner = Inject('ReleaseFolderScanner')
+    _packageExporter = Inject('UnityPackageExporter')
+    _fileServer = Inject('ReleaseFileServer')
 
     def __init__(self):
-        self._manifest = None
+        # Maps path -> (size, modification time) for every release found during the last check
+        self._snapshot = {}
+        # Maps path -> ReleaseInfo
+        self._releaseInfos = {}
+        # Maps package directory -> fingerprint of its contents when it was last exported
+        self._exportFingerprints = {}
+        # Maps path -> ((size, modification time), sha256) for every package that we exported, so
+        # that they don't need to be read again to compute the hash
+        self._exportedHashes = {}
+        self._changeEvent = None
 
     def run(self, args):
         self._args = args
 
         self._args.directory = self._sys.canonicalizePath(self._args.directory)
+
+        if self._args.exportPackages:
+            self._args.exportPackages = self._sys.canonicalizePath(self._args.exportPackages)
         self._scriptRunner.runWrapper(self._runInternal)
 
     def _runInternal(self):
         self._log.debug("Started ReleaseManifestUpdater with arguments: {0}".format(" ".join(sys.argv[1:])))
 
-        while True:
-            releasePaths = self._getAllReleasePaths()
+        observer = None
+
+        if self._args.pollInternal > 0:
+            observer = self._tryStartWatching()
+
+        try:
+            while True:
+                self._log.info("Checking for changes...")
+
+                if self._args.exportPackages:
+                    self._exportPackages()
+
+                if self._updateSnapshot():
+                    self._saveManifest()
+
+                # Only start serving once the manifest is up to date
+                if self._args.serve and not self._fileServer.isRunning():
+                    self._fileServer.start(self._args.directory, self._args.host, self._args.serve)
+
+                if self._args.pollInternal <= 0:
+                    break
 
-            self._log.info("Checking for changes...")
+                self._waitForChanges()
 
-            if self._hasChanged(releasePaths):
-                self._manifest = self._createManifest(releasePaths)
-                self._saveManifest()
+            if self._args.serve:
+                self._fileServer.wait()
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
 
-                self._log.info("Detected change to one or more releasePaths. Release manifest has been updated.")
+            self._fileServer.stop()
 
-            if self._args.pollInternal <= 0:
-                break
+    def _tryStartWatching(self):
+        if Observer == None:
+            self._log.debug("Module 'watchdog' is not installed, falling back to polling")
+            return None
 
+        self._changeEvent = threading.Event()
+
+        observer = Observer()
+        observer.schedule(_ChangeHandler(self._changeEvent), self._args.directory, recursive=True)
+
+        if self._args.exportPackages:
+            observer.schedule(_ChangeHandler(self._changeEvent), self._args.exportPackages, recursive=True)
+        observer.start()
+
+        self._log.debug("Watching directory '{0}' for changes", self._args.directory)
+        return observer
+
+    def _waitForChanges(self):
+        if self._changeEvent == None:
             time.sleep(self._args.pollInternal)
+            return
 
-    def _saveManifest(self):
-        yamlStr = YamlSerializer.serialize(self._manifest)
-        self._sys.writeFileAsText(os.path.join(self._args.directory, ReleaseManifestFileName), yamlStr)
+        # Still check every polling interval in case an event is missed (eg. on network shares)
+        if self._changeEvent.wait(self._args.pollInternal):
+            # Give a moment for things like file copies to finish so we handle bursts of events together
+            time.sleep(1)
 
-    def _createManifest(self, releasePaths):
-        manifest = ReleaseManifest()
-        for path in releasePaths:
+        self._changeEvent.clear()
+
+    # Returns true if any releases were added, changed or removed since the last call
+    def _updateSnapshot(self):
+        newSnapshot = {}
+        changedPaths = []
+
+        for path in self._folderScanner.findUnityPackages(self._args.directory):
             path = self._sys.canonicalizePath(path)
+            fileStat = os.stat(path)
+            fileKey = (fileStat.st_size, fileStat.st_mtime_ns)
+
+            newSnapshot[path] = fileKey
+
+            if self._snapshot.get(path) != fileKey:
+                changedPaths.append(path)
+
+        removedPaths = [x for x in self._snapshot.keys() if x not in newSnapshot]
+
+        for path in removedPaths:
+            self._log.info("Detected removed release '{0}'", path)
+            del self._releaseInfos[path]
+
+        # Packages that we exported ourselves already have their hash
+        exportedHashes = {}
+        for path in changedPaths:
+            exportedHash = self._exportedHashes.get(path)
+
+            if exportedHash != None and exportedHash[0] == newSnapshot[path]:
+                exportedHashes[path] = exportedHash[1]
 
-            releaseInfo = self._packageAnalyzer.getReleaseInfoFromUnityPackage(path)
+        # Include hashes so that clients can verify their downloads
+        analyzed = self._folderScanner.analyze([x for x in changedPaths if x not in exportedHashes], True)
+        analyzed += self._folderScanner.analyze([x for x in changedPaths if x in exportedHashes], False)
+
+        for path, releaseInfo in analyzed:
+            if path in exportedHashes:
+                releaseInfo.sha256 = exportedHashes[path]
+
+            self._log.info("Detected {0} release '{1}'", 'changed' if path in self._snapshot else 'new', path)
 
             assertThat(path.startswith(self._args.directory))
-            relativePath = path[len(self._args.directory)+1:]
-            releaseInfo.localPath = relativePath
+            releaseInfo.localPath = path[len(self._args.directory)+1:]
+
+            self._releaseInfos[path] = releaseInfo
+
+        self._snapshot = newSnapshot
+
+        return len(changedPaths) > 0 or len(removedPaths) > 0
+
+    # Writes a unitypackage into the release directory for every package in the export directory
+    # whose contents changed since it was last exported
+    def _exportPackages(self):
+        exportDir = self._args.exportPackages
+
+        for packageName in sorted(self._sys.walkDir(exportDir)):
+            packageDir = os.path.join(exportDir, packageName)
 
-            manifest.releases.append(releaseInfo)
+            if not os.path.isdir(packageDir) or packageName.startswith('.'):
+                continue
+
+            releaseId, version = self._getReleaseSettings(packageDir, packageName)
+
+            headerInfo = None
+
+            if self._args.exportHeader:
+                versionCode = UnityPackageAnalyzerUtil.versionToVersionCode(version) if version else 0
+                headerInfo = UnityPackageExporterUtil.createHeaderInfo(
+                    releaseId, packageName, version or '', versionCode, self._getLastModifiedDate(packageDir))
+
+            fingerprint = self._packageExporter.computeFingerprint(packageDir, headerInfo)
+
+            # Include the version in the file name, so that older versions are kept as separate releases
+            fileName = '{0}@{1}.unitypackage'.format(packageName, version) if version else packageName + '.unitypackage'
+            outputPath = self._sys.canonicalizePath(os.path.join(self._args.directory, fileName))
+
+            if self._exportFingerprints.get(packageDir) == fingerprint and os.path.isfile(outputPath):
+                continue
+
+            self._log.info("Detected changes to package '{0}', exporting to '{1}'", packageName, fileName)
+
+            sha256, numBytes = self._packageExporter.exportUnityPackage(packageDir, outputPath, headerInfo)
+
+            fileStat = os.stat(outputPath)
+            self._exportedHashes[outputPath] = ((fileStat.st_size, fileStat.st_mtime_ns), sha256)
+            self._exportFingerprints[packageDir] = fingerprint
+
+    # Returns a tuple of (releaseId, version) from the optional Release section of the ProjenyPackage.yaml
+    def _getReleaseSettings(self, packageDir, packageName):
+        configPath = os.path.join(packageDir, PackageConfigFileName)
+
+        if not os.path.isfile(configPath):
+            return (packageName, None)
+
+        packageConfig = Config(loadYamlFilesThatExist(configPath))
+
+        # Versions are often written without quotes, so accept numbers too
+        releaseId = packageConfig.tryGet('Release', 'Id')
+        version = packageConfig.tryGet('Release', 'Version')
+
+        return (str(releaseId) if releaseId != None else packageName, str(version) if version != None else None)
+
+    # Used as the publish date, so that exporting the same contents again produces the same package
+    def _getLastModifiedDate(self, packageDir):
+        lastModified = os.path.getmtime(packageDir)
+
+        for root, dirs, files in os.walk(packageDir):
+            for name in files:
+                lastModified = max(lastModified, os.path.getmtime(os.path.join(root, name)))
+
+        return datetime.utcfromtimestamp(lastModified)
+
+    def _createManifest(self):
+        manifest = ReleaseManifest()
+        manifest.releases = [self._releaseInfos[x] for x in sorted(self._releaseInfos.keys())]
         return manifest
 
-    def _hasChanged(self, releasePaths):
-        if self._manifest == None:
-            return True
+    def _saveManifest(self):
+        manifest = self._createManifest()
+        changed = False
+
+        if self._args.format in ('yaml', 'both'):
+            yamlData = YamlSerializer.serialize(manifest).encode('utf-8')
+            changed |= self._writeFileIfChanged(os.path.join(self._args.directory, ReleaseManifestFileName), yamlData)
+
+        if self._args.format in ('compact', 'both'):
+            compactData = ReleaseManifestFormat.serializeCompact(manifest.releases)
+            changed |= self._writeFileIfChanged(os.path.join(self._args.directory, CompactManifestFileName), compactData)
+
+        if changed:
+            self._log.info("Release manifest has been updated with {0} releases", len(manifest.releases))
+        else:
+            self._log.info("Release manifest is already up to date")
+
+    # Returns true if the file was written
+    def _writeFileIfChanged(self, path, data):
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+
+        # Write to a temporary file and then rename so that clients never see a partially written manifest
+        tempPath = path + '.tmp'
+
+        with open(tempPath, 'wb') as f:
+            f.write(data)
+
+        os.replace(tempPath, path)
+        return True
+
+class _ChangeHandler:
+    def __init__(self, changeEvent):
+        self._changeEvent = changeEvent
+
+    # Called by watchdog on its own thread
+    def dispatch(self, event):
+        fileName = os.path.basename(event.src_path)
 
-        return False
+        # Ignore our own writes
+        if fileName.startswith(ReleaseManifestFileName) or fileName.startswith(CompactManifestFileName):
+            return
 
-    def _getAllReleasePaths(self):
-        releasePath = []
-        for filePath in self._sys.findFilesByPattern(self._args.directory, '*.unitypackage'):
-            releasePath.append(filePath)
-        return releasePath
+        self._changeEvent.set()
 
 def addArguments(parser):
     parser.add_argument('directory', metavar='RELEASE_DIRECTORY', type=str, help="The directory to scan for unitypackage files. ")
     parser.add_argument('-pi', '--pollInternal', default=0, metavar='POLL_INTERVAL', type=int, help="This program will scan the given directory for unitypackage files over the polling interval given here (in seconds).  If unspecified, the manifest will only be updated once and this program will exit")
+    parser.add_argument('-ep', '--exportPackages', metavar='PACKAGE_FOLDER', type=str, help="Every directory inside the given folder is exported to a unitypackage in the release directory whenever its contents change, without needing to run Unity.  The version is read from 'Release: Version' in the {0} of each package, if it has one".format(PackageConfigFileName))
+    parser.add_argument('-eh', '--exportHeader', action='store_true', help="When used with --exportPackages, stores the release id and version in the header of each exported unitypackage, the same way the asset store does")
+    parser.add_argument('-s', '--serve', metavar='PORT', type=int, help="Also serve the release directory over http on the given port, so that it can be used directly as the ManifestUrl of a FileServer release source.  Runs until stopped with CTRL+C")
+    parser.add_argument('--host', default='', type=str, help="The address to serve on when using --serve.  Defaults to all addresses")
+    parser.add_argument('-f', '--format', default='both', choices=['yaml', 'compact', 'both'], help="Which manifest files to write.  '{0}' can be read by every version of Projeny, while '{1}' is much faster for clients to download and parse.  Defaults to both".format(ReleaseManifestFileName, CompactManifestFileName))
 
 def installBindings():
 
@@ -138,6 +351,9 @@ def installBindings():
     Container.bind('ScriptRunner').toSingle(ScriptRunner)
     Container.bind('ProcessRunner').toSingle(ProcessRunner)
     Container.bind('UnityPackageAnalyzer').toSingle(UnityPackageAnalyzer)
+    Container.bind('ReleaseFolderScanner').toSingle(ReleaseFolderScanner)
+    Container.bind('UnityPackageExporter').toSingle(UnityPackageExporter)
+    Container.bind('ReleaseFileServer').toSingle(ReleaseFileServer)
 
 def main():
     # Here we split out some functionality into various methods
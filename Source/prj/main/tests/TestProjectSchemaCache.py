@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mtm.ioc.Container as Container
+from mtm.ioc.Inject import Inject
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.Config import Config
+from mtm.log.Logger import Logger
+from mtm.util.VarManager import VarManager
+from mtm.util.SystemHelper import SystemHelper
+
+from prj.main.ProjectSchemaLoader import ProjectSchemaLoader, getPathStamp
+from prj.main.ProjectSchemaCache import ProjectSchemaCache
+from prj.main.ConfigFileCache import ConfigFileCache
+from prj.main.PackageLocationIndex import PackageLocationIndex
+
+from mtm.util.Assert import *
+
+ProjectYaml = """
+PackageFolders:
+    - '[TestRoot]/Packages'
+ProjectSettingsPath: ProjectSettings
+UnityPackagesPath: UnityPackages
+AssetsFolder:
+    - A
+"""
+
+class TestProjectSchemaCache(unittest.TestCase):
+    def setUp(self):
+        self._rootDir = tempfile.mkdtemp()
+
+        for dirPath in ['UnityProjects/Proj', 'Packages/A', 'Packages/B', 'Packages/C', 'Cache']:
+            os.makedirs(os.path.join(self._rootDir, dirPath))
+
+        self._writeFile('UnityProjects/Proj/ProjenyProject.yaml', ProjectYaml)
+        self._writeFile('Packages/A/ProjenyPackage.yaml', "Dependencies:\n    - B\n")
+
+        self._bindAll()
+
+    def tearDown(self):
+        Container.clear()
+        shutil.rmtree(self._rootDir, ignore_errors=True)
+
+    # Binds everything again, which is the same as starting a new run of Projeny
+    def _bindAll(self):
+        Container.clear()
+
+        config = {
+            'PathVars': {
+                'TestRoot': self._rootDir,
+                'UnityProjectsDir': '[TestRoot]/UnityProjects',
+                'ProjenyCacheDir': '[TestRoot]/Cache',
+            }
+        }
+
+        Container.bind('Config').toSingle(Config, [config])
+        Container.bind('Logger').toSingle(Logger)
+        Container.bind('VarManager').toSingle(VarManager)
+        Container.bind('SystemHelper').toSingle(SystemHelper)
+        Container.bind('ConfigFileCache').toSingle(ConfigFileCache)
+        Container.bind('PackageLocationIndex').toSingle(PackageLocationIndex)
+        Container.bind('ProjectSchemaCache').toSingle(ProjectSchemaCache)
+        Container.bind('ProjectSchemaLoader').toSingle(ProjectSchemaLoader)
+
+    def _writeFile(self, relativePath, text):
+        with open(os.path.join(self._rootDir, relativePath), 'w') as f:
+            f.write(text)
+
+    # Rewrites the given file without changing the modification time of the directory it is in,
+    # and with a modification time that is clearly newer than the old one
+    def _editFile(self, relativePath, text):
+        path = os.path.join(self._rootDir, relativePath)
+        dirStat = os.stat(os.path.dirname(path))
+        newTime = os.stat(path).st_mtime_ns + 10 ** 9
+
+        self._writeFile(relativePath, text)
+
+        os.utime(path, ns=(newTime, newTime))
+        os.utime(os.path.dirname(path), ns=(dirStat.st_atime_ns, dirStat.st_mtime_ns))
+
+    def _loadSchema(self):
+        return Container.resolve('ProjectSchemaLoader').loadSchema('Proj', 'windows')
+
+    def testStoredSchemaIsUsed(self):
+        schema = self._loadSchema()
+        assertIsEqual(sorted(schema.packages.keys()), ['A', 'B'])
+
+        self._bindAll()
+
+        assertThat(Container.resolve('ProjectSchemaCache').tryGetSchema('Proj', 'windows') != None)
+        assertIsEqual(sorted(self._loadSchema().packages.keys()), ['A', 'B'])
+
+    def testPackageEditedBetweenLoads(self):
+        assertIsEqual(sorted(self._loadSchema().packages.keys()), ['A', 'B'])
+
+        self._editFile('Packages/A/ProjenyPackage.yaml', "Dependencies:\n    - B\n    - C\n")
+
+        assertIsEqual(sorted(self._loadSchema().packages.keys()), ['A', 'B', 'C'])
+
+    def testPackageEditedBetweenRuns(self):
+        assertIsEqual(sorted(self._loadSchema().packages.keys()), ['A', 'B'])
+
+        self._editFile('Packages/A/ProjenyPackage.yaml', "Dependencies:\n    - C\n")
+        self._bindAll()
+
+        schema = self._loadSchema()
+        assertIsEqual(sorted(schema.packages.keys()), ['A', 'C'])
+        assertIsEqual(schema.packages['A'].allDependencies, ['C'])
+
+    def testStampIsFromWhenFileWasRead(self):
+        path = os.path.join(self._rootDir, 'Packages/A/ProjenyPackage.yaml')
+        readStamp = getPathStamp(path)
+
+        stamps = {}
+        Container.resolve('ConfigFileCache').loadYamlFilesThatExist(path, stamps = stamps)
+
+        self._editFile('Packages/A/ProjenyPackage.yaml', "Dependencies:\n    - C\n")
+
+        # The stamp has to match the contents that were returned, so that a schema built from them is
+        # seen as out of date once the file is changed
+        assertIsEqual(stamps[path], readStamp)
+        assertThat(getPathStamp(path) != readStamp)
+
+    def testHiddenDirectoriesAreNotPackages(self):
+        # For example a staging directory left behind by an interrupted release install
+        os.makedirs(os.path.join(self._rootDir, 'Packages/.projeny_extract_1234/Assets'))
+
+        index = Container.resolve('PackageLocationIndex')
+        assertIsEqual(sorted(index.getAllPackageNames(['[TestRoot]/Packages'])), ['A', 'B', 'C'])
+        assertIsEqual(index.tryGetPackageDir(['[TestRoot]/Packages'], '.projeny_extract_1234'), None)
+
+if __name__ == '__main__':
+    unittest.main()
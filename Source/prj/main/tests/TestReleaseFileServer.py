@@ -0,0 +1,153 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+import http.client
+import email.utils
+
+import mtm.ioc.Container as Container
+from mtm.ioc.Inject import Inject
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.Config import Config
+from mtm.log.Logger import Logger
+
+from prj.main.ReleaseFileServer import ReleaseFileServer
+from prj.reg.ReleaseManifestFormat import ReleaseManifestFileName
+
+from mtm.util.Assert import *
+
+class TestReleaseFileServer(unittest.TestCase):
+    def setUp(self):
+        Container.clear()
+        Container.bind('Config').toSingle(Config, [{}])
+        Container.bind('Logger').toSingle(Logger)
+        Container.bind('ReleaseFileServer').toSingle(ReleaseFileServer)
+
+        self._tempDir = tempfile.mkdtemp()
+        self._rootDir = os.path.join(self._tempDir, 'Releases')
+        os.makedirs(self._rootDir)
+
+        # Should never be served since it is outside the root directory
+        with open(os.path.join(self._tempDir, 'Secret.txt'), 'w') as f:
+            f.write('secret')
+
+        self._packageData = os.urandom(100000)
+
+        with open(os.path.join(self._rootDir, 'A.unitypackage'), 'wb') as f:
+            f.write(self._packageData)
+
+        with open(os.path.join(self._rootDir, ReleaseManifestFileName), 'w') as f:
+            f.write('releases:\n' + '  - name: Foo\n' * 1000)
+
+        self._server = Container.resolve('ReleaseFileServer')
+        self._server.start(self._rootDir, '127.0.0.1', 0)
+
+        self._connection = http.client.HTTPConnection('127.0.0.1', self._server._server.server_address[1])
+
+    def tearDown(self):
+        self._connection.close()
+        self._server.stop()
+        Container.clear()
+        shutil.rmtree(self._tempDir, ignore_errors=True)
+
+    # Returns a tuple of (response, body)
+    # Every request goes through the same connection, which also checks that keep-alive works
+    def _get(self, path, headers = None):
+        self._connection.request('GET', path, headers=headers or {})
+        response = self._connection.getresponse()
+        return (response, response.read())
+
+    def testFullDownload(self):
+        response, body = self._get('/A.unitypackage')
+
+        assertIsEqual(response.status, 200)
+        assertIsEqual(body, self._packageData)
+        assertThat(response.getheader('ETag'))
+        assertIsEqual(response.getheader('Accept-Ranges'), 'bytes')
+
+    def testNotFound(self):
+        assertIsEqual(self._get('/Missing.unitypackage')[0].status, 404)
+        assertIsEqual(self._get('/%2E%2E/Secret.txt')[0].status, 404)
+
+    def testNotModified(self):
+        response, body = self._get('/A.unitypackage')
+        etag = response.getheader('ETag')
+        lastModified = response.getheader('Last-Modified')
+
+        response, body = self._get('/A.unitypackage', { 'If-None-Match': etag })
+        assertIsEqual(response.status, 304)
+        assertIsEqual(body, b'')
+        assertIsEqual(response.getheader('ETag'), etag)
+
+        response, body = self._get('/A.unitypackage', { 'If-Modified-Since': lastModified })
+        assertIsEqual(response.status, 304)
+
+        # If-None-Match wins over If-Modified-Since
+        response, body = self._get('/A.unitypackage', { 'If-None-Match': '"other"', 'If-Modified-Since': lastModified })
+        assertIsEqual(response.status, 200)
+
+        response, body = self._get('/A.unitypackage', { 'If-Modified-Since': email.utils.formatdate(0, usegmt=True) })
+        assertIsEqual(response.status, 200)
+        assertIsEqual(body, self._packageData)
+
+    def testRange(self):
+        response, body = self._get('/A.unitypackage', { 'Range': 'bytes=1000-' })
+        assertIsEqual(response.status, 206)
+        assertIsEqual(body, self._packageData[1000:])
+        assertIsEqual(response.getheader('Content-Range'), 'bytes 1000-99999/100000')
+
+        response, body = self._get('/A.unitypackage', { 'Range': 'bytes=10-19' })
+        assertIsEqual(response.status, 206)
+        assertIsEqual(body, self._packageData[10:20])
+
+        response, body = self._get('/A.unitypackage', { 'Range': 'bytes=-500' })
+        assertIsEqual(response.status, 206)
+        assertIsEqual(body, self._packageData[-500:])
+
+    def testIfRange(self):
+        etag = self._get('/A.unitypackage')[0].getheader('ETag')
+
+        response, body = self._get('/A.unitypackage', { 'Range': 'bytes=1000-', 'If-Range': etag })
+        assertIsEqual(response.status, 206)
+        assertIsEqual(body, self._packageData[1000:])
+
+        # The file changed since the first part was downloaded so the whole file is sent
+        response, body = self._get('/A.unitypackage', { 'Range': 'bytes=1000-', 'If-Range': '"old"' })
+        assertIsEqual(response.status, 200)
+        assertIsEqual(body, self._packageData)
+
+    def testUnsatisfiableRange(self):
+        response, body = self._get('/A.unitypackage', { 'Range': 'bytes=100000-' })
+        assertIsEqual(response.status, 416)
+        assertIsEqual(response.getheader('Content-Range'), 'bytes */100000')
+        assertIsEqual(body, b'')
+
+        # The connection should still be usable afterwards
+        assertIsEqual(self._get('/A.unitypackage')[0].status, 200)
+
+    def testCompressedManifest(self):
+        path = '/' + ReleaseManifestFileName
+
+        plainResponse, plainBody = self._get(path)
+        assertIsEqual(plainResponse.getheader('Content-Encoding'), None)
+
+        response, body = self._get(path, { 'Accept-Encoding': 'gzip' })
+        assertIsEqual(response.status, 200)
+        assertIsEqual(response.getheader('Content-Encoding'), 'gzip')
+        assertIsEqual(gzip.decompress(body), plainBody)
+        assertThat(len(body) < len(plainBody))
+
+        # Each encoding has its own etag
+        etag = response.getheader('ETag')
+        assertThat(etag != plainResponse.getheader('ETag'))
+
+        response, body = self._get(path, { 'Accept-Encoding': 'gzip', 'If-None-Match': etag })
+        assertIsEqual(response.status, 304)
+
+        response, body = self._get(path, { 'If-None-Match': etag })
+        assertIsEqual(response.status, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,23 +15,32 @@ class AssetStoreCacheReleaseSource:
         self._folderSources = [
             LocalFolderReleaseSource(assetStoreCache1), LocalFolderReleaseSource(assetStoreCache2)]
 
+        self._releases = []
+
     @property
     def releases(self):
-        result = []
-        for subReg in self._folderSources:
-            result += subReg.releases
-        return result
+        return self._releases
 
     def init(self):
         for subReg in self._folderSources:
             subReg.init()
 
+        self._releases = []
+        for subReg in self._folderSources:
+            self._releases += subReg.releases
+
     def getName(self):
         return "Asset Store Cache"
 
     def installRelease(self, packageRoot, releaseInfo, forcedName):
+        return self._getFolderSource(releaseInfo).installRelease(packageRoot, releaseInfo, forcedName)
+
+    def getReleaseContents(self, releaseInfo):
+        return self._getFolderSource(releaseInfo).getReleaseContents(releaseInfo)
+
+    def _getFolderSource(self, releaseInfo):
         for subReg in self._folderSources:
             if releaseInfo in subReg.releases:
-                return subReg.installRelease(packageRoot, releaseInfo, forcedName)
+                return subReg
 
         assertThat(False)
@@ -1,10 +1,10 @@
 
 from mtm.ioc.Inject import Inject
 from mtm.ioc.Inject import InjectMany
+from mtm.ioc.Inject import InjectOptional
 import mtm.ioc.IocAssertions as Assertions
 
 from prj.reg.ReleaseInfo import ReleaseInfo
-import prj.reg.UnityPackageAnalyzer as UnityPackageAnalyzer
 
 
 from mtm.util.Assert import *
@@ -18,24 +18,31 @@ class LocalFolderReleaseSource:
     _log = Inject('Logger')
     _sys = Inject('SystemHelper')
     _extractor = Inject('UnityPackageExtractor')
+    _folderScanner = Inject('ReleaseFolderScanner')
     _packageAnalyzer = Inject('UnityPackageAnalyzer')
+    _releaseInfoCache = InjectOptional('ReleaseInfoCache', None)
 
     def __init__(self, folderPath):
         self._folderPath = folderPath
         self._files = []
+        self._releases = []
 
     @property
     def releases(self):
-        return [x.release for x in self._files]
+        return self._releases
 
     def init(self):
         with self._log.heading('Initializing release source for local folder'):
             self._log.debug('Initializing release source for local folder "{0}"', self._folderPath)
-            for path in self._sys.findFilesByPattern(self._folderPath, '*.unitypackage'):
-                release = self._packageAnalyzer.getReleaseInfoFromUnityPackage(path)
-
+            for path, release in self._folderScanner.scan(self._folderPath):
                 self._files.append(FileInfo(path, release))
 
+            self._releases = [x.release for x in self._files]
+
+            if self._releaseInfoCache:
+                self._releaseInfoCache.removeMissing(self._folderPath, [x.path for x in self._files])
+                self._releaseInfoCache.save()
+
             self._log.info("Found {0} released in folder '{1}'", len(self._files), self._folderPath)
 
     def getName(self):
@@ -44,9 +51,24 @@ class LocalFolderReleaseSource:
     # Should return the chosen name for the package
     # If forcedName is non-null then this should always be the value of forcedName
     def installRelease(self, packageRootDir, releaseInfo, forcedName):
-        fileInfo = next(x for x in self._files if x.release == releaseInfo)
-        assertIsNotNone(fileInfo)
+        fileInfo = self._getFileInfo(releaseInfo)
 
         return self._extractor.extractUnityPackage(packageRootDir, fileInfo.path, releaseInfo.name, forcedName)
 
+    # Returns a list of UnityPackageEntry for every asset in the given release, without extracting it
+    def getReleaseContents(self, releaseInfo):
+        fileInfo = self._getFileInfo(releaseInfo)
+
+        if self._releaseInfoCache:
+            contents = self._releaseInfoCache.getContents(fileInfo.path)
+            self._releaseInfoCache.save()
+            return contents
+
+        return self._packageAnalyzer.getContentsFromUnityPackage(fileInfo.path)
+
+    def _getFileInfo(self, releaseInfo):
+        fileInfo = next((x for x in self._files if x.release == releaseInfo), None)
+        assertIsNotNone(fileInfo)
+        return fileInfo
+
 
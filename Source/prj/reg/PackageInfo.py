@@ -1,5 +1,8 @@
 
 from mtm.util.Assert import *
+from datetime import datetime
+
+import prj.reg.ReleaseInfo as ReleaseInfo
 
 class PackageFolderInfo:
     def __init__(self):
@@ -16,3 +19,31 @@ class PackageInstallInfo:
     def __init__(self):
         self.installDate = None
         self.releaseInfo = None
+
+# Used when storing install infos in json, such as in the package inventory
+def installInfoToJsonDict(installInfo):
+    return {
+        'installDate': ReleaseInfo.dateToString(installInfo.installDate) if isinstance(installInfo.installDate, datetime) else None,
+        'releaseInfo': ReleaseInfo.toJsonDict(installInfo.releaseInfo) if installInfo.releaseInfo else None,
+    }
+
+def installInfoFromJsonDict(data):
+    installInfo = PackageInstallInfo()
+    installInfo.installDate = ReleaseInfo.dateFromString(data['installDate'])
+
+    if data['releaseInfo']:
+        installInfo.releaseInfo = ReleaseInfo.fromJsonDict(data['releaseInfo'])
+
+    return installInfo
+
+# Converts the result of YamlSerializer.deserialize on a ProjenyInstall.yaml file into a PackageInstallInfo
+def installInfoFromYamlData(yamlData):
+    installInfo = PackageInstallInfo()
+    installInfo.installDate = getattr(yamlData, 'installDate', None)
+
+    releaseData = getattr(yamlData, 'releaseInfo', None)
+
+    if releaseData:
+        installInfo.releaseInfo = ReleaseInfo.fromYamlData(releaseData)
+
+    return installInfo
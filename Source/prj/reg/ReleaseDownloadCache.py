@@ -0,0 +1,329 @@
+
+import os
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.util.Assert import *
+
+DefaultMaxSizeMb = 4096
+
+_DownloadChunkSize = 1024 * 1024
+
+class ReleaseDownloadCache:
+    '''
+    Stores the unitypackage files downloaded from remote release sources so that installing the same
+    release again (eg. into another project) does not need the network
+    Files are keyed by release id, version code and content hash, and the least recently used
+    files are removed when the total size goes over the configured limit
+    Partially downloaded files are kept so that an interrupted download can be resumed
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
+    _config = Inject('Config')
+
+    def __init__(self):
+        # Releases are installed on multiple threads, so make sure only one of them downloads a given
+        # file at a time, since they would all be writing to the same partial file otherwise
+        self._lock = threading.Lock()
+        self._downloadLocks = {}
+
+    def isEnabled(self):
+        return self._varMgr.hasKey('ProjenyCacheDir')
+
+    def _getCacheDir(self):
+        return self._varMgr.expandPath(os.path.join('[ProjenyCacheDir]', 'Downloads'))
+
+    def _getCachePath(self, releaseInfo):
+        # Fall back to the size when there is no hash, which is usually enough to tell re-uploaded packages apart
+        contentKey = releaseInfo.sha256 if releaseInfo.sha256 else 'size{0}'.format(releaseInfo.compressedSize)
+
+        # Ids can contain characters that aren't valid in file names so use a hash of it
+        idHash = hashlib.sha1(str(releaseInfo.id).encode('utf-8')).hexdigest()[:16]
+
+        fileName = '{0}_{1}_{2}.unitypackage'.format(idHash, releaseInfo.versionCode, contentKey)
+
+        return os.path.join(self._getCacheDir(), fileName)
+
+    # Returns the path to a verified local copy of the given release, downloading it if necessary
+    def getPackagePath(self, releaseInfo):
+        cachePath = self._tryGetCachedPath(releaseInfo)
+
+        if cachePath:
+            return cachePath
+
+        cachePath = self._getCachePath(releaseInfo)
+
+        with self._getDownloadLock(cachePath):
+            # Another thread might have finished downloading it while we were waiting
+            if not self._tryGetCachedPath(releaseInfo):
+                self._download(releaseInfo, cachePath, None)
+                self._evictIfNecessary(cachePath)
+
+        return cachePath
+
+    # Calls the given handler with a file object containing the package contents and returns the result
+    # If the release is not cached yet, the handler reads the data as it is downloaded, so that for
+    # example extraction can happen at the same time as the download
+    # If the download turns out to be corrupt then an exception is raised from the stream before it
+    # reaches the end, so the handler never sees a complete stream of bad data
+    def processPackage(self, releaseInfo, handler):
+        cachePath = self._tryGetCachedPath(releaseInfo)
+
+        if not cachePath:
+            cachePath = self._getCachePath(releaseInfo)
+
+            with self._getDownloadLock(cachePath):
+                # Another thread might have finished downloading it while we were waiting
+                if not self._tryGetCachedPath(releaseInfo):
+                    wasHandled, result = self._download(releaseInfo, cachePath, handler)
+                    self._evictIfNecessary(cachePath)
+
+                    if wasHandled:
+                        return result
+
+        with open(cachePath, 'rb') as f:
+            return handler(f)
+
+    def _getDownloadLock(self, cachePath):
+        with self._lock:
+            return self._downloadLocks.setdefault(cachePath, threading.Lock())
+
+    def _tryGetCachedPath(self, releaseInfo):
+        assertThat(self.isEnabled())
+        assertThat(releaseInfo.url)
+
+        cachePath = self._getCachePath(releaseInfo)
+
+        if os.path.isfile(cachePath) and self._hasExpectedSize(os.path.getsize(cachePath), releaseInfo):
+            self._log.debug("Found release '{0}' in download cache at '{1}'", releaseInfo.name, cachePath)
+            # Touch the file so that it counts as recently used
+            os.utime(cachePath)
+            return cachePath
+
+        return None
+
+    def _hasExpectedSize(self, numBytes, releaseInfo):
+        return releaseInfo.compressedSize == None or numBytes == releaseInfo.compressedSize
+
+    # Returns a tuple of (wasHandled, handlerResult)
+    def _download(self, releaseInfo, cachePath, handler):
+        self._sys.createDirectory(self._getCacheDir())
+
+        partPath = cachePath + '.part'
+        # Stores the ETag or Last-Modified value of the partial download, so that we only resume
+        # it if the file on the server has not changed since
+        validatorPath = partPath + '.validator'
+
+        wasHandled = False
+        result = None
+
+        with self._log.heading("Downloading release from url '{0}'".format(releaseInfo.url)):
+            hasher = hashlib.sha256()
+            startOffset = 0
+
+            if os.path.isfile(partPath):
+                startOffset = os.path.getsize(partPath)
+
+            try:
+                with self._openResponse(releaseInfo.url, startOffset, partPath, validatorPath) as response:
+                    isResuming = startOffset > 0 and response.status == 206
+
+                    if isResuming:
+                        self._log.info("Resuming previous download from byte {0}", startOffset)
+
+                        # Include the bytes we already have in the hash
+                        with open(partPath, 'rb') as f:
+                            while True:
+                                chunk = f.read(_DownloadChunkSize)
+
+                                if not chunk:
+                                    break
+
+                                hasher.update(chunk)
+                    else:
+                        # Server doesn't support ranges, the file changed, or there was nothing to resume
+                        startOffset = 0
+                        self._saveValidator(validatorPath, response)
+
+                    with open(partPath, 'ab' if isResuming else 'wb') as outFile:
+                        stream = _DownloadStream(response, outFile, hasher, startOffset, releaseInfo)
+
+                        # The handler needs the whole package so we can only pass it the download
+                        # stream when we are downloading from the start
+                        if handler and not isResuming:
+                            result = handler(stream)
+                            wasHandled = True
+
+                        stream.readToEnd()
+
+            except CorruptDownloadException:
+                # Do not try to resume from this next time
+                self._removePartialDownload(partPath, validatorPath)
+                raise
+
+            os.replace(partPath, cachePath)
+            self._removePartialDownload(None, validatorPath)
+
+        return (wasHandled, result)
+
+    def _openResponse(self, url, startOffset, partPath, validatorPath):
+        request = urllib.request.Request(url)
+
+        if startOffset > 0:
+            request.add_header('Range', 'bytes={0}-'.format(startOffset))
+
+            validator = self._tryLoadValidator(validatorPath)
+
+            # Without this the server would send the rest of the new file if it changed, which we would
+            # append to the start of the old one
+            if validator:
+                request.add_header('If-Range', validator)
+
+        try:
+            return urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            # The partial file is bigger than the file on the server, so it must be from a different version of it
+            if e.code != 416 or startOffset == 0:
+                raise
+
+        self._log.info("Could not resume previous download, starting again from the beginning")
+        self._removePartialDownload(partPath, validatorPath)
+
+        return urllib.request.urlopen(urllib.request.Request(url))
+
+    def _tryLoadValidator(self, validatorPath):
+        if not os.path.isfile(validatorPath):
+            return None
+
+        with open(validatorPath, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+
+    def _saveValidator(self, validatorPath, response):
+        # Weak ETags are not allowed in If-Range so use the modification time for those instead
+        etag = response.headers.get('ETag')
+
+        if etag and etag.startswith('W/'):
+            etag = None
+
+        validator = etag or response.headers.get('Last-Modified')
+
+        if validator:
+            with open(validatorPath, 'w', encoding='utf-8') as f:
+                f.write(validator)
+        elif os.path.exists(validatorPath):
+            os.remove(validatorPath)
+
+    def _removePartialDownload(self, partPath, validatorPath):
+        for path in (partPath, validatorPath):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _evictIfNecessary(self, keepPath):
+        maxSizeBytes = self._config.tryGetInt(DefaultMaxSizeMb, 'DownloadCache', 'MaxSizeMb') * 1024 * 1024
+
+        cacheDir = self._getCacheDir()
+        entries = []
+
+        for fileName in os.listdir(cacheDir):
+            if not fileName.endswith('.unitypackage'):
+                continue
+
+            fullPath = os.path.join(cacheDir, fileName)
+
+            try:
+                fileStat = os.stat(fullPath)
+            except OSError:
+                # Removed by another process since we listed the directory
+                continue
+
+            entries.append((fileStat.st_mtime, fileStat.st_size, fullPath))
+
+        totalSize = sum(x[1] for x in entries)
+
+        # Oldest first
+        entries.sort()
+
+        for mtime, size, fullPath in entries:
+            if totalSize <= maxSizeBytes:
+                break
+
+            if fullPath == keepPath:
+                continue
+
+            self._log.debug("Removing '{0}' from download cache to stay under size limit", fullPath)
+
+            try:
+                os.remove(fullPath)
+            except OSError as e:
+                # This can happen when the file is open in another process (eg. another install reading from it)
+                self._log.warn("Failed to remove '{0}' from download cache.  Details: {1}", fullPath, e)
+                continue
+
+            totalSize -= size
+
+class CorruptDownloadException(Exception):
+    pass
+
+# Returns a file-like object that reads from the given http response and raises CorruptDownloadException
+# once it reaches the end if the data does not match the size and sha256 of the given release
+# Every byte that is read is also written to outFile when it is given
+def createVerifyingStream(response, releaseInfo, outFile = None):
+    return _DownloadStream(response, outFile, hashlib.sha256(), 0, releaseInfo)
+
+class _DownloadStream:
+    '''
+    File-like object that reads from the http response while writing every byte to the hash and the cache
+    file, if there is one
+    The download is verified as soon as the end of the response is reached
+    '''
+    def __init__(self, response, outFile, hasher, startOffset, releaseInfo):
+        self._response = response
+        self._outFile = outFile
+        self._hasher = hasher
+        self._numBytes = startOffset
+        self._releaseInfo = releaseInfo
+        self._isFinished = False
+
+    def read(self, size = -1):
+        if size == None or size < 0:
+            return b''.join(iter(lambda: self.read(_DownloadChunkSize), b''))
+
+        if self._isFinished or size == 0:
+            return b''
+
+        chunk = self._response.read(size)
+
+        if chunk:
+            self._hasher.update(chunk)
+
+            if self._outFile:
+                self._outFile.write(chunk)
+
+            self._numBytes += len(chunk)
+        else:
+            self._isFinished = True
+            self._verify()
+
+        return chunk
+
+    def readToEnd(self):
+        while self.read(_DownloadChunkSize):
+            pass
+
+    def _verify(self):
+        info = self._releaseInfo
+
+        if info.compressedSize != None and self._numBytes != info.compressedSize:
+            raise CorruptDownloadException("Downloaded release '{0}' has size {1} but expected {2}".format(info.name, self._numBytes, info.compressedSize))
+
+        sha256 = self._hasher.hexdigest()
+
+        if info.sha256 and info.sha256.lower() != sha256:
+            raise CorruptDownloadException("Downloaded release '{0}' is corrupt - expected sha256 '{1}' but found '{2}'".format(info.name, info.sha256, sha256))
@@ -0,0 +1,83 @@
+
+import os
+import fnmatch
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+from mtm.ioc.Inject import InjectOptional
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.util.Assert import *
+import mtm.util.Util as Util
+
+DefaultNumScanWorkers = 8
+
+class ReleaseFolderScanner:
+    '''
+    Finds all the unitypackage files underneath a given folder and analyzes them
+    Analyzing is mostly waiting on disk/network so it is done on a bounded pool of threads
+    while we continue to walk the directory tree
+    '''
+    _config = Inject('Config')
+    _varMgr = Inject('VarManager')
+    _packageAnalyzer = Inject('UnityPackageAnalyzer')
+    _releaseInfoCache = InjectOptional('ReleaseInfoCache', None)
+
+    # Returns a list of (path, releaseInfo) tuples in sorted path order
+    # If computeHashes is set then the sha256 of each file will be filled in as well
+    def scan(self, folderPath, computeHashes = False):
+        return self.analyze(self.findUnityPackages(folderPath), computeHashes)
+
+    # Returns a list of (path, releaseInfo) tuples in the same order as the given paths
+    # paths can be a generator, in which case analysis starts before it is exhausted
+    def analyze(self, paths, computeHashes = False):
+        numWorkers = self._config.tryGetInt(DefaultNumScanWorkers, 'ReleaseScanWorkers')
+
+        if numWorkers <= 1:
+            return [(path, self._getReleaseInfo(path, computeHashes)) for path in paths]
+
+        results = []
+        pending = collections.deque()
+
+        # Limit the number of outstanding jobs so memory use stays bounded for very large folders
+        maxPending = numWorkers * 4
+
+        with ThreadPoolExecutor(max_workers = numWorkers) as executor:
+            for path in paths:
+                pending.append((path, executor.submit(self._getReleaseInfo, path, computeHashes)))
+
+                while len(pending) >= maxPending:
+                    self._popResult(pending, results)
+
+            while pending:
+                self._popResult(pending, results)
+
+        return results
+
+    def _popResult(self, pending, results):
+        path, future = pending.popleft()
+        results.append((path, future.result()))
+
+    def _getReleaseInfo(self, path, computeHashes):
+        if self._releaseInfoCache:
+            info = self._releaseInfoCache.getReleaseInfo(path)
+        else:
+            info = self._packageAnalyzer.getReleaseInfoFromUnityPackage(path)
+
+        if computeHashes:
+            info.sha256 = Util.computeFileSha256(path)
+
+        return info
+
+    def findUnityPackages(self, folderPath):
+        folderPath = self._varMgr.expand(folderPath)
+
+        for root, dirs, files in os.walk(folderPath):
+            # Sort in place so that os.walk visits sub directories in a deterministic order too
+            dirs.sort()
+
+            for fileName in sorted(files):
+                if fnmatch.fnmatch(fileName, '*.unitypackage'):
+                    yield os.path.join(root, fileName)
@@ -1,5 +1,6 @@
 
 from mtm.util.Assert import *
+from datetime import datetime
 
 class ReleaseInfo:
     def __init__(self):
@@ -22,6 +23,10 @@ class ReleaseInfo:
         # This is null if not known
         self.compressedSize = None
 
+        # Hex encoded sha256 of the unitypackage file
+        # This is null if not known
+        self.sha256 = None
+
 class AssetStoreInfo:
     def __init__(self):
         self.publisherId = None
@@ -36,3 +41,57 @@ class AssetStoreInfo:
         self.linkId = None
         self.linkType = None
 
+
+_DateFormat = '%Y-%m-%dT%H:%M:%S.%f'
+
+# Used when storing release infos in json files such as the release info cache
+def toJsonDict(info):
+    result = dict(info.__dict__)
+    result['fileModificationDate'] = dateToString(info.fileModificationDate)
+
+    if info.assetStoreInfo:
+        assetStoreDict = dict(info.assetStoreInfo.__dict__)
+        assetStoreDict['publishDate'] = dateToString(info.assetStoreInfo.publishDate)
+        result['assetStoreInfo'] = assetStoreDict
+
+    return result
+
+def fromJsonDict(data):
+    info = ReleaseInfo()
+    info.__dict__.update(data)
+    info.fileModificationDate = dateFromString(info.fileModificationDate)
+
+    if info.assetStoreInfo:
+        assetStoreInfo = AssetStoreInfo()
+        assetStoreInfo.__dict__.update(info.assetStoreInfo)
+        assetStoreInfo.publishDate = dateFromString(assetStoreInfo.publishDate)
+        info.assetStoreInfo = assetStoreInfo
+
+    return info
+
+# Converts the result of YamlSerializer.deserialize back into a ReleaseInfo
+# This ensures that fields that were left out of the yaml because they were null are still defined
+def fromYamlData(yamlData):
+    info = ReleaseInfo()
+    info.__dict__.update(yamlData.__dict__)
+
+    if info.assetStoreInfo:
+        assetStoreInfo = AssetStoreInfo()
+        assetStoreInfo.__dict__.update(info.assetStoreInfo.__dict__)
+        info.assetStoreInfo = assetStoreInfo
+    else:
+        info.assetStoreInfo = None
+
+    return info
+
+def dateToString(value):
+    if value == None:
+        return None
+
+    return value.strftime(_DateFormat)
+
+def dateFromString(value):
+    if value == None:
+        return None
+
+    return datetime.strptime(value, _DateFormat)
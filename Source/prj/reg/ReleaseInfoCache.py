@@ -0,0 +1,191 @@
+
+import os
+import json
+import threading
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+import prj.reg.ReleaseInfo as ReleaseInfo
+import prj.reg.UnityPackageAnalyzer as UnityPackageAnalyzer
+
+from mtm.util.Assert import *
+
+# Increment this whenever the format of the stored release infos changes so that old caches are discarded
+CacheVersion = 1
+
+ReleaseInfoCacheFileName = 'ReleaseInfoCache.json'
+
+class ReleaseInfoCache:
+    '''
+    Stores the analyzed release info for every unitypackage file that we've seen, keyed by path
+    The size and modification time of each file are stored as well so that we only need to re-analyze
+    files that have been added or changed since the last run
+    The list of assets inside each file is stored alongside the release info, once it has been asked for
+    Remote releases have no local file, so their asset lists are stored by release id, version and hash instead
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
+    _packageAnalyzer = Inject('UnityPackageAnalyzer')
+
+    def __init__(self):
+        self._entries = None
+        self._remoteContents = None
+        self._isDirty = False
+        # Releases are analyzed on multiple threads so guard access to the entries
+        self._lock = threading.RLock()
+
+    def _getCachePath(self):
+        if not self._varMgr.hasKey('ProjenyCacheDir'):
+            return None
+
+        return self._varMgr.expandPath(os.path.join('[ProjenyCacheDir]', ReleaseInfoCacheFileName))
+
+    def _lazyLoad(self):
+        with self._lock:
+            if self._entries == None:
+                self._load()
+
+    def _load(self):
+        self._entries = {}
+        self._remoteContents = {}
+
+        cachePath = self._getCachePath()
+
+        if cachePath == None or not os.path.isfile(cachePath):
+            return
+
+        try:
+            with open(cachePath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            if data.get('version') == CacheVersion:
+                self._entries = data['entries']
+                self._remoteContents = data.get('remoteContents', {})
+            else:
+                self._log.debug("Ignoring release info cache at '{0}' since it was created by a different version", cachePath)
+        except Exception as e:
+            self._log.warn("Failed to load release info cache at '{0}', all releases will be re-analyzed.  Details: {1}", cachePath, e)
+
+    def getReleaseInfo(self, unityPackagePath):
+        self._lazyLoad()
+
+        return self._getReleaseInfo(unityPackagePath, os.stat(unityPackagePath))
+
+    def _getReleaseInfo(self, unityPackagePath, fileStat):
+        with self._lock:
+            entry = self._entries.get(unityPackagePath)
+
+        if self._isEntryValid(entry, fileStat):
+            info = ReleaseInfo.fromJsonDict(entry['release'])
+            info.localPath = unityPackagePath
+            return info
+
+        info = self._packageAnalyzer.getReleaseInfoFromUnityPackage(unityPackagePath)
+
+        with self._lock:
+            self._entries[unityPackagePath] = {
+                'size': fileStat.st_size,
+                'mtime': fileStat.st_mtime_ns,
+                'release': ReleaseInfo.toJsonDict(info),
+            }
+            self._isDirty = True
+
+        return info
+
+    def _isEntryValid(self, entry, fileStat):
+        return entry != None and entry['size'] == fileStat.st_size and entry['mtime'] == fileStat.st_mtime_ns
+
+    # Returns a list of UnityPackageEntry for every asset in the given unitypackage file
+    def getContents(self, unityPackagePath):
+        self._lazyLoad()
+
+        fileStat = os.stat(unityPackagePath)
+
+        with self._lock:
+            entry = self._entries.get(unityPackagePath)
+
+        if self._isEntryValid(entry, fileStat) and 'contents' in entry:
+            return UnityPackageAnalyzer.contentsFromJsonList(entry['contents'])
+
+        contents = self._packageAnalyzer.getContentsFromUnityPackage(unityPackagePath)
+
+        # Make sure the release info is up to date as well, since the contents are only valid alongside it
+        self._getReleaseInfo(unityPackagePath, fileStat)
+
+        with self._lock:
+            self._entries[unityPackagePath]['contents'] = UnityPackageAnalyzer.contentsToJsonList(contents)
+            self._isDirty = True
+
+        return contents
+
+    def _getRemoteContentsKey(self, releaseInfo):
+        # Fall back to the size when there is no hash, which is usually enough to tell re-uploaded packages apart
+        contentKey = releaseInfo.sha256 if releaseInfo.sha256 else 'size{0}'.format(releaseInfo.compressedSize)
+        return '{0}:{1}:{2}'.format(releaseInfo.id, releaseInfo.versionCode, contentKey)
+
+    # Returns None if the contents of the given remote release have not been stored yet
+    def tryGetRemoteContents(self, releaseInfo):
+        self._lazyLoad()
+
+        with self._lock:
+            data = self._remoteContents.get(self._getRemoteContentsKey(releaseInfo))
+
+        if data == None:
+            return None
+
+        return UnityPackageAnalyzer.contentsFromJsonList(data)
+
+    def setRemoteContents(self, releaseInfo, contents):
+        self._lazyLoad()
+
+        with self._lock:
+            self._remoteContents[self._getRemoteContentsKey(releaseInfo)] = UnityPackageAnalyzer.contentsToJsonList(contents)
+            self._isDirty = True
+
+    # Drops the entries underneath the given folder that no longer exist
+    def removeMissing(self, folderPath, existingPaths):
+        self._lazyLoad()
+
+        # The folder can be given with variables or in a different form than the stored paths
+        folderPrefix = os.path.join(self._normalizePath(folderPath), '')
+        existingPaths = set(self._normalizePath(x) for x in existingPaths)
+
+        with self._lock:
+            for path in list(self._entries.keys()):
+                normalizedPath = self._normalizePath(path)
+
+                if normalizedPath.startswith(folderPrefix) and normalizedPath not in existingPaths:
+                    del self._entries[path]
+                    self._isDirty = True
+
+    def _normalizePath(self, path):
+        return os.path.normcase(self._varMgr.expandPath(path))
+
+    def save(self):
+        with self._lock:
+            self._saveInternal()
+
+    def _saveInternal(self):
+        if not self._isDirty:
+            return
+
+        cachePath = self._getCachePath()
+
+        if cachePath == None:
+            return
+
+        self._sys.makeMissingDirectoriesInPath(cachePath)
+
+        # Write to a temporary file first so that we never leave a half written cache behind
+        tempPath = cachePath + '.tmp'
+
+        with open(tempPath, 'w', encoding='utf-8') as f:
+            json.dump({ 'version': CacheVersion, 'entries': self._entries, 'remoteContents': self._remoteContents }, f, separators=(',', ':'))
+
+        os.replace(tempPath, cachePath)
+        self._isDirty = False
+
+        self._log.debug("Saved release info cache with {0} entries to '{1}'", len(self._entries), cachePath)
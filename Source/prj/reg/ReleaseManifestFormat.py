@@ -0,0 +1,50 @@
+
+import io
+import gzip
+import json
+
+import prj.reg.ReleaseInfo as ReleaseInfo
+
+from mtm.util.Assert import *
+
+# Use TXT to play nicely with MIME types
+ReleaseManifestFileName = 'ProjenyReleaseManifest.txt'
+
+# Same content as the yaml manifest, but as gzip'd JSON lines, which is much faster to download and parse
+# The first line is a header and every line after that is a single release
+CompactManifestFileName = 'ProjenyReleaseManifest.jsonl.gz'
+
+# Increment this whenever the compact format changes in a way that older clients can't read
+CompactManifestVersion = 1
+
+def serializeCompact(releaseInfos):
+    lines = [json.dumps({ 'version': CompactManifestVersion, 'releaseCount': len(releaseInfos) }, separators=(',', ':'))]
+
+    for info in releaseInfos:
+        lines.append(json.dumps(ReleaseInfo.toJsonDict(info), separators=(',', ':'), sort_keys=True))
+
+    output = io.BytesIO()
+
+    # Use a fixed timestamp so that the same releases always produce the same bytes
+    with gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as f:
+        f.write('\n'.join(lines).encode('utf-8'))
+
+    return output.getvalue()
+
+# Returns a list of ReleaseInfo
+def deserializeCompact(data):
+    lines = gzip.decompress(data).decode('utf-8').splitlines()
+
+    assertThat(len(lines) > 0, "Compact release manifest is empty")
+
+    header = json.loads(lines[0])
+
+    assertThat(header.get('version') == CompactManifestVersion,
+        "Unsupported compact release manifest version '{0}' (expected '{1}')", header.get('version'), CompactManifestVersion)
+
+    releaseInfos = [ReleaseInfo.fromJsonDict(json.loads(x)) for x in lines[1:] if x]
+
+    assertThat(len(releaseInfos) == header['releaseCount'],
+        "Compact release manifest is truncated - expected {0} releases but found {1}", header['releaseCount'], len(releaseInfos))
+
+    return releaseInfos
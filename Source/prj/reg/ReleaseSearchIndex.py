@@ -0,0 +1,109 @@
+
+import re
+import bisect
+
+from mtm.util.Assert import *
+
+# How much a match in each field counts towards the score of a release
+_FieldWeights = [
+    ('name', 4),
+    ('publisherLabel', 2),
+    ('categoryLabel', 2),
+    ('version', 1),
+]
+
+# Matching a whole word counts for more than just matching the start of one
+_ExactMatchMultiplier = 2
+
+_WordRegex = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+def tokenize(text):
+    if not text:
+        return []
+
+    tokens = []
+
+    # Split on anything that isn't a letter or number, and also split up camel case
+    # so that for example 'UnityTestTools' can be found by searching for 'test'
+    for word in re.split(r'[^A-Za-z0-9]+', str(text)):
+        if not word:
+            continue
+
+        tokens.append(word.lower())
+
+        parts = _WordRegex.findall(word)
+
+        if len(parts) > 1:
+            tokens.extend(x.lower() for x in parts)
+
+    return tokens
+
+class ReleaseSearchIndex:
+    '''
+    Inverted index over the name, publisher, category and version of a list of releases
+    Every word of the query must match the start of some word in one of the fields, and results are
+    ranked by how many of the words match, in which fields, and whether they match whole words
+    '''
+    def __init__(self, releases):
+        self._releases = releases
+
+        # Maps token -> dictionary of release index -> weight
+        self._postings = {}
+
+        for releaseIndex, release in enumerate(releases):
+            for fieldName, weight in _FieldWeights:
+                for token in tokenize(self._getFieldValue(release, fieldName)):
+                    entries = self._postings.setdefault(token, {})
+                    entries[releaseIndex] = max(entries.get(releaseIndex, 0), weight)
+
+        # Sorted so that prefix matches can be found with a binary search
+        self._sortedTokens = sorted(self._postings.keys())
+
+    def _getFieldValue(self, release, fieldName):
+        if fieldName in ('publisherLabel', 'categoryLabel'):
+            return getattr(release.assetStoreInfo, fieldName) if release.assetStoreInfo else None
+
+        return getattr(release, fieldName)
+
+    # Returns a tuple of (totalNumMatches, releases), where releases are the matches
+    # from offset to offset + limit with the best matches first
+    def search(self, query, offset, limit):
+        queryTokens = set(tokenize(query))
+
+        if len(queryTokens) == 0:
+            return (0, [])
+
+        scores = None
+
+        for queryToken in queryTokens:
+            tokenScores = self._getScoresForToken(queryToken)
+
+            if scores == None:
+                scores = tokenScores
+            else:
+                # Every word must match
+                scores = { x: scores[x] + tokenScores[x] for x in scores.keys() if x in tokenScores }
+
+            if len(scores) == 0:
+                return (0, [])
+
+        ranked = sorted(scores.items(), key = lambda x: (-x[1], self._releases[x[0]].name.lower()))
+
+        return (len(ranked), [self._releases[x[0]] for x in ranked[offset:offset + limit]])
+
+    # Returns a dictionary of release index -> score for all releases that match the given query token
+    def _getScoresForToken(self, queryToken):
+        scores = {}
+
+        for tokenIndex in range(bisect.bisect_left(self._sortedTokens, queryToken), len(self._sortedTokens)):
+            token = self._sortedTokens[tokenIndex]
+
+            if not token.startswith(queryToken):
+                break
+
+            multiplier = _ExactMatchMultiplier if token == queryToken else 1
+
+            for releaseIndex, weight in self._postings[token].items():
+                scores[releaseIndex] = max(scores.get(releaseIndex, 0), weight * multiplier)
+
+        return scores
@@ -2,6 +2,7 @@
 from datetime import datetime
 from mtm.ioc.Inject import Inject
 from mtm.ioc.Inject import InjectMany
+from mtm.ioc.Inject import InjectOptional
 import mtm.ioc.IocAssertions as Assertions
 
 from mtm.util.Assert import *
@@ -9,45 +10,106 @@ from mtm.util.Assert import *
 from prj.reg.LocalFolderReleaseSource import LocalFolderReleaseSource
 from prj.reg.AssetStoreCacheReleaseSource import AssetStoreCacheReleaseSource
 from prj.reg.RemoteServerReleaseSource import RemoteServerReleaseSource
+from prj.reg.ReleaseSearchIndex import ReleaseSearchIndex
 
 import mtm.util.MiscUtil as MiscUtil
+import mtm.util.Util as Util
 
 from prj.reg.PackageInfo import PackageInstallInfo
 
 import os
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import mtm.util.YamlSerializer as YamlSerializer
 
 from prj.main.PackageManager import InstallInfoFileName
 
+DefaultNumInstallWorkers = 4
+
+DefaultSearchLimit = 20
+
 class ReleaseSourceManager:
     _varMgr = Inject('VarManager')
     _log = Inject('Logger')
     _config = Inject('Config')
     _sys = Inject('SystemHelper')
     _packageManager = Inject('PackageManager')
+    _packageExtractor = Inject('UnityPackageExtractor')
+    _junctionHelper = Inject('JunctionHelper')
+    _releaseStore = InjectOptional('ReleaseStore', None)
+    _packageInventory = InjectOptional('PackageInventory', None)
+    _assetGuidIndex = InjectOptional('AssetGuidIndex', None)
 
     def __init__(self):
         self._hasInitialized = False
         self._releaseSources = []
 
+        self._releasesByIdAndVersionCode = {}
+        self._releasesByNameAndVersion = {}
+        self._releasesById = {}
+        self._sortedReleases = []
+        self._searchIndex = None
+
     def _lazyInit(self):
         if self._hasInitialized:
             return
 
         self._hasInitialized = True
+
+        sources = []
         for regSettings in self._config.getList('ReleaseSources'):
             for pair in regSettings.items():
-                reg = self._createReleaseSource(pair[0], pair[1])
-                reg.init()
-                self._releaseSources.append(reg)
+                sources.append(self._createReleaseSource(pair[0], pair[1]))
+
+        # Sources are mostly waiting on the network or the disk so initialize them all at once,
+        # so that the total time is that of the slowest source instead of the sum of all of them
+        if len(sources) > 0:
+            with ThreadPoolExecutor(max_workers = len(sources)) as executor:
+                futures = [executor.submit(self._initReleaseSource, x) for x in sources]
+
+            for source, future in zip(sources, futures):
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    self._log.error("Failed to initialize release source '{0}'.  Its releases will not be available.  Details: {1}", source.getName(), e)
+                    continue
+
+                self._log.info("Initialized release source '{0}' in {1}", source.getName(), Util.formatTimeDelta(seconds))
+                self._releaseSources.append(source)
+
+        self._buildReleaseIndexes()
 
         self._log.info("Finished initializing Release Source Manager, found {0} releases in total", self._getTotalReleaseCount())
 
+    # Returns the number of seconds it took
+    def _initReleaseSource(self, source):
+        startTime = time.time()
+        source.init()
+        return time.time() - startTime
+
+    # Note that the releases property on some sources creates a new list every time
+    # so we only read them once here and then do all lookups using these indexes
+    def _buildReleaseIndexes(self):
+        for source in self._releaseSources:
+            for release in source.releases:
+                pair = (release, source)
+
+                # Use setdefault so that when there are duplicates, the first source listed in the config wins
+                self._releasesByIdAndVersionCode.setdefault((release.id, release.versionCode), pair)
+                self._releasesByNameAndVersion.setdefault((release.name, release.version), pair)
+                self._releasesById.setdefault(release.id, []).append(pair)
+
+                self._sortedReleases.append(release)
+
+        for pairs in self._releasesById.values():
+            # Stable sort so that ties keep the source order
+            pairs.sort(key = lambda x: x[0].versionCode or 0, reverse = True)
+
+        self._sortedReleases.sort(key = lambda x: x.name.lower())
+
     def _getTotalReleaseCount(self):
-        total = 0
-        for reg in self._releaseSources:
-            total += len(reg.releases)
-        return total
+        return len(self._sortedReleases)
 
     def _createReleaseSource(self, regType, settings):
         if regType == 'LocalFolder':
@@ -68,30 +130,134 @@ class ReleaseSourceManager:
             for release in self.lookupAllReleases():
                 self._log.info("{0} ({1}) ({2})", release.name, release.version, release.versionCode)
 
+    # Returns a tuple of (totalNumMatches, releases) where releases contains at most limit of the
+    # matches starting at offset, with the best matches first
+    def searchReleases(self, query, offset = 0, limit = DefaultSearchLimit):
+        self._lazyInit()
+
+        # Only build this when needed since most runs never search
+        if self._searchIndex == None:
+            self._searchIndex = ReleaseSearchIndex(self._sortedReleases)
+
+        return self._searchIndex.search(query, offset, limit)
+
+    def listSearchResults(self, query, offset = 0, limit = DefaultSearchLimit):
+        totalNumMatches, releases = self.searchReleases(query, offset, limit)
+
+        with self._log.heading("Found {0} releases matching '{1}'", totalNumMatches, query):
+            if len(releases) < totalNumMatches:
+                self._log.info("Showing results {0} to {1}", offset + 1, offset + len(releases))
+
+            for release in releases:
+                self._log.info("{0} ({1}) ({2})", release.name, release.version, release.versionCode)
+
     def lookupAllReleases(self):
         self._lazyInit()
 
-        result = []
-        for source in self._releaseSources:
-            for release in source.releases:
-                result.append(release)
-        result.sort(key = lambda x: x.name.lower())
-        return result
+        # Return a copy so callers can't modify our cached list
+        return list(self._sortedReleases)
+
+    # Returns all releases with the given id, with the newest version first
+    def lookupAllVersionsOfRelease(self, releaseId):
+        self._lazyInit()
+        return [x[0] for x in self._releasesById.get(releaseId, [])]
+
+    # Returns None if no releases exist with the given id
+    def tryGetLatestRelease(self, releaseId):
+        self._lazyInit()
+        return self._findLatestReleaseInfoAndSourceById(releaseId)[0]
+
+    def _findLatestReleaseInfoAndSourceById(self, releaseId):
+        pairs = self._releasesById.get(releaseId)
+
+        if not pairs:
+            return (None, None)
+
+        return pairs[0]
+
+    # Returns a list of (folderInfo, packageInfo, latestReleaseInfo) for every package in the given project
+    # that was installed from a release that has a newer version available in one of the release sources
+    def lookupOutdatedPackages(self, projectName):
+        self._lazyInit()
+
+        results = []
+
+        for folderInfo in self._packageManager.getAllPackageFolderInfos(projectName):
+            for packageInfo in folderInfo.packages:
+                installInfo = packageInfo.installInfo
+
+                if not installInfo or not installInfo.releaseInfo:
+                    continue
+
+                installedRelease = installInfo.releaseInfo
+                latestRelease = self._findLatestReleaseInfoAndSourceById(installedRelease.id)[0]
+
+                if latestRelease and (latestRelease.versionCode or 0) > (installedRelease.versionCode or 0):
+                    results.append((folderInfo, packageInfo, latestRelease))
+
+        return results
+
+    def listOutdatedReleases(self, projectNames):
+        self._lazyInit()
+
+        with self._log.heading("Checking {0} project(s) for outdated releases", len(projectNames)):
+            for projectName in projectNames:
+                outdatedPackages = self.lookupOutdatedPackages(projectName)
+
+                if len(outdatedPackages) == 0:
+                    self._log.info("Project '{0}': All releases are up to date", projectName)
+                    continue
+
+                self._log.info("Project '{0}': Found {1} outdated release(s)", projectName, len(outdatedPackages))
+
+                for folderInfo, packageInfo, latestRelease in outdatedPackages:
+                    installedRelease = packageInfo.installInfo.releaseInfo
+                    self._log.info("  {0}: '{1}' version {2} -> {3}", packageInfo.name, installedRelease.name, installedRelease.version, latestRelease.version)
+
+    # Upgrades every outdated release in the given projects to the latest version
+    def upgradeOutdatedReleases(self, projectNames, suppressPrompts = False):
+        self._lazyInit()
+
+        # Package folders are often shared between projects, so make sure we only upgrade each one once
+        # Maps folder path -> (projectName, folderPath, dictionary of release id -> (releaseInfo, releaseSource))
+        upgradesByFolder = collections.OrderedDict()
+
+        for projectName in projectNames:
+            releaseIds = set()
+
+            for folderInfo, packageInfo, latestRelease in self.lookupOutdatedPackages(projectName):
+                # Installing removes any other copies of the release in the project's other package folders
+                if latestRelease.id in releaseIds:
+                    continue
+
+                releaseIds.add(latestRelease.id)
+
+                folderKey = os.path.normcase(self._varMgr.expandPath(folderInfo.path))
+                upgrades = upgradesByFolder.setdefault(folderKey, (projectName, folderInfo.path, {}))[2]
+                upgrades[latestRelease.id] = self._findLatestReleaseInfoAndSourceById(latestRelease.id)
+
+        numUpgrades = sum(len(x[2]) for x in upgradesByFolder.values())
+
+        if numUpgrades == 0:
+            self._log.info("All releases are up to date")
+            return
+
+        if not suppressPrompts:
+            shouldContinue = MiscUtil.confirmChoice("Are you sure you want to upgrade {0} release(s) in {1} package folder(s)? (y/n)".format(numUpgrades, len(upgradesByFolder)))
+            assertThat(shouldContinue, 'User aborted')
+
+        with self._log.heading("Upgrading {0} release(s)", numUpgrades):
+            # Install them all on the same pool so that the number of concurrent installs stays the same
+            # no matter how the upgrades are spread across the package folders
+            # We already asked above
+            self._installReleaseBatches([(projectName, folderPath, list(upgrades.values())) for projectName, folderPath, upgrades in upgradesByFolder.values()], True)
 
     def _findReleaseInfoAndSourceByIdAndVersionCode(self, releaseId, releaseVersionCode):
         assertIsType(releaseVersionCode, int)
-        for source in self._releaseSources:
-            for release in source.releases:
-                if release.id == releaseId and release.versionCode == releaseVersionCode:
-                    return (release, source)
-        return (None, None)
+        return self._releasesByIdAndVersionCode.get((releaseId, releaseVersionCode), (None, None))
 
     def _findReleaseInfoAndSourceByNameAndVersion(self, releaseName, releaseVersion):
-        for source in self._releaseSources:
-            for release in source.releases:
-                if release.name == releaseName and release.version == releaseVersion:
-                    return (release, source)
-        return (None, None)
+        return self._releasesByNameAndVersion.get((releaseName, releaseVersion), (None, None))
 
     def installReleaseByName(self, projectName, packageRoot, releaseName, releaseVersion, suppressPrompts = False):
         assertThat(releaseName)
@@ -107,7 +273,7 @@ class ReleaseSourceManager:
             assertThat(releaseInfo, "Failed to install release '{0}' (version {1}) - could not find it in any of the release sources.\nSources checked: \n  {2}\nTry listing all available release with the -lr command"
                .format(releaseName, releaseVersion, "\n  ".join([x.getName() for x in self._releaseSources])))
 
-            self._installReleaseInternal(projectName, packageRoot, releaseInfo, releaseSource, suppressPrompts)
+            self._installReleasesInternal(projectName, packageRoot, [(releaseInfo, releaseSource)], suppressPrompts)
 
     # We need the projectName because that's where the package folders are defined and we need to know if
     # we are replacing an existing one
@@ -115,71 +281,299 @@ class ReleaseSourceManager:
 
         self._log.info("Attempting to install release with ID '{0}' into package root '{1}' and version code '{2}'", releaseId, packageRoot, releaseVersionCode)
 
-        try:
-            releaseVersionCode = int(releaseVersionCode)
-        except ValueError:
-            assertThat(False, "Invalid version code '{0}' - must be convertable to an integer", releaseVersionCode)
-
         assertThat(releaseVersionCode != None, 'Invalid release version code supplied')
-        assertThat(releaseId)
+
+        self.installReleases(projectName, packageRoot, [(releaseId, releaseVersionCode)], suppressPrompts)
+
+    # releaseRequests is a list of (releaseId, versionCode) tuples
+    # If the version code is None then the latest version of that release is installed
+    # This is much faster than installing the releases one at a time, since the package folders are only
+    # scanned once and the releases are downloaded and extracted in parallel
+    def installReleases(self, projectName, packageRoot, releaseRequests, suppressPrompts = False):
+        assertThat(len(releaseRequests) > 0, "No releases given to install")
 
         self._lazyInit()
 
         assertThat(len(self._releaseSources) > 0, "Could not find any release sources to search for the given release")
 
-        releaseInfo, releaseSource = self._findReleaseInfoAndSourceByIdAndVersionCode(releaseId, releaseVersionCode)
+        releasePairs = [self._getReleaseInfoAndSourceForRequest(releaseId, releaseVersionCode) for releaseId, releaseVersionCode in releaseRequests]
+
+        self._installReleasesInternal(projectName, packageRoot, releasePairs, suppressPrompts)
+
+    # If the version code is None then the latest version of the release is returned
+    def _getReleaseInfoAndSourceForRequest(self, releaseId, releaseVersionCode):
+        assertThat(releaseId)
 
-        assertThat(releaseInfo, "Failed to install release '{0}' - could not find it in any of the release sources.\nSources checked: \n  {1}\nTry listing all available release with the -lr command"
+        if releaseVersionCode == None:
+            releaseInfo, releaseSource = self._findLatestReleaseInfoAndSourceById(releaseId)
+        else:
+            try:
+                releaseVersionCode = int(releaseVersionCode)
+            except ValueError:
+                assertThat(False, "Invalid version code '{0}' - must be convertable to an integer", releaseVersionCode)
+
+            releaseInfo, releaseSource = self._findReleaseInfoAndSourceByIdAndVersionCode(releaseId, releaseVersionCode)
+
+        assertThat(releaseInfo, "Could not find release '{0}' in any of the release sources.\nSources checked: \n  {1}\nTry listing all available release with the -lr command"
            .format(releaseId, "\n  ".join([x.getName() for x in self._releaseSources])))
 
-        self._installReleaseInternal(projectName, packageRoot, releaseInfo, releaseSource, suppressPrompts)
+        return (releaseInfo, releaseSource)
 
-    def _installReleaseInternal(self, projectName, packageRoot, releaseInfo, releaseSource, suppressPrompts = False):
+    # Returns a tuple of (releaseInfo, contents) where contents is a list of UnityPackageEntry for every asset
+    # in the given release, sorted by path name
+    # The release is only read and never extracted, and the result is cached, so this is a cheap way to
+    # see what a release will add before installing it
+    # If the version code is None then the latest version of the release is used
+    def lookupReleaseContents(self, releaseId, releaseVersionCode = None):
+        self._lazyInit()
 
-        if not self._sys.directoryExists(packageRoot):
-            self._sys.createDirectory(packageRoot)
+        releaseInfo, releaseSource = self._getReleaseInfoAndSourceForRequest(releaseId, releaseVersionCode)
 
-        with self._log.heading("Installing release '{0}' (version {1})", releaseInfo.name, releaseInfo.version):
-            installDirName = None
-            for folderInfo in self._packageManager.getAllPackageFolderInfos(projectName):
-                for packageInfo in folderInfo.packages:
-                    installInfo = packageInfo.installInfo
+        return (releaseInfo, releaseSource.getReleaseContents(releaseInfo))
+
+    def listReleaseContents(self, releaseId, releaseVersionCode = None):
+        releaseInfo, contents = self.lookupReleaseContents(releaseId, releaseVersionCode)
+
+        totalSize = sum(x.size for x in contents if x.size != None)
+
+        with self._log.heading("Release '{0}' ({1}) contains {2} assets with a total size of {3} bytes", releaseInfo.name, releaseInfo.version, len(contents), totalSize):
+            for entry in contents:
+                if entry.size == None:
+                    self._log.info("{0}/", entry.pathName)
+                else:
+                    self._log.info("{0} ({1} bytes)", entry.pathName, entry.size)
+
+    def _installReleasesInternal(self, projectName, packageRoot, releasePairs, suppressPrompts = False):
+        self._installReleaseBatches([(projectName, packageRoot, releasePairs)], suppressPrompts)
+
+    # batches is a list of (projectName, packageRoot, releasePairs) tuples
+    # All the releases are installed on a single pool of workers, once the prompts for every batch are done
+    def _installReleaseBatches(self, batches, suppressPrompts):
+        numReleases = sum(len(x[2]) for x in batches)
+
+        with self._log.heading("Installing {0} release(s)", numReleases):
+            # Every folder that we add packages to or remove packages from
+            changedFolders = set()
+
+            # Do all the prompting up front since the installs themselves happen on other threads
+            jobs = []
+
+            for projectName, packageRoot, releasePairs in batches:
+                releaseIds = [x[0].id for x in releasePairs]
+                assertThat(len(set(releaseIds)) == len(releaseIds), "Cannot install more than one version of the same release at once")
+
+                if not self._sys.directoryExists(packageRoot):
+                    self._sys.createDirectory(packageRoot)
+
+                installedPackages = self._getInstalledPackagesByReleaseId(projectName)
+
+                self._checkReleasesForGuidCollisions(projectName, releasePairs, installedPackages)
+
+                changedFolders.add(packageRoot)
+
+                for releaseInfo, releaseSource in releasePairs:
+                    changedFolders.update(x[0].path for x in installedPackages.get(releaseInfo.id, []))
+
+                    installDirName, isReinstall = self._removeExistingInstalls(packageRoot, releaseInfo, installedPackages.get(releaseInfo.id, []), suppressPrompts)
+                    jobs.append((packageRoot, releaseInfo, releaseSource, installDirName, isReinstall))
+
+            numWorkers = self._config.tryGetInt(DefaultNumInstallWorkers, 'ReleaseInstallWorkers')
+
+            # Falling back to extracting with Unity would mean running several copies of Unity at once
+            if not self._packageExtractor.canExtractFromStream():
+                numWorkers = 1
+
+            with ThreadPoolExecutor(max_workers = max(1, min(numWorkers, len(jobs)))) as executor:
+                futures = [executor.submit(self._installRelease, *x) for x in jobs]
+
+            installResults = []
+            failedReleases = []
+
+            for job, future in zip(jobs, futures):
+                releaseInfo = job[1]
+
+                try:
+                    installResults.append((releaseInfo, future.result()))
+                except Exception as e:
+                    self._log.error("Failed to install release '{0}' (version {1}).  Details: {2}", releaseInfo.name, releaseInfo.version, e)
+                    failedReleases.append(releaseInfo)
+
+            # Write all the install info files together at the end
+            installDate = datetime.utcnow()
+
+            for releaseInfo, (destDir, linkPath, wasExtracted) in installResults:
+                if wasExtracted:
+                    newInstallInfo = PackageInstallInfo()
+                    newInstallInfo.releaseInfo = releaseInfo
+                    newInstallInfo.installDate = installDate
+
+                    yamlStr = YamlSerializer.serialize(newInstallInfo)
+                    self._sys.writeFileAsText(os.path.join(destDir, InstallInfoFileName), yamlStr)
+
+                if linkPath:
+                    self._releaseStore.activate(releaseInfo, destDir, linkPath)
 
-                    if installInfo and installInfo.releaseInfo and installInfo.releaseInfo.id == releaseInfo.id:
-                        if installInfo.releaseInfo.versionCode == releaseInfo.versionCode:
-                            if not suppressPrompts:
-                                shouldContinue = MiscUtil.confirmChoice(
-                                    "Release '{0}' (version {1}) is already installed.  Would you like to re-install anyway?  Note that this will overwrite any local changes you've made to it.".format(releaseInfo.name, releaseInfo.version))
+                self._log.info("Successfully installed '{0}' (version {1})", releaseInfo.name, releaseInfo.version)
 
-                                assertThat(shouldContinue, 'User aborted')
-                        else:
-                            self._log.info("Found release '{0}' already installed with version '{1}'", installInfo.releaseInfo.name, installInfo.releaseInfo.version)
+            if self._packageInventory:
+                for folderPath in changedFolders:
+                    self._packageInventory.updateFolder(folderPath)
 
-                            installDirection = 'UPGRADE' if releaseInfo.versionCode > installInfo.releaseInfo.versionCode else 'DOWNGRADE'
+            assertThat(len(failedReleases) == 0, "Failed to install {0} of {1} releases: {2}",
+                len(failedReleases), len(jobs), ", ".join(["'{0}'".format(x.name) for x in failedReleases]))
 
-                            if not suppressPrompts:
-                                shouldContinue = MiscUtil.confirmChoice("Are you sure you want to {0} '{1}' from version '{2}' to version '{3}'? (y/n)".format(installDirection, releaseInfo.name, installInfo.releaseInfo.version, releaseInfo.version))
-                                assertThat(shouldContinue, 'User aborted')
+    # Warns about assets in the given releases that use the same guid as an asset in one of the package folders
+    # of the project, or in another one of the given releases, and fails if FailOnAssetGuidCollisions is set
+    # This only needs the list of assets in each release, so it happens before anything is extracted
+    # When the download cache is enabled, remote releases that are read here are not downloaded again by the install
+    def _checkReleasesForGuidCollisions(self, projectName, releasePairs, installedPackages):
+        if self._assetGuidIndex == None:
+            return
+
+        # Packages that are about to be replaced by another version of the same release do not count
+        replacedDirs = set()
+        for releaseInfo, releaseSource in releasePairs:
+            for folderInfo, packageInfo in installedPackages.get(releaseInfo.id, []):
+                replacedDirs.add(os.path.normcase(self._varMgr.expandPath(os.path.join(folderInfo.path, packageInfo.name))))
+
+        packageDirs = []
+        for folderInfo in self._packageManager.getAllPackageFolderInfos(projectName):
+            for packageInfo in folderInfo.packages:
+                packageDir = self._varMgr.expandPath(os.path.join(folderInfo.path, packageInfo.name))
+
+                if os.path.normcase(packageDir) not in replacedDirs:
+                    packageDirs.append(packageDir)
+
+        # guid -> list of descriptions of the assets that use it
+        guidUsers = {}
+        for guid, locations in self._assetGuidIndex.getGuidLocations(packageDirs).items():
+            guidUsers[guid] = [os.path.join(os.path.basename(packageDir), assetPath) for packageDir, assetPath in locations]
+
+        numCollisions = 0
+
+        for releaseInfo, releaseSource in releasePairs:
+            try:
+                contents = releaseSource.getReleaseContents(releaseInfo)
+            except Exception as e:
+                self._log.warn("Could not check release '{0}' for duplicate asset guids.  Details: {1}", releaseInfo.name, e)
+                continue
+
+            for entry in contents:
+                users = guidUsers.setdefault(entry.guid, [])
+
+                if len(users) > 0:
+                    self._log.warn("Asset '{0}' in release '{1}' has guid '{2}' which is already used by:\n  {3}", entry.pathName, releaseInfo.name, entry.guid, "\n  ".join(users))
+                    numCollisions += 1
+
+                users.append("{0} (release '{1}')".format(entry.pathName, releaseInfo.name))
+
+        assertThat(numCollisions == 0 or not self._config.tryGetBool(False, 'FailOnAssetGuidCollisions'),
+            "Found {0} asset(s) in the given releases that use the same guid as another asset.  See above for details", numCollisions)
+
+    # Returns a dictionary of release id -> list of (folderInfo, packageInfo) for every package
+    # that was installed from a release
+    def _getInstalledPackagesByReleaseId(self, projectName):
+        result = {}
+
+        for folderInfo in self._packageManager.getAllPackageFolderInfos(projectName):
+            for packageInfo in folderInfo.packages:
+                installInfo = packageInfo.installInfo
+
+                if installInfo and installInfo.releaseInfo:
+                    result.setdefault(installInfo.releaseInfo.id, []).append((folderInfo, packageInfo))
+
+        return result
+
+    # Returns a tuple of (installDirName, isReinstall)
+    # The install dir name is None if the release is not installed already
+    def _removeExistingInstalls(self, packageRoot, releaseInfo, installedPackages, suppressPrompts):
+        installDirName = None
+        keptDirName = None
+        isReinstall = False
+
+        for folderInfo, packageInfo in installedPackages:
+            installInfo = packageInfo.installInfo
+
+            if installInfo.releaseInfo.versionCode == releaseInfo.versionCode:
+                isReinstall = True
+
+                if not suppressPrompts:
+                    shouldContinue = MiscUtil.confirmChoice(
+                        "Release '{0}' (version {1}) is already installed.  Would you like to re-install anyway?  Note that this will overwrite any local changes you've made to it.".format(releaseInfo.name, releaseInfo.version))
+
+                    assertThat(shouldContinue, 'User aborted')
+            else:
+                self._log.info("Found release '{0}' already installed with version '{1}'", installInfo.releaseInfo.name, installInfo.releaseInfo.version)
+
+                installDirection = 'UPGRADE' if releaseInfo.versionCode > installInfo.releaseInfo.versionCode else 'DOWNGRADE'
+
+                if not suppressPrompts:
+                    shouldContinue = MiscUtil.confirmChoice("Are you sure you want to {0} '{1}' from version '{2}' to version '{3}'? (y/n)".format(installDirection, releaseInfo.name, installInfo.releaseInfo.version, releaseInfo.version))
+                    assertThat(shouldContinue, 'User aborted')
+
+            existingDir = self._varMgr.expand(os.path.join(folderInfo.path, packageInfo.name))
+
+            # If it was installed from the release store then only remove the junction and leave the
+            # stored version there so we can switch back to it later
+            if self._junctionHelper.removeJunction(existingDir):
+                pass
+            elif not self._shouldUseReleaseStore() and self._isSamePath(folderInfo.path, packageRoot):
+                # Leave it there so that the new version is written over it and only the files that
+                # actually changed are touched
+                self._log.debug("Updating existing directory '{0}' in place", existingDir)
+                keptDirName = packageInfo.name
+            else:
+                self._sys.deleteDirectory(existingDir)
+
+            # Retain original directory name in case it is referenced by other packages
+            installDirName = packageInfo.name
+
+        if keptDirName:
+            installDirName = keptDirName
+
+        return (installDirName, isReinstall)
+
+    def _isSamePath(self, path1, path2):
+        return os.path.normcase(self._varMgr.expandPath(path1)) == os.path.normcase(self._varMgr.expandPath(path2))
+
+    def _shouldUseReleaseStore(self):
+        return self._releaseStore != None and self._releaseStore.isEnabled()
+
+    # Returns a tuple of (destDir, linkPath, wasExtracted)
+    # linkPath is only set when using the release store, in which case destDir is the stored version that
+    # the link should point to
+    def _installRelease(self, packageRoot, releaseInfo, releaseSource, installDirName, isReinstall):
+        with self._log.heading("Installing release '{0}' (version {1})", releaseInfo.name, releaseInfo.version):
+            if not self._shouldUseReleaseStore():
+                installDirName = releaseSource.installRelease(packageRoot, releaseInfo, installDirName)
 
-                        existingDir = self._varMgr.expand(os.path.join(folderInfo.path, packageInfo.name))
+                destDir = self._varMgr.expand(os.path.join(packageRoot, installDirName))
 
-                        self._sys.deleteDirectory(existingDir)
+                assertThat(self._sys.directoryExists(destDir), 'Expected dir "{0}" to exist', destDir)
 
-                        # Retain original directory name in case it is referenced by other packages
-                        installDirName = packageInfo.name
+                return (destDir, None, True)
 
-            installDirName = releaseSource.installRelease(packageRoot, releaseInfo, installDirName)
+            # Always extract again when re-installing the same version, since that is how local changes are reverted
+            storedDir = None if isReinstall else self._releaseStore.tryGetPackageDir(releaseInfo)
 
-            destDir = self._varMgr.expand(os.path.join(packageRoot, installDirName))
+            if storedDir:
+                self._log.info("Found release '{0}' (version {1}) in release store, switching to it", releaseInfo.name, releaseInfo.version)
+                wasExtracted = False
+            else:
+                newVersionDir = self._releaseStore.prepareVersionDir(releaseInfo)
 
-            assertThat(self._sys.directoryExists(destDir), 'Expected dir "{0}" to exist', destDir)
+                try:
+                    packageName = releaseSource.installRelease(newVersionDir, releaseInfo, installDirName)
+                    storedDir = self._releaseStore.commitVersionDir(releaseInfo, newVersionDir, packageName)
+                finally:
+                    # Don't leave a partially extracted version in the store
+                    self._sys.deleteDirectoryIfExists(newVersionDir)
 
-            newInstallInfo = PackageInstallInfo()
-            newInstallInfo.releaseInfo = releaseInfo
-            newInstallInfo.installDate = datetime.utcnow()
+                wasExtracted = True
 
-            yamlStr = YamlSerializer.serialize(newInstallInfo)
-            self._sys.writeFileAsText(os.path.join(destDir, InstallInfoFileName), yamlStr)
+            assertThat(self._sys.directoryExists(storedDir), 'Expected dir "{0}" to exist', storedDir)
 
-            self._log.info("Successfully installed '{0}' (version {1})", releaseInfo.name, releaseInfo.version)
+            linkName = installDirName if installDirName else os.path.basename(storedDir)
+            linkPath = self._varMgr.expand(os.path.join(packageRoot, linkName))
 
+            return (storedDir, linkPath, wasExtracted)
@@ -0,0 +1,219 @@
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+import threading
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.util.Assert import *
+
+DefaultNumInactiveVersionsToKeep = 2
+
+# Increment this whenever the format of the version index changes
+StoreIndexVersion = 1
+
+StoreIndexFileName = 'Versions.json'
+
+class ReleaseStore:
+    '''
+    Keeps every installed version of a release side by side in its own directory underneath [ReleaseStoreDir]
+    The package directory inside the package folder is then just a junction to the active version, so that
+    switching to a version that was installed before (eg. rolling back an upgrade) only needs the junction to change
+    Versions that are no longer linked to from anywhere are removed once there are more than the configured amount
+    Releases are installed on multiple threads, so every change to the directory of a given release happens
+    while holding the lock for it
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
+    _config = Inject('Config')
+    _junctionHelper = Inject('JunctionHelper')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._releaseDirLocks = {}
+
+        # Version directories that were committed but not activated yet, which must not be removed as garbage
+        self._pendingVersionDirs = set()
+
+    def isEnabled(self):
+        return self._varMgr.hasKey('ReleaseStoreDir')
+
+    def _getReleaseDir(self, releaseId):
+        # Ids can contain characters that aren't valid in file names so use a hash of it
+        idHash = hashlib.sha1(str(releaseId).encode('utf-8')).hexdigest()[:16]
+        return self._varMgr.expandPath(os.path.join('[ReleaseStoreDir]', idHash))
+
+    def _getVersionDir(self, releaseDir, versionCode):
+        return os.path.join(releaseDir, str(versionCode))
+
+    # Returns the path to the stored package directory for the given release, or None if that version is not in the store
+    def tryGetPackageDir(self, releaseInfo):
+        releaseDir = self._getReleaseDir(releaseInfo.id)
+        entry = self._loadIndex(releaseDir).get(str(releaseInfo.versionCode))
+
+        if entry == None:
+            return None
+
+        packageDir = os.path.join(self._getVersionDir(releaseDir, releaseInfo.versionCode), entry['packageName'])
+
+        if not os.path.isdir(packageDir):
+            return None
+
+        return packageDir
+
+    # Returns a new empty directory that the given version should be extracted to
+    # Nothing in the store changes until commitVersionDir is called, so that re-installing a version
+    # does not break the projects that are linked to it if the install fails
+    def prepareVersionDir(self, releaseInfo):
+        releaseDir = self._getReleaseDir(releaseInfo.id)
+
+        with self._getReleaseDirLock(releaseDir):
+            self._sys.createDirectory(releaseDir)
+
+            return tempfile.mkdtemp(prefix='.{0}_new_'.format(releaseInfo.versionCode), dir=releaseDir)
+
+    # Replaces the stored version with the contents of the directory returned by prepareVersionDir and
+    # returns the path to the stored package directory
+    # The existing links to the version are kept, since they point at the version directory which is swapped in place
+    def commitVersionDir(self, releaseInfo, newVersionDir, packageName):
+        releaseDir = self._getReleaseDir(releaseInfo.id)
+        versionDir = self._getVersionDir(releaseDir, releaseInfo.versionCode)
+
+        with self._getReleaseDirLock(releaseDir):
+            if os.path.exists(versionDir):
+                # Move the old one out of the way first, so that the version directory is only ever missing for
+                # the moment between the two renames
+                # Use a new name every time, in case a previous attempt left its old directory behind
+                oldVersionDir = os.path.join(releaseDir, '.{0}_old_{1}'.format(releaseInfo.versionCode, uuid.uuid4().hex))
+
+                os.rename(versionDir, oldVersionDir)
+                os.rename(newVersionDir, versionDir)
+                self._sys.deleteDirectoryIfExists(oldVersionDir)
+            else:
+                os.rename(newVersionDir, versionDir)
+
+            # Add it to the index straight away so that it is never mistaken for a leftover directory
+            versions = self._loadIndex(releaseDir)
+            entry = versions.setdefault(str(releaseInfo.versionCode), { 'packageName': packageName, 'links': [], 'lastUsed': time.time() })
+            entry['packageName'] = packageName
+            self._saveIndex(releaseDir, versions)
+
+            self._pendingVersionDirs.add(versionDir)
+
+        return os.path.join(versionDir, packageName)
+
+    # Points the junction at linkPath to the given stored package directory, replacing whichever version it pointed to before
+    def activate(self, releaseInfo, packageDir, linkPath):
+        releaseDir = self._getReleaseDir(releaseInfo.id)
+
+        with self._getReleaseDirLock(releaseDir):
+            versions = self._loadIndex(releaseDir)
+
+            self._junctionHelper.removeJunction(linkPath)
+            assertThat(not os.path.exists(linkPath), "Expected directory '{0}' to not exist", linkPath)
+            self._junctionHelper.makeJunction(packageDir, linkPath)
+
+            linkPath = self._normalizePath(linkPath)
+
+            for entry in versions.values():
+                if linkPath in entry['links']:
+                    entry['links'].remove(linkPath)
+
+            entry = versions.setdefault(str(releaseInfo.versionCode), { 'packageName': os.path.basename(packageDir), 'links': [] })
+            entry['links'].append(linkPath)
+            entry['lastUsed'] = time.time()
+
+            self._pendingVersionDirs.discard(self._getVersionDir(releaseDir, releaseInfo.versionCode))
+
+            self._collectGarbage(releaseDir, versions)
+            self._saveIndex(releaseDir, versions)
+
+    def _getReleaseDirLock(self, releaseDir):
+        with self._lock:
+            return self._releaseDirLocks.setdefault(os.path.normcase(releaseDir), threading.Lock())
+
+    # Removes the oldest versions that are no longer linked to from any package folder, as well as any
+    # version directories that are missing from the index (eg. because the index was reset)
+    # This must be called while holding the lock for the release directory
+    def _collectGarbage(self, releaseDir, versions):
+        numToKeep = self._config.tryGetInt(DefaultNumInactiveVersionsToKeep, 'ReleaseStore', 'NumInactiveVersionsToKeep')
+
+        inactiveVersions = []
+
+        for versionCode, entry in versions.items():
+            packageDir = os.path.join(self._getVersionDir(releaseDir, versionCode), entry['packageName'])
+
+            # Links can be removed without us knowing (eg. by deleting the package) so check them every time
+            entry['links'] = [x for x in entry['links'] if self._isLinkTo(x, packageDir)]
+
+            if len(entry['links']) == 0 and self._getVersionDir(releaseDir, versionCode) not in self._pendingVersionDirs:
+                inactiveVersions.append((entry['lastUsed'], versionCode))
+
+        # Most recently used first
+        inactiveVersions.sort(reverse = True)
+
+        for lastUsed, versionCode in inactiveVersions[numToKeep:]:
+            self._log.debug("Removing unused version '{0}' from release store at '{1}'", versionCode, releaseDir)
+            self._sys.deleteDirectoryIfExists(self._getVersionDir(releaseDir, versionCode))
+            del versions[versionCode]
+
+        for name in os.listdir(releaseDir):
+            path = os.path.join(releaseDir, name)
+
+            if not os.path.isdir(path):
+                continue
+
+            # The directories that releases are being extracted to also start with a dot and can be in use by
+            # another thread, so only remove the old versions left behind by an interrupted commit
+            if name.startswith('.'):
+                isLeftover = '_old' in name
+            else:
+                isLeftover = name not in versions and path not in self._pendingVersionDirs
+
+            if isLeftover:
+                self._log.debug("Removing leftover directory '{0}' from release store", path)
+                self._sys.deleteDirectoryIfExists(path)
+
+    def _isLinkTo(self, linkPath, packageDir):
+        target = self._junctionHelper.tryGetJunctionTarget(linkPath)
+        return target != None and self._normalizePath(target) == self._normalizePath(packageDir)
+
+    def _normalizePath(self, path):
+        return os.path.normcase(os.path.abspath(path))
+
+    # Returns a dictionary of version code (as a string) -> entry
+    def _loadIndex(self, releaseDir):
+        indexPath = os.path.join(releaseDir, StoreIndexFileName)
+
+        if not os.path.isfile(indexPath):
+            return {}
+
+        try:
+            with open(indexPath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            self._log.warn("Failed to load release store index at '{0}'.  Details: {1}", indexPath, e)
+            return {}
+
+        if data.get('version') != StoreIndexVersion:
+            return {}
+
+        return data['versions']
+
+    def _saveIndex(self, releaseDir, versions):
+        indexPath = os.path.join(releaseDir, StoreIndexFileName)
+        self._sys.makeMissingDirectoriesInPath(indexPath)
+
+        tempPath = indexPath + '.tmp'
+
+        with open(tempPath, 'w', encoding='utf-8') as f:
+            json.dump({ 'version': StoreIndexVersion, 'versions': versions }, f, indent=4)
+
+        os.replace(tempPath, indexPath)
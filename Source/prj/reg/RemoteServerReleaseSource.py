@@ -1,20 +1,35 @@
 
 from mtm.ioc.Inject import Inject
 from mtm.ioc.Inject import InjectMany
+from mtm.ioc.Inject import InjectOptional
 import mtm.ioc.IocAssertions as Assertions
 
 import os
+import json
+import gzip
+import hashlib
+import urllib.error
 import urllib.parse
 import urllib.request
 from mtm.util.Assert import *
 import mtm.util.YamlSerializer as YamlSerializer
+import prj.reg.ReleaseInfo as ReleaseInfo
+import prj.reg.ReleaseManifestFormat as ReleaseManifestFormat
+from prj.reg.ReleaseDownloadCache import createVerifyingStream
 
 import tempfile
 
+# Increment this whenever the format of the cached manifest changes
+ManifestCacheVersion = 2
+
 class RemoteServerReleaseSource:
     _log = Inject('Logger')
     _sys = Inject('SystemHelper')
+    _varMgr = Inject('VarManager')
     _packageExtractor = Inject('UnityPackageExtractor')
+    _packageAnalyzer = Inject('UnityPackageAnalyzer')
+    _downloadCache = InjectOptional('ReleaseDownloadCache', None)
+    _releaseInfoCache = InjectOptional('ReleaseInfoCache', None)
 
     def __init__(self, manifestUrl):
         self._manifestUrl = manifestUrl
@@ -27,33 +42,231 @@ class RemoteServerReleaseSource:
     def init(self):
         with self._log.heading("Initializing remote server release source"):
             self._log.debug("Initializing remote server release source with URL '{0}'", self._manifestUrl)
-            response = urllib.request.urlopen(self._manifestUrl)
-            manifestData = response.read().decode('utf-8')
 
-            self._log.debug("Got manifest with data: \n{0}".format(manifestData))
+            cachedManifest = self._tryLoadCachedManifest()
+
+            compactUrl = self._tryGetCompactManifestUrl()
+
+            # False when the server did not have the compact manifest, so that we don't ask for it on every run
+            # This is only remembered until the yaml manifest changes, since the server might have been updated then
+            hasCompactManifest = None
+
+            if compactUrl and cachedManifest and cachedManifest.get('hasCompactManifest') == False:
+                self._log.debug("Server did not have a compact manifest last time, using yaml manifest")
+                compactUrl = None
+
+            if compactUrl:
+                try:
+                    self._loadManifest(compactUrl, cachedManifest, ReleaseManifestFormat.deserializeCompact, True)
+                    return
+                except Exception as e:
+                    # Most likely the server was set up with an older version of ReleaseManifestUpdater
+                    if isinstance(e, urllib.error.HTTPError) and e.code == 404:
+                        hasCompactManifest = False
+
+                    self._log.debug("Could not load compact manifest from '{0}', falling back to yaml.  Details: {1}", compactUrl, e)
+
+            self._loadManifest(self._manifestUrl, cachedManifest, self._parseYamlManifest, hasCompactManifest)
+
+    # Servers created with ReleaseManifestUpdater also have a compact version of the manifest next to the yaml one
+    def _tryGetCompactManifestUrl(self):
+        manifestFileName = os.path.basename(urllib.parse.urlparse(self._manifestUrl).path)
+
+        if manifestFileName != ReleaseManifestFormat.ReleaseManifestFileName:
+            return None
+
+        return urllib.parse.urljoin(self._manifestUrl, ReleaseManifestFormat.CompactManifestFileName)
+
+    def _parseYamlManifest(self, data):
+        manifestData = data.decode('utf-8')
+
+        self._log.debug("Got manifest with data: \n{0}".format(manifestData))
+
+        manifest = YamlSerializer.deserialize(manifestData)
+
+        return [ReleaseInfo.fromYamlData(x) for x in manifest.releases]
+
+    # hasCompactManifest is stored with the cached manifest, see init
+    def _loadManifest(self, url, cachedManifest, parseFunc, hasCompactManifest):
+        request = urllib.request.Request(url)
+
+        # The yaml manifest compresses very well, and servers that don't support this just ignore it
+        request.add_header('Accept-Encoding', 'gzip')
 
-            self._manifest = YamlSerializer.deserialize(manifestData)
+        # The cached etag is only meaningful for the url that it came from
+        if cachedManifest and cachedManifest.get('sourceUrl') != url:
+            cachedManifest = None
 
-            for info in self._manifest.releases:
-                info.url = urllib.parse.urljoin(self._manifestUrl, info.localPath)
+        # Ask the server to only send the manifest if it has changed since we last downloaded it
+        if cachedManifest:
+            if cachedManifest.get('etag'):
+                request.add_header('If-None-Match', cachedManifest['etag'])
+
+            if cachedManifest.get('lastModified'):
+                request.add_header('If-Modified-Since', cachedManifest['lastModified'])
+
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cachedManifest:
+                self._log.debug("Manifest has not changed since last download, using cached copy")
+                self._releaseInfos = self._getReleaseInfosFromCache(cachedManifest)
+
+                if hasCompactManifest == False and cachedManifest.get('hasCompactManifest') != False:
+                    self._trySaveCachedManifest(url, cachedManifest.get('etag'), cachedManifest.get('lastModified'), hasCompactManifest)
+
+                return
+
+            raise
+        except OSError as e:
+            # Note that this includes URLError and socket errors
+            if cachedManifest:
+                self._log.warn("Could not reach '{0}', using previously downloaded manifest instead.  Details: {1}", url, e)
+                self._releaseInfos = self._getReleaseInfosFromCache(cachedManifest)
+                return
+
+            raise
+
+        with response:
+            data = response.read()
+
+            if response.headers.get('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+
+            releaseInfos = parseFunc(data)
+
+            for info in releaseInfos:
+                info.url = urllib.parse.urljoin(url, info.localPath)
                 info.localPath = None
-                self._releaseInfos.append(info)
+
+            self._releaseInfos = releaseInfos
+
+            self._trySaveCachedManifest(url, response.headers.get('ETag'), response.headers.get('Last-Modified'), hasCompactManifest)
+
+    def _getManifestCachePath(self):
+        if not self._varMgr.hasKey('ProjenyCacheDir'):
+            return None
+
+        urlHash = hashlib.sha1(self._manifestUrl.encode('utf-8')).hexdigest()
+        return self._varMgr.expandPath(os.path.join('[ProjenyCacheDir]', 'Manifests', urlHash + '.json'))
+
+    # We store the parsed release infos instead of the raw manifest so that we don't need to parse the yaml again
+    def _tryLoadCachedManifest(self):
+        cachePath = self._getManifestCachePath()
+
+        if cachePath == None or not os.path.isfile(cachePath):
+            return None
+
+        try:
+            with open(cachePath, 'r', encoding='utf-8') as f:
+                cachedManifest = json.load(f)
+        except Exception as e:
+            self._log.warn("Failed to load cached manifest at '{0}'.  Details: {1}", cachePath, e)
+            return None
+
+        if cachedManifest.get('version') != ManifestCacheVersion or cachedManifest.get('url') != self._manifestUrl:
+            return None
+
+        return cachedManifest
+
+    def _getReleaseInfosFromCache(self, cachedManifest):
+        return [ReleaseInfo.fromJsonDict(x) for x in cachedManifest['releases']]
+
+    def _trySaveCachedManifest(self, sourceUrl, etag, lastModified, hasCompactManifest):
+        cachePath = self._getManifestCachePath()
+
+        if cachePath == None:
+            return
+
+        cachedManifest = {
+            'version': ManifestCacheVersion,
+            'url': self._manifestUrl,
+            'sourceUrl': sourceUrl,
+            'etag': etag,
+            'lastModified': lastModified,
+            'hasCompactManifest': hasCompactManifest,
+            'releases': [ReleaseInfo.toJsonDict(x) for x in self._releaseInfos],
+        }
+
+        try:
+            self._sys.makeMissingDirectoriesInPath(cachePath)
+
+            tempPath = cachePath + '.tmp'
+
+            with open(tempPath, 'w', encoding='utf-8') as f:
+                json.dump(cachedManifest, f, separators=(',', ':'))
+
+            os.replace(tempPath, cachePath)
+        except Exception as e:
+            self._log.warn("Failed to save manifest cache to '{0}'.  Details: {1}", cachePath, e)
 
     def getName(self):
-        return "File Server"
+        return "File Server ({0})".format(self._manifestUrl)
 
     def installRelease(self, packageRootDir, releaseInfo, forcedName):
         assertThat(releaseInfo.url)
 
+        canStream = self._packageExtractor.canExtractFromStream()
+
+        if self._downloadCache and self._downloadCache.isEnabled():
+            if canStream:
+                # Extract while downloading
+                return self._downloadCache.processPackage(releaseInfo,
+                    lambda stream: self._packageExtractor.extractUnityPackageFromStream(packageRootDir, stream, releaseInfo.name, forcedName))
+
+            packagePath = self._downloadCache.getPackagePath(releaseInfo)
+            return self._packageExtractor.extractUnityPackage(packageRootDir, packagePath, releaseInfo.name, forcedName)
+
+        if canStream:
+            with self._log.heading("Downloading release from url '{0}'".format(releaseInfo.url)):
+                with urllib.request.urlopen(releaseInfo.url) as response:
+                    # The extractor reads to the end of the stream before moving anything into place, so a
+                    # corrupt download fails the install instead of leaving a bad package behind
+                    stream = createVerifyingStream(response, releaseInfo)
+                    return self._packageExtractor.extractUnityPackageFromStream(packageRootDir, stream, releaseInfo.name, forcedName)
+
+        return self._installUsingTempFile(packageRootDir, releaseInfo, forcedName)
+
+    # Returns a list of UnityPackageEntry for every asset in the given release, without extracting it
+    def getReleaseContents(self, releaseInfo):
+        assertThat(releaseInfo.url)
+
+        if self._releaseInfoCache:
+            contents = self._releaseInfoCache.tryGetRemoteContents(releaseInfo)
+
+            if contents != None:
+                return contents
+
+        if self._downloadCache and self._downloadCache.isEnabled():
+            # Keep the downloaded package too, since it is likely to be installed next
+            contents = self._downloadCache.processPackage(releaseInfo, self._packageAnalyzer.getContentsFromStream)
+        else:
+            with self._log.heading("Downloading release from url '{0}'".format(releaseInfo.url)):
+                with urllib.request.urlopen(releaseInfo.url) as response:
+                    stream = createVerifyingStream(response, releaseInfo)
+                    contents = self._packageAnalyzer.getContentsFromStream(stream)
+                    stream.readToEnd()
+
+        if self._releaseInfoCache:
+            self._releaseInfoCache.setRemoteContents(releaseInfo, contents)
+            self._releaseInfoCache.save()
+
+        return contents
+
+    def _installUsingTempFile(self, packageRootDir, releaseInfo, forcedName):
+        tempFilePath = None
+
         try:
             with self._log.heading("Downloading release from url '{0}'".format(releaseInfo.url)):
                 with tempfile.NamedTemporaryFile(delete=False, suffix='.unitypackage') as tempFile:
                     tempFilePath = tempFile.name
 
-                self._log.debug("Downloading url to temporary file '{0}'".format(tempFilePath))
-                urllib.request.urlretrieve(releaseInfo.url, tempFilePath)
+                    self._log.debug("Downloading url to temporary file '{0}'".format(tempFilePath))
+
+                    with urllib.request.urlopen(releaseInfo.url) as response:
+                        createVerifyingStream(response, releaseInfo, tempFile).readToEnd()
 
                 return self._packageExtractor.extractUnityPackage(packageRootDir, tempFilePath, releaseInfo.name, forcedName)
         finally:
-            if os.path.exists(tempFilePath):
+            if tempFilePath and os.path.exists(tempFilePath):
                 os.remove(tempFilePath)
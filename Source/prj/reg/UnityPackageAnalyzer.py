@@ -12,6 +12,34 @@ import json
 from mtm.ioc.Inject import Inject
 from mtm.ioc.Inject import InjectMany
 
+from prj.reg.UnityPackageExtractor import parseEntryName, readPathName
+from prj.reg.UnityPackageStream import openTarStream
+
+_ReadBufferSize = 1024 * 1024
+
+class UnityPackageEntry:
+    def __init__(self, guid, pathName, size):
+        self.guid = guid
+        self.pathName = pathName
+        # Size of the asset in bytes, or None for folders, which only have a meta file
+        self.size = size
+
+# Stored as lists instead of dictionaries since packages can contain many thousands of assets
+def contentsToJsonList(entries):
+    return [[x.guid, x.pathName, x.size] for x in entries]
+
+def contentsFromJsonList(data):
+    return [UnityPackageEntry(x[0], x[1], x[2]) for x in data]
+
+# Converts a version of the form '1.23' to a flat int, so we can do greater than/less than comparisons
+def versionToVersionCode(versionStr):
+    match = re.match('^\d+\.?(\d*)$', versionStr)
+
+    assertThat(match, "Invalid version '{0}' - expected a number such as '1.2'", versionStr)
+    assertThat(len(match.groups()[0]) <= 7, 'Projeny only supports up to 7 decimal points in the version number!')
+
+    return int(10000000 * float(versionStr))
+
 class UnityPackageAnalyzer:
     _log = Inject('Logger')
     _sys = Inject('SystemHelper')
@@ -43,6 +71,48 @@ class UnityPackageAnalyzer:
 
         return info
 
+    # Returns a list of UnityPackageEntry for every asset in the given unity package, sorted by path name
+    # The package is read once from start to finish without writing any of the assets to disk
+    def getContentsFromUnityPackage(self, unityPackagePath):
+        assertThat(self._sys.fileExists(unityPackagePath))
+
+        with open(unityPackagePath, 'rb') as f:
+            return self.getContentsFromStream(f)
+
+    # Same as getContentsFromUnityPackage except reads the gzip'd tar data from the given file object
+    def getContentsFromStream(self, inputStream):
+        pathNames = {}
+        sizes = {}
+
+        # In stream mode the tar reader skips over the bodies of the entries that we don't read
+        with openTarStream(inputStream) as tar:
+            for member in tar:
+                parsed = parseEntryName(member.name)
+
+                if parsed == None:
+                    continue
+
+                guid, entryType = parsed
+
+                if entryType == 'pathname':
+                    assertThat(member.isfile())
+                    pathNames[guid] = readPathName(tar.extractfile(member))
+
+                elif entryType == 'asset':
+                    sizes[guid] = member.size
+
+        # Read the rest so that streams that verify their contents when they reach the end get the chance to do so
+        while inputStream.read(_ReadBufferSize):
+            pass
+
+        missingGuids = [x for x in sizes.keys() if x not in pathNames]
+        assertThat(len(missingGuids) == 0, "Found assets in unity package with missing pathname entries: {0}", ', '.join(missingGuids))
+
+        entries = [UnityPackageEntry(guid, pathName, sizes.get(guid)) for guid, pathName in pathNames.items()]
+        entries.sort(key = lambda x: x.pathName.lower())
+
+        return entries
+
     def _getInfoFromFileName(self, fileName):
         parts = os.path.splitext(fileName)
         assertThat(parts[1].lower() == '.unitypackage')
@@ -56,14 +126,7 @@ class UnityPackageAnalyzer:
             name = groups[0]
             versionStr = groups[1]
 
-            numDecimals = len(re.match('^\d+\.(\d*)$', versionStr).groups()[0])
-
-            assertThat(numDecimals <= 7, 'Projeny only supports up to 7 decimal points in the version number!')
-
-            # Need a flat int so we can do greater than/less than comparisons
-            versionCode = int(10000000 * float(groups[1]))
-
-            return (name, name, versionCode, versionStr)
+            return (name, name, versionToVersionCode(versionStr), versionStr)
 
         return (baseName, baseName, 0, '')
 
@@ -0,0 +1,307 @@
+
+import os
+import io
+import json
+import zlib
+import struct
+import hashlib
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+
+from mtm.ioc.Inject import Inject
+from mtm.ioc.Inject import InjectMany
+import mtm.ioc.IocAssertions as Assertions
+
+import prj.main.AssetGuidIndex as AssetGuidIndex
+import mtm.util.Util as Util
+from mtm.util.Assert import *
+
+from prj.main.PackageManager import InstallInfoFileName
+
+DefaultNumHashWorkers = 8
+
+# The id of the gzip extra field that unity uses to store the asset store info
+_HeaderSubfieldId = b'A$'
+
+# The whole extra field has to fit in two bytes, including the four bytes of the subfield header
+_MaxHeaderSize = 0xFFFF - 4
+
+# Returns the json header info for a package that was not published through the asset store, in the same
+# format that UnityPackageAnalyzer reads from asset store packages
+def createHeaderInfo(releaseId, title, version, versionCode, publishDate):
+    return {
+        'id': releaseId,
+        'title': title,
+        'version': version,
+        'version_id': versionCode,
+        'pubdate': publishDate.strftime("%d %b %Y"),
+        'publisher': { 'id': '', 'label': '' },
+        'category': { 'id': '', 'label': '' },
+        'link': { 'id': '', 'type': '' },
+    }
+
+class _AssetInfo:
+    def __init__(self, pathName, guid, filePath, metaData):
+        self.pathName = pathName
+        self.guid = guid
+        # None for folders
+        self.filePath = filePath
+        self.metaData = metaData
+
+class UnityPackageExporter:
+    '''
+    Writes a package directory to a .unitypackage file without needing to run Unity
+    The files are streamed from disk into the gzip'd tar so memory use does not depend on the size of the package
+    The output only depends on the contents of the package (not on modification times etc.) so exporting the
+    same contents twice produces the same file
+    '''
+    _log = Inject('Logger')
+    _sys = Inject('SystemHelper')
+    _config = Inject('Config')
+    _varMgr = Inject('VarManager')
+
+    def __init__(self):
+        # Maps file path -> (size, modification time, sha256) so that polling for changes only needs
+        # to hash the files that changed since the last time
+        self._fileHashes = {}
+        # Maps meta file path -> (size, modification time, contents)
+        self._metaFiles = {}
+
+    # Returns a hash of everything that would be written to the package for the given directory
+    # This can be used to check whether a package needs to be exported again
+    def computeFingerprint(self, packageDir, headerInfo = None):
+        assets = self._getAssets(self._varMgr.expandPath(packageDir))
+
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps(headerInfo, sort_keys=True).encode('utf-8'))
+
+        fileHashes = {}
+        changedFiles = []
+
+        for asset in assets:
+            if not asset.filePath:
+                continue
+
+            fileStat = os.stat(asset.filePath)
+            cachedEntry = self._fileHashes.get(asset.filePath)
+
+            if cachedEntry and cachedEntry[0] == fileStat.st_size and cachedEntry[1] == fileStat.st_mtime_ns:
+                fileHashes[asset.filePath] = cachedEntry[2]
+            else:
+                changedFiles.append((asset.filePath, fileStat))
+
+        if len(changedFiles) > 0:
+            numWorkers = self._config.tryGetInt(DefaultNumHashWorkers, 'ExportHashWorkers')
+
+            # Hashing is mostly waiting on the disk so do it on several threads
+            with ThreadPoolExecutor(max_workers = max(1, min(numWorkers, len(changedFiles)))) as executor:
+                newHashes = executor.map(lambda x: Util.computeFileSha256(x[0]), changedFiles)
+
+                for (filePath, fileStat), fileHash in zip(changedFiles, newHashes):
+                    # Use the stat from before hashing, so that a change during hashing is picked up next time
+                    self._fileHashes[filePath] = (fileStat.st_size, fileStat.st_mtime_ns, fileHash)
+                    fileHashes[filePath] = fileHash
+
+        for asset in assets:
+            fileHash = fileHashes[asset.filePath] if asset.filePath else ''
+            hasher.update('{0}\0{1}\0{2}\0'.format(asset.pathName, asset.guid, fileHash).encode('utf-8'))
+            hasher.update(asset.metaData)
+
+        return hasher.hexdigest()
+
+    # Writes the contents of packageDir to a new unitypackage at outputPath
+    # When extracted, the assets are placed underneath Assets/<directory name of packageDir>
+    # If headerInfo is given then it is stored in the gzip header the same way the asset store does (see createHeaderInfo)
+    # Returns a tuple of (sha256, numBytes) for the written file
+    def exportUnityPackage(self, packageDir, outputPath, headerInfo = None):
+        packageDir = self._varMgr.expandPath(packageDir)
+        outputPath = self._varMgr.expandPath(outputPath)
+
+        assertThat(os.path.isdir(packageDir), "Could not find package directory '{0}'", packageDir)
+
+        with self._log.heading("Exporting '{0}'", os.path.basename(packageDir)):
+            assets = self._getAssets(packageDir)
+
+            self._sys.makeMissingDirectoriesInPath(outputPath)
+
+            # Write to a temporary file first so that release sources never see a partially written package
+            tempPath = outputPath + '.tmp'
+
+            try:
+                with open(tempPath, 'wb') as outFile:
+                    hashedFile = _HashingWriter(outFile)
+                    gzipFile = _GzipWriter(hashedFile, self._getHeaderBytes(headerInfo))
+
+                    with tarfile.open(fileobj=gzipFile, mode='w|', format=tarfile.GNU_FORMAT) as tar:
+                        for asset in assets:
+                            self._addAsset(tar, asset)
+
+                    gzipFile.close()
+
+                os.replace(tempPath, outputPath)
+            except:
+                if os.path.exists(tempPath):
+                    os.remove(tempPath)
+                raise
+
+            self._log.debug("Exported {0} assets to '{1}'", len(assets), outputPath)
+
+            return (hashedFile.hexdigest(), hashedFile.numBytes)
+
+    def _getHeaderBytes(self, headerInfo):
+        if headerInfo == None:
+            return None
+
+        headerBytes = json.dumps(headerInfo, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+        assertThat(len(headerBytes) <= _MaxHeaderSize, "Package header info is too large ({0} bytes)", len(headerBytes))
+
+        return headerBytes
+
+    def _addAsset(self, tar, asset):
+        self._addEntry(tar, asset.guid + '/pathname', len(asset.pathName.encode('utf-8')), io.BytesIO(asset.pathName.encode('utf-8')))
+        self._addEntry(tar, asset.guid + '/asset.meta', len(asset.metaData), io.BytesIO(asset.metaData))
+
+        if asset.filePath:
+            with open(asset.filePath, 'rb') as f:
+                self._addEntry(tar, asset.guid + '/asset', os.fstat(f.fileno()).st_size, f)
+
+    def _addEntry(self, tar, name, size, fileObj):
+        info = tarfile.TarInfo(name)
+        # Leave the modification time at zero so that the output only depends on the contents
+        info.size = size
+        tar.addfile(info, fileObj)
+
+    # Returns a list of _AssetInfo sorted by path name, for the package directory itself and everything inside it
+    def _getAssets(self, packageDir):
+        rootPathName = 'Assets/' + os.path.basename(packageDir)
+
+        assets = [self._getAssetInfo(rootPathName, packageDir, None)]
+
+        for root, dirs, files in os.walk(packageDir):
+            # Unity ignores anything that is hidden or ends with ~
+            dirs[:] = sorted(x for x in dirs if not self._isIgnored(x))
+
+            relRoot = os.path.relpath(root, packageDir).replace('\\', '/')
+            rootPath = rootPathName if relRoot == '.' else rootPathName + '/' + relRoot
+
+            for dirName in dirs:
+                assets.append(self._getAssetInfo(rootPath + '/' + dirName, os.path.join(root, dirName), None))
+
+            for fileName in sorted(files):
+                if self._isIgnored(fileName) or fileName.endswith('.meta'):
+                    continue
+
+                # This is added when installing releases and does not belong in the package
+                if relRoot == '.' and fileName == InstallInfoFileName:
+                    continue
+
+                filePath = os.path.join(root, fileName)
+                assets.append(self._getAssetInfo(rootPath + '/' + fileName, filePath, filePath))
+
+        assets.sort(key = lambda x: x.pathName)
+        return assets
+
+    def _isIgnored(self, name):
+        return name.startswith('.') or name.endswith('~')
+
+    # Returns None if the meta file does not exist
+    def _tryReadMetaFile(self, metaPath):
+        try:
+            fileStat = os.stat(metaPath)
+        except OSError:
+            return None
+
+        cachedEntry = self._metaFiles.get(metaPath)
+
+        if cachedEntry and cachedEntry[0] == fileStat.st_size and cachedEntry[1] == fileStat.st_mtime_ns:
+            return cachedEntry[2]
+
+        with open(metaPath, 'rb') as f:
+            metaData = f.read()
+
+        self._metaFiles[metaPath] = (fileStat.st_size, fileStat.st_mtime_ns, metaData)
+
+        return metaData
+
+    def _getAssetInfo(self, pathName, path, filePath):
+        metaPath = path + '.meta'
+        metaData = self._tryReadMetaFile(metaPath)
+
+        if metaData != None:
+            guid = AssetGuidIndex.parseGuid(metaData.decode('utf-8', errors='replace'))
+
+            assertThat(guid, "Could not find guid in meta file '{0}'", metaPath)
+
+            return _AssetInfo(pathName, guid, filePath, metaData)
+
+        # Base the guid on the path so that exporting again produces the same guid
+        guid = hashlib.md5(pathName.encode('utf-8')).hexdigest()
+
+        self._log.debug("Could not find meta file for '{0}', using generated guid '{1}'", path, guid)
+
+        metaText = 'fileFormatVersion: 2\nguid: {0}\n'.format(guid)
+
+        if filePath == None:
+            metaText += 'folderAsset: yes\n'
+
+        metaText += 'DefaultImporter:\n  userData: \n'
+
+        return _AssetInfo(pathName, guid, filePath, metaText.encode('utf-8'))
+
+class _HashingWriter:
+    '''
+    File-like object that computes the sha256 and size of everything written to it, so that the
+    written package does not need to be read again to include it in the release manifest
+    '''
+    def __init__(self, outFile):
+        self._outFile = outFile
+        self._hasher = hashlib.sha256()
+        self.numBytes = 0
+
+    def write(self, data):
+        self._hasher.update(data)
+        self._outFile.write(data)
+        self.numBytes += len(data)
+        return len(data)
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+class _GzipWriter:
+    '''
+    Writes a gzip stream by hand, since the gzip module has no way to add the extra header field
+    that unity uses for the asset store info
+    '''
+    def __init__(self, outFile, headerBytes):
+        self._outFile = outFile
+        self._compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        self._isClosed = False
+
+        # Always use a modification time of zero so that the output only depends on the contents
+        if headerBytes == None:
+            self._outFile.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 0, 0, 2, 255))
+        else:
+            self._outFile.write(struct.pack('<BBBBIBB', 0x1f, 0x8b, 8, 4, 0, 2, 255))
+            self._outFile.write(struct.pack('<H', len(headerBytes) + 4))
+            self._outFile.write(_HeaderSubfieldId)
+            self._outFile.write(struct.pack('<H', len(headerBytes)))
+            self._outFile.write(headerBytes)
+
+    def write(self, data):
+        assertThat(not self._isClosed)
+
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._outFile.write(self._compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if self._isClosed:
+            return
+
+        self._isClosed = True
+        self._outFile.write(self._compressor.flush())
+        self._outFile.write(struct.pack('<II', self._crc & 0xFFFFFFFF, self._size & 0xFFFFFFFF))
@@ -15,68 +15,390 @@ from mtm.util.VarManager import VarManager
 from mtm.config.Config import Config
 
 import shutil
+import filecmp
+import hashlib
 
 import os
 
 from mtm.util.ProcessRunner import ProcessRunner
 from mtm.util.Assert import *
 
+from prj.reg.UnityPackageStream import openTarStream
+
+# Use a larger buffer than the shutil default since asset bodies are often large
+_CopyBufferSize = 1024 * 1024
+
+# Bodies that might be unchanged are held in memory up to this size while they are compared
+_MaxBufferedBodySize = 16 * 1024 * 1024
+
+# Returns (guid, entryType) for the given tar member name, or None if it is not an asset entry
+def parseEntryName(memberName):
+    parts = [x for x in memberName.replace('\\', '/').split('/') if x and x != '.']
+
+    if len(parts) != 2:
+        return None
+
+    return (parts[0], parts[1])
+
+def readPathName(fileObj):
+    # Newer versions of unity append extra lines after the path so only use the first line
+    pathName = fileObj.read().decode('utf-8').split('\n')[0].strip().replace('\\', '/')
+
+    assertThat(pathName.startswith('Assets/') and not os.path.isabs(pathName) and '..' not in pathName.split('/'),
+       "Found invalid pathname '{0}' in unity package", pathName)
+
+    return pathName
+
 class UnityPackageExtractor:
     _log = Inject('Logger')
     _sys = Inject('SystemHelper')
+    _config = Inject('Config')
+    _varMgr = Inject('VarManager')
 
     # Returns the chosen name for the directory
     # If forcedName is given then this value is always forcedName
+    # If forcedName is given and that directory already exists (eg. when upgrading a release) then it is
+    # updated in place, so that only the files that actually changed are written
     def extractUnityPackage(self, packageRootDir, unityPackagePath, fallbackName, forcedName):
 
         fileName = os.path.basename(unityPackagePath)
 
         with self._log.heading("Extracting '{0}'", fileName):
             self._log.debug("Extracting unity package at path '{0}'", unityPackagePath)
-            tempDir = tempfile.mkdtemp()
-            self._log.info("Using temp directory '{0}'", tempDir)
 
-            try:
-                self._sys.createDirectory(os.path.join(tempDir, 'ProjectSettings'))
-                self._sys.createDirectory(os.path.join(tempDir, 'Assets'))
+            if not self.canExtractFromStream():
+                return self._extractUsingUnity(packageRootDir, unityPackagePath, fallbackName, forcedName)
+
+            with open(unityPackagePath, 'rb') as inputStream:
+                return self._extractFromStream(packageRootDir, inputStream, fallbackName, forcedName)
+
+    # This is false when configured to extract by running unity, which requires a file on disk
+    def canExtractFromStream(self):
+        return not self._config.tryGetBool(False, 'UnityPackageExtraction', 'UseUnity')
+
+    # Same as extractUnityPackage except reads the gzip'd tar data from the given file object
+    # This reads the stream sequentially so can be used directly on things like http responses
+    def extractUnityPackageFromStream(self, packageRootDir, inputStream, fallbackName, forcedName):
+        assertThat(self.canExtractFromStream())
+
+        with self._log.heading("Extracting '{0}'", fallbackName):
+            return self._extractFromStream(packageRootDir, inputStream, fallbackName, forcedName)
+
+    def _extractFromStream(self, packageRootDir, inputStream, fallbackName, forcedName):
+        packageRootDir = self._varMgr.expandPath(packageRootDir)
+        self._sys.createDirectory(packageRootDir)
+
+        # Use the same name to look for the existing directory as the one that is chosen at the end
+        forcedName = self._getValidForcedName(forcedName)
+
+        # Extract into a directory beside the final location so that we can just rename
+        # the chosen directory at the end instead of copying everything
+        stagingDir = tempfile.mkdtemp(prefix='.projeny_extract_', dir=packageRootDir)
+        self._log.debug("Using staging directory '{0}'", stagingDir)
+
+        # When updating an existing directory, the bodies that are the same as an existing file are not
+        # written at all, and only an empty placeholder is left in the staging directory
+        existingDir = os.path.join(packageRootDir, forcedName) if forcedName else None
+
+        if existingDir and self._shouldUpdateInPlace(existingDir, forcedName):
+            existingFiles = _ExistingFileIndex(existingDir)
+        else:
+            existingFiles = None
+
+        try:
+            numAssets, unchangedFiles = self._extractEntries(inputStream, stagingDir, existingFiles)
+
+            # The tar reader can stop before the end of the stream (eg. before the gzip trailer)
+            # Read the rest before moving anything into place, so that streams that verify their
+            # contents when they reach the end get the chance to do so
+            while inputStream.read(_CopyBufferSize):
+                pass
+
+            self._log.debug("Extracted {0} assets", numAssets)
+
+            assetsDir = os.path.join(stagingDir, 'Assets')
+            assertThat(os.path.isdir(assetsDir), "Could not find any assets in unity package")
+
+            dirToMove = self._chooseDirToCopy(assetsDir)
+            newPackageName = self._getNewPackageName(dirToMove, fallbackName, forcedName)
+
+            outDirPath = os.path.join(packageRootDir, newPackageName)
+
+            if self._shouldUpdateInPlace(outDirPath, forcedName):
+                self._updateDirectoryInPlace(dirToMove, outDirPath, unchangedFiles)
+            else:
+                assertThat(not os.path.exists(outDirPath), "Expected directory '{0}' to not exist", outDirPath)
+                # Placeholders are only written when the existing directory is there to update
+                if len(unchangedFiles) > 0:
+                    raise Exception("Expected to update directory '{0}' in place but it was not found".format(outDirPath))
 
-                self._sys.executeAndWait('"[UnityExePath]" -batchmode -nographics -quit -projectPath "{0}" -importPackage "{1}"'.format(tempDir, unityPackagePath))
+                os.rename(dirToMove, outDirPath)
 
-                with self._log.heading("Copying extracted results to output directory"):
-                    assetsDir = os.path.join(tempDir, 'Assets')
-                    # If the unitypackage only contains a single directory, then extract that instead
-                    # To avoid ending up with PackageName/PackageName directories for everything
-                    dirToCopy = self._chooseDirToCopy(assetsDir)
+            return newPackageName
+        finally:
+            self._log.debug("Deleting staging directory '{0}'", stagingDir)
+            shutil.rmtree(stagingDir, ignore_errors=True)
 
-                    dirToCopyName = os.path.basename(dirToCopy)
+    # Unity packages are a gzip'd tar containing <guid>/asset, <guid>/asset.meta and <guid>/pathname for every asset
+    # The entries for a given guid can appear in any order, so bodies that arrive before their pathname are
+    # written to a pending file and moved once the pathname is known
+    # Returns a tuple of (numAssets, unchangedFiles) where unchangedFiles is a dictionary of placeholder
+    # path -> list of existing files with the same contents
+    def _extractEntries(self, inputStream, stagingDir, existingFiles):
+        pendingDir = os.path.join(stagingDir, 'Pending')
+        os.makedirs(pendingDir)
 
-                    assertThat(not self._isSpecialFolderName(dirToCopyName))
+        pathNames = {}
+        pendingFiles = {}
+        guidsWithAssets = set()
+        unchangedFiles = {}
 
-                    # If the extracted package contains a single directory, then by default use that directory as the name for the package
-                    # This is nice for packages that assume some directory structure (eg. UnityTestTools)
-                    # Also, some packages have titles that aren't as nice as directories.  For example, Unity Test Tools uses the directory name UnityTestTools
-                    # which is a bit nicer (though adds a bit of confusion since the release name doesn't match)
-                    # Note that for upgrading/downgrading, this doesn't matter because it uses the ID which is stored in the ProjenyInstall.yaml file
-                    if not forcedName and (dirToCopyName.lower() != 'assets' and dirToCopyName.lower() != 'plugins'):
-                        forcedName = dirToCopyName
+        with openTarStream(inputStream) as tar:
+            for member in tar:
+                parsed = parseEntryName(member.name)
 
-                    if forcedName:
-                        newPackageName = forcedName
+                if parsed == None:
+                    continue
+
+                guid, entryType = parsed
+
+                if entryType == 'pathname':
+                    assertThat(member.isfile())
+                    pathName = readPathName(tar.extractfile(member))
+                    pathNames[guid] = pathName
+
+                    self._createAssetDirectory(stagingDir, pathName)
+
+                    for pendingType, pendingPath in pendingFiles.pop(guid, []):
+                        outPath = self._getOutputPath(stagingDir, pathName, pendingType)
+                        os.rename(pendingPath, outPath)
+
+                        if pendingPath in unchangedFiles:
+                            unchangedFiles[outPath] = unchangedFiles.pop(pendingPath)
+
+                elif entryType in ('asset', 'asset.meta'):
+                    assertThat(member.isfile())
+
+                    if entryType == 'asset':
+                        guidsWithAssets.add(guid)
+
+                    if guid in pathNames:
+                        outPath = self._getOutputPath(stagingDir, pathNames[guid], entryType)
+                    else:
+                        outPath = os.path.join(pendingDir, '{0}.{1}'.format(guid, entryType))
+                        pendingFiles.setdefault(guid, []).append((entryType, outPath))
+
+                    # Only bodies with the same size as an existing file can be unchanged, so write the rest directly
+                    if existingFiles and existingFiles.hasFileWithSize(member.size):
+                        matchingPaths = self._writeBodyIfChanged(tar.extractfile(member), member.size, outPath, existingFiles)
+
+                        if matchingPaths:
+                            unchangedFiles[outPath] = matchingPaths
                     else:
-                        assertThat(fallbackName)
-                        newPackageName = fallbackName
+                        with open(outPath, 'wb') as outFile:
+                            shutil.copyfileobj(tar.extractfile(member), outFile, _CopyBufferSize)
+
+        assertThat(len(pendingFiles) == 0, "Found assets in unity package with missing pathname entries: {0}", ', '.join(pendingFiles.keys()))
+
+        # Entries without an asset body are folders
+        for guid, pathName in pathNames.items():
+            if guid not in guidsWithAssets:
+                self._sys.createDirectory(os.path.join(stagingDir, pathName))
+
+        return (len(pathNames), unchangedFiles)
+
+    # Hashes the body as it is read and only writes it to outPath when no existing file has the same contents
+    # Otherwise an empty placeholder is written and the list of existing files with the same contents is returned
+    def _writeBodyIfChanged(self, fileObj, size, outPath, existingFiles):
+        hasher = hashlib.sha1()
+
+        with tempfile.SpooledTemporaryFile(max_size=_MaxBufferedBodySize, dir=os.path.dirname(outPath)) as bodyBuffer:
+            while True:
+                chunk = fileObj.read(_CopyBufferSize)
+
+                if not chunk:
+                    break
+
+                hasher.update(chunk)
+                bodyBuffer.write(chunk)
+
+            matchingPaths = existingFiles.getPathsWithContents(size, hasher.digest())
+
+            with open(outPath, 'wb') as outFile:
+                if not matchingPaths:
+                    bodyBuffer.seek(0)
+                    shutil.copyfileobj(bodyBuffer, outFile, _CopyBufferSize)
+
+        return matchingPaths
+
+    def _createAssetDirectory(self, stagingDir, pathName):
+        # Folder assets only have a meta file, so make sure the directory exists for those too
+        self._sys.createDirectory(os.path.dirname(os.path.join(stagingDir, pathName)))
+
+    def _getOutputPath(self, stagingDir, pathName, entryType):
+        outPath = os.path.join(stagingDir, pathName)
+
+        if entryType == 'asset.meta':
+            return outPath + '.meta'
+
+        return outPath
 
-                    newPackageName = self._sys.convertToValidFileName(newPackageName)
+    def _getNewPackageName(self, dirToCopy, fallbackName, forcedName):
+        dirToCopyName = os.path.basename(dirToCopy)
 
-                    assertThat(not self._isSpecialFolderName(newPackageName))
+        assertThat(not self._isSpecialFolderName(dirToCopyName))
 
-                    outDirPath = os.path.join(packageRootDir, newPackageName)
+        # If the extracted package contains a single directory, then by default use that directory as the name for the package
+        # This is nice for packages that assume some directory structure (eg. UnityTestTools)
+        # Also, some packages have titles that aren't as nice as directories.  For example, Unity Test Tools uses the directory name UnityTestTools
+        # which is a bit nicer (though adds a bit of confusion since the release name doesn't match)
+        # Note that for upgrading/downgrading, this doesn't matter because it uses the ID which is stored in the ProjenyInstall.yaml file
+        if not forcedName and (dirToCopyName.lower() != 'assets' and dirToCopyName.lower() != 'plugins'):
+            forcedName = dirToCopyName
+
+        if forcedName:
+            newPackageName = forcedName
+        else:
+            assertThat(fallbackName)
+            newPackageName = fallbackName
+
+        newPackageName = self._sys.convertToValidFileName(newPackageName)
+
+        assertThat(not self._isSpecialFolderName(newPackageName))
+
+        return newPackageName
+
+    def _getValidForcedName(self, forcedName):
+        if not forcedName:
+            return forcedName
+
+        return self._sys.convertToValidFileName(forcedName)
+
+    def _extractUsingUnity(self, packageRootDir, unityPackagePath, fallbackName, forcedName):
+        forcedName = self._getValidForcedName(forcedName)
+
+        tempDir = tempfile.mkdtemp()
+        self._log.info("Using temp directory '{0}'", tempDir)
+
+        try:
+            self._sys.createDirectory(os.path.join(tempDir, 'ProjectSettings'))
+            self._sys.createDirectory(os.path.join(tempDir, 'Assets'))
+
+            self._sys.executeAndWait('"[UnityExePath]" -batchmode -nographics -quit -projectPath "{0}" -importPackage "{1}"'.format(tempDir, unityPackagePath))
+
+            with self._log.heading("Copying extracted results to output directory"):
+                assetsDir = os.path.join(tempDir, 'Assets')
+                # If the unitypackage only contains a single directory, then extract that instead
+                # To avoid ending up with PackageName/PackageName directories for everything
+                dirToCopy = self._chooseDirToCopy(assetsDir)
+
+                newPackageName = self._getNewPackageName(dirToCopy, fallbackName, forcedName)
+
+                outDirPath = os.path.join(packageRootDir, newPackageName)
+
+                if self._shouldUpdateInPlace(outDirPath, forcedName):
+                    self._updateDirectoryInPlace(dirToCopy, outDirPath)
+                else:
                     self._sys.copyDirectory(dirToCopy, outDirPath)
 
-                    return newPackageName
-            finally:
-                self._log.debug("Deleting temporary directory", tempDir)
-                shutil.rmtree(tempDir)
+                return newPackageName
+        finally:
+            self._log.debug("Deleting temporary directory", tempDir)
+            shutil.rmtree(tempDir)
+
+    def _shouldUpdateInPlace(self, outDirPath, forcedName):
+        # Only update existing directories that we were explicitly asked to install into, so that
+        # we never merge into an unrelated package that happens to have the same name
+        return forcedName != None and os.path.isdir(outDirPath) and os.path.basename(outDirPath) == forcedName
+
+    # Makes existingDir match newDir by moving over only the files that are new or have different contents,
+    # and deleting the ones that are no longer there
+    # Unchanged files are left alone so that they keep their modification times and Unity does not re-import them
+    # unchangedFiles is a dictionary of placeholder path in newDir -> list of files in existingDir with the same
+    # contents, for the files that were already found to be unchanged during extraction
+    def _updateDirectoryInPlace(self, newDir, existingDir, unchangedFiles = None):
+        with self._log.heading("Updating existing directory '{0}'", existingDir):
+            newFiles = set()
+            newDirs = set()
+            numChanged = 0
+            numUnchanged = 0
+            numRemoved = 0
+
+            keptFiles = self._resolveUnchangedFiles(newDir, existingDir, unchangedFiles or {})
+
+            for root, dirs, files in os.walk(newDir):
+                relRoot = os.path.relpath(root, newDir)
+                existingRoot = os.path.normpath(os.path.join(existingDir, relRoot))
+
+                newDirs.add(os.path.normcase(os.path.normpath(relRoot)))
+
+                if os.path.isfile(existingRoot):
+                    os.remove(existingRoot)
+
+                self._sys.createDirectory(existingRoot)
+
+                for fileName in files:
+                    newPath = os.path.join(root, fileName)
+                    existingPath = os.path.join(existingRoot, fileName)
+
+                    newFiles.add(os.path.normcase(os.path.normpath(os.path.join(relRoot, fileName))))
+
+                    if self._normalizePath(newPath) in keptFiles:
+                        numUnchanged += 1
+                        continue
+
+                    if os.path.isfile(existingPath) and filecmp.cmp(newPath, existingPath, shallow=False):
+                        numUnchanged += 1
+                        continue
+
+                    if os.path.isdir(existingPath):
+                        shutil.rmtree(existingPath)
+                    elif os.path.exists(existingPath):
+                        os.remove(existingPath)
+
+                    # Use move instead of rename since the unity fallback extracts to a different drive
+                    shutil.move(newPath, existingPath)
+                    numChanged += 1
+
+            # Go bottom up so that directories are empty by the time we get to them
+            for root, dirs, files in os.walk(existingDir, topdown=False):
+                relRoot = os.path.relpath(root, existingDir)
+
+                for fileName in files:
+                    if os.path.normcase(os.path.normpath(os.path.join(relRoot, fileName))) not in newFiles:
+                        os.remove(os.path.join(root, fileName))
+                        numRemoved += 1
+
+                for dirName in dirs:
+                    if os.path.normcase(os.path.normpath(os.path.join(relRoot, dirName))) not in newDirs:
+                        shutil.rmtree(os.path.join(root, dirName), ignore_errors=True)
+
+            self._log.info("Wrote {0} changed files, removed {1} files, and left {2} files unchanged", numChanged, numRemoved, numUnchanged)
+
+    # Returns the set of placeholder paths whose existing file is already at the right location
+    # Placeholders whose contents were found somewhere else in the existing directory (eg. a file that
+    # moved) are filled in from there, before anything in the existing directory changes
+    def _resolveUnchangedFiles(self, newDir, existingDir, unchangedFiles):
+        keptFiles = set()
+
+        for placeholderPath, matchingPaths in unchangedFiles.items():
+            relPath = os.path.relpath(placeholderPath, newDir)
+
+            # Placeholders outside of the chosen directory are not part of the package
+            if relPath.startswith(os.pardir):
+                continue
+
+            existingPath = self._normalizePath(os.path.join(existingDir, relPath))
+
+            if existingPath in [self._normalizePath(x) for x in matchingPaths]:
+                keptFiles.add(self._normalizePath(placeholderPath))
+            else:
+                shutil.copyfile(matchingPaths[0], placeholderPath)
+
+        return keptFiles
+
+    def _normalizePath(self, path):
+        return os.path.normcase(os.path.normpath(path))
 
     def _isSpecialFolderName(self, dirName):
         dirNameLower = dirName.lower()
@@ -104,6 +426,48 @@ class UnityPackageExtractor:
 
         return startDir
 
+class _ExistingFileIndex:
+    '''
+    Finds the files in a previously extracted package directory that have the same contents as a new entry
+    Files are only hashed once an entry with the same size is found, since nothing else can match them
+    '''
+    def __init__(self, rootDir):
+        self._unhashedPathsBySize = {}
+        self._pathsByContents = {}
+        self._sizes = set()
+
+        for root, dirs, files in os.walk(rootDir):
+            for fileName in files:
+                path = os.path.join(root, fileName)
+                size = os.path.getsize(path)
+
+                self._unhashedPathsBySize.setdefault(size, []).append(path)
+                self._sizes.add(size)
+
+    def hasFileWithSize(self, size):
+        return size in self._sizes
+
+    # Returns a list of the existing files with the given size and sha1 digest
+    def getPathsWithContents(self, size, digest):
+        for path in self._unhashedPathsBySize.pop(size, []):
+            self._pathsByContents.setdefault((size, self._computeHash(path)), []).append(path)
+
+        return self._pathsByContents.get((size, digest), [])
+
+    def _computeHash(self, path):
+        hasher = hashlib.sha1()
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(_CopyBufferSize)
+
+                if not chunk:
+                    break
+
+                hasher.update(chunk)
+
+        return hasher.digest()
+
 if __name__ == '__main__':
     Container.bind('Config').toSingle(Config, [])
     Container.bind('Logger').toSingle(Logger)
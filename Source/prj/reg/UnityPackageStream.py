@@ -0,0 +1,123 @@
+import struct
+import tarfile
+import zlib
+import contextlib
+
+from mtm.util.Assert import *
+
+# Size of the compressed chunks read from the input stream
+_ReadChunkSize = 1024 * 1024
+
+# The most data that is decompressed at once, so that memory use stays bounded no matter how well
+# the input compresses
+_MaxDecompressedChunkSize = 1024 * 1024
+
+# Context manager that returns a tarfile that reads the entries of the gzip'd tar in the given stream sequentially
+# The gzip trailer is checked when the context exits without an error
+@contextlib.contextmanager
+def openTarStream(inputStream):
+    # The gzip support in tarfile's stream mode decompresses the extra header field instead of skipping
+    # it, which fails for packages with asset store info in the header, so do the decompression ourselves
+    reader = _GzipStreamReader(inputStream)
+
+    with tarfile.open(fileobj=reader, mode='r|') as tar:
+        yield tar
+
+    # The tar reader stops at the end of archive marker, so read the rest to get to the trailer
+    reader.readToEnd()
+
+class _GzipStreamReader:
+    '''
+    File-like object that decompresses a gzip stream as it is read
+    '''
+    def __init__(self, inputStream):
+        self._inputStream = inputStream
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._buffer = b''
+        self._offset = 0
+        self._crc = 0
+        self._numBytes = 0
+        self._hasCheckedTrailer = False
+        self._readHeader()
+
+    def _readExactly(self, numBytes):
+        data = self._inputStream.read(numBytes)
+        assertThat(len(data) == numBytes, "Unexpected end of unity package")
+        return data
+
+    def _readHeader(self):
+        magic, method, flags = struct.unpack('<HBB', self._readExactly(4))
+
+        assertThat(magic == 0x8b1f and method == 8, "Invalid .unitypackage file")
+
+        # Modification time, extra flags and OS
+        self._readExactly(6)
+
+        if flags & 4:
+            self._readExactly(struct.unpack('<H', self._readExactly(2))[0])
+
+        # File name and comment are both null terminated
+        for flag in (8, 16):
+            if flags & flag:
+                while self._readExactly(1) != b'\0':
+                    pass
+
+        if flags & 2:
+            self._readExactly(2)
+
+    def read(self, size = -1):
+        parts = []
+        numBytes = 0
+
+        while size < 0 or numBytes < size:
+            if self._offset >= len(self._buffer) and not self._fillBuffer():
+                break
+
+            numAvailable = len(self._buffer) - self._offset
+            numToTake = numAvailable if size < 0 else min(size - numBytes, numAvailable)
+
+            parts.append(self._buffer[self._offset:self._offset + numToTake])
+            self._offset += numToTake
+            numBytes += numToTake
+
+        return b''.join(parts)
+
+    def readToEnd(self):
+        while self._fillBuffer():
+            pass
+
+    # Returns false when there is nothing left to decompress
+    def _fillBuffer(self):
+        while not self._decompressor.eof:
+            # Anything left over from the last chunk has to be decompressed before reading more
+            data = self._decompressor.unconsumed_tail
+
+            if not data:
+                data = self._inputStream.read(_ReadChunkSize)
+                assertThat(data, "Unexpected end of unity package")
+
+            self._buffer = self._decompressor.decompress(data, _MaxDecompressedChunkSize)
+            self._offset = 0
+
+            self._crc = zlib.crc32(self._buffer, self._crc)
+            self._numBytes += len(self._buffer)
+
+            if self._buffer:
+                return True
+
+        if not self._hasCheckedTrailer:
+            self._hasCheckedTrailer = True
+            self._checkTrailer()
+
+        return False
+
+    def _checkTrailer(self):
+        trailer = self._decompressor.unused_data[:8]
+
+        if len(trailer) < 8:
+            trailer += self._readExactly(8 - len(trailer))
+
+        crc, numBytes = struct.unpack('<II', trailer)
+
+        assertThat(crc == self._crc and numBytes == self._numBytes & 0xFFFFFFFF,
+            "Unity package is corrupt - the data does not match the checksum in the gzip trailer")
@@ -0,0 +1,168 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+import urllib.request
+
+import mtm.ioc.Container as Container
+from mtm.ioc.Inject import Inject
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.Config import Config
+from mtm.log.Logger import Logger
+from mtm.util.VarManager import VarManager
+from mtm.util.SystemHelper import SystemHelper
+
+from prj.main.ReleaseFileServer import ReleaseFileServer
+from prj.reg.ReleaseDownloadCache import ReleaseDownloadCache, CorruptDownloadException
+from prj.reg.ReleaseInfo import ReleaseInfo
+
+from mtm.util.Assert import *
+
+class TestReleaseDownloadCache(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.mkdtemp()
+        serverDir = os.path.join(self._tempDir, 'Server')
+        os.makedirs(serverDir)
+
+        self._packageData = os.urandom(3 * 1024 * 1024 + 5)
+
+        with open(os.path.join(serverDir, 'A.unitypackage'), 'wb') as f:
+            f.write(self._packageData)
+
+        Container.clear()
+
+        config = {
+            'PathVars': {
+                'ProjenyCacheDir': os.path.join(self._tempDir, 'Cache'),
+            }
+        }
+
+        Container.bind('Config').toSingle(Config, [config])
+        Container.bind('Logger').toSingle(Logger)
+        Container.bind('VarManager').toSingle(VarManager)
+        Container.bind('SystemHelper').toSingle(SystemHelper)
+        Container.bind('ReleaseFileServer').toSingle(ReleaseFileServer)
+        Container.bind('ReleaseDownloadCache').toSingle(ReleaseDownloadCache)
+
+        self._server = Container.resolve('ReleaseFileServer')
+        self._server.start(serverDir, '127.0.0.1', 0)
+
+        self._cache = Container.resolve('ReleaseDownloadCache')
+
+    def tearDown(self):
+        self._server.stop()
+        Container.clear()
+        shutil.rmtree(self._tempDir, ignore_errors=True)
+
+    def _createRelease(self, versionCode, sha256 = None):
+        info = ReleaseInfo()
+        info.id = 'A'
+        info.name = 'A'
+        info.versionCode = versionCode
+        info.url = 'http://127.0.0.1:{0}/A.unitypackage'.format(self._server._server.server_address[1])
+        info.compressedSize = len(self._packageData)
+        info.sha256 = sha256 or hashlib.sha256(self._packageData).hexdigest()
+        return info
+
+    # Leaves a partial download behind for the given release, as if an earlier download was interrupted
+    def _writePartialDownload(self, releaseInfo, data, validator):
+        partPath = self._cache._getCachePath(releaseInfo) + '.part'
+        Container.resolve('SystemHelper').makeMissingDirectoriesInPath(partPath)
+
+        with open(partPath, 'wb') as f:
+            f.write(data)
+
+        if validator:
+            with open(partPath + '.validator', 'w') as f:
+                f.write(validator)
+
+        return partPath
+
+    def _readFile(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _getServerETag(self, releaseInfo):
+        with urllib.request.urlopen(releaseInfo.url) as response:
+            return response.headers['ETag']
+
+    def testDownloadIsCached(self):
+        releaseInfo = self._createRelease(1)
+
+        path = self._cache.getPackagePath(releaseInfo)
+        assertIsEqual(self._readFile(path), self._packageData)
+
+        self._server.stop()
+
+        # Should not need the server any more
+        assertIsEqual(self._cache.getPackagePath(releaseInfo), path)
+        assertIsEqual(self._cache.processPackage(releaseInfo, lambda f: f.read()), self._packageData)
+
+    def testProcessWhileDownloading(self):
+        releaseInfo = self._createRelease(1)
+
+        assertIsEqual(self._cache.processPackage(releaseInfo, lambda f: f.read(1000)), self._packageData[:1000])
+
+        # The rest is still downloaded after the handler is done with it
+        assertIsEqual(self._readFile(self._cache._getCachePath(releaseInfo)), self._packageData)
+
+    def testResumesPartialDownload(self):
+        # Use different data from the real file to make sure that only the rest of the file was requested
+        partData = bytes(len(self._packageData) // 2)
+        expectedData = partData + self._packageData[len(partData):]
+
+        releaseInfo = self._createRelease(1, sha256 = hashlib.sha256(expectedData).hexdigest())
+        partPath = self._writePartialDownload(releaseInfo, partData, self._getServerETag(releaseInfo))
+
+        path = self._cache.getPackagePath(releaseInfo)
+
+        assertIsEqual(self._readFile(path), expectedData)
+        assertThat(not os.path.exists(partPath))
+        assertThat(not os.path.exists(partPath + '.validator'))
+
+    def testRestartsWhenFileChangedOnServer(self):
+        releaseInfo = self._createRelease(1)
+        self._writePartialDownload(releaseInfo, bytes(1000), '"old"')
+
+        assertIsEqual(self._readFile(self._cache.getPackagePath(releaseInfo)), self._packageData)
+
+    def testRestartsWhenPartialDownloadIsTooBig(self):
+        releaseInfo = self._createRelease(1)
+        self._writePartialDownload(releaseInfo, bytes(len(self._packageData) + 10), None)
+
+        # The server responds with 416 to this one
+        assertIsEqual(self._readFile(self._cache.getPackagePath(releaseInfo)), self._packageData)
+
+    def testCorruptDownload(self):
+        releaseInfo = self._createRelease(1, sha256 = '0' * 64)
+        cachePath = self._cache._getCachePath(releaseInfo)
+
+        assertRaisesAny(lambda: self._cache.getPackagePath(releaseInfo))
+
+        # Nothing should be kept, so that the next attempt does not resume from bad data
+        assertThat(not os.path.exists(cachePath))
+        assertThat(not os.path.exists(cachePath + '.part'))
+
+    def testConcurrentDownloads(self):
+        releaseInfo = self._createRelease(1)
+        results = []
+
+        def run():
+            results.append(self._cache.processPackage(releaseInfo, lambda f: f.read()))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assertIsEqual(results, [self._packageData] * 4)
+        assertIsEqual(self._readFile(self._cache._getCachePath(releaseInfo)), self._packageData)
+
+if __name__ == '__main__':
+    unittest.main()
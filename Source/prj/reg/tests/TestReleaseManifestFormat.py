@@ -0,0 +1,62 @@
+import gzip
+import unittest
+from datetime import datetime
+
+from prj.reg.ReleaseInfo import ReleaseInfo, AssetStoreInfo
+import prj.reg.ReleaseInfo as ReleaseInfoUtil
+import prj.reg.ReleaseManifestFormat as ReleaseManifestFormat
+
+from mtm.util.Assert import *
+
+class TestReleaseManifestFormat(unittest.TestCase):
+    def _createReleases(self):
+        first = ReleaseInfo()
+        first.name = 'First'
+        first.id = 'first-id'
+        first.versionCode = 3
+        first.version = '1.3'
+        first.localPath = 'First.unitypackage'
+        first.compressedSize = 1000
+        first.sha256 = 'ab' * 32
+        first.fileModificationDate = datetime(2016, 1, 2, 3, 4, 5, 600)
+
+        second = ReleaseInfo()
+        second.name = 'Second é'
+        second.id = 'second-id'
+        second.localPath = 'Sub/Second.unitypackage'
+        second.assetStoreInfo = AssetStoreInfo()
+        second.assetStoreInfo.publisherLabel = 'Publisher'
+        second.assetStoreInfo.publishDate = datetime(2015, 12, 31)
+
+        return [first, second]
+
+    def testRoundTrip(self):
+        releases = self._createReleases()
+
+        data = ReleaseManifestFormat.serializeCompact(releases)
+        result = ReleaseManifestFormat.deserializeCompact(data)
+
+        assertIsEqual([ReleaseInfoUtil.toJsonDict(x) for x in result], [ReleaseInfoUtil.toJsonDict(x) for x in releases])
+
+        assertIsEqual(result[0].fileModificationDate, datetime(2016, 1, 2, 3, 4, 5, 600))
+        assertIsEqual(result[1].versionCode, None)
+        assertIsEqual(result[1].assetStoreInfo.publishDate, datetime(2015, 12, 31))
+
+    def testEmpty(self):
+        assertIsEqual(ReleaseManifestFormat.deserializeCompact(ReleaseManifestFormat.serializeCompact([])), [])
+
+    def testIsDeterministic(self):
+        assertIsEqual(ReleaseManifestFormat.serializeCompact(self._createReleases()), ReleaseManifestFormat.serializeCompact(self._createReleases()))
+
+    def testTruncated(self):
+        lines = gzip.decompress(ReleaseManifestFormat.serializeCompact(self._createReleases())).splitlines()
+
+        assertRaisesAny(lambda: ReleaseManifestFormat.deserializeCompact(gzip.compress(b'\n'.join(lines[:-1]))))
+
+    def testUnsupportedVersion(self):
+        data = gzip.compress(b'{"version":999,"releaseCount":0}')
+
+        assertRaisesAny(lambda: ReleaseManifestFormat.deserializeCompact(data))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+from datetime import datetime
+
+import mtm.ioc.Container as Container
+from mtm.ioc.Inject import Inject
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.Config import Config
+from mtm.log.Logger import Logger
+from mtm.util.VarManager import VarManager
+from mtm.util.SystemHelper import SystemHelper
+import mtm.util.YamlSerializer as YamlSerializer
+
+from prj.main.ReleaseFileServer import ReleaseFileServer
+from prj.reg.RemoteServerReleaseSource import RemoteServerReleaseSource
+from prj.reg.ReleaseInfo import ReleaseInfo
+from prj.reg.UnityPackageExtractor import UnityPackageExtractor
+from prj.reg.ReleaseDownloadCache import CorruptDownloadException
+import prj.reg.ReleaseManifestFormat as ReleaseManifestFormat
+from prj.reg.tests.TestUnityPackageExtractor import createPackageData, TestAssets
+
+from mtm.util.Assert import *
+
+class _ReleaseManifest:
+    def __init__(self, releases):
+        self.releases = releases
+
+class _RecordingFileServer(ReleaseFileServer):
+    def __init__(self):
+        ReleaseFileServer.__init__(self)
+        self.requests = []
+
+    def logRequest(self, message):
+        self.requests.append(message)
+
+class TestRemoteServerReleaseSource(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.mkdtemp()
+        self._serverDir = os.path.join(self._tempDir, 'Server')
+        os.makedirs(self._serverDir)
+
+        self._server = None
+        self._bindAll()
+
+    def tearDown(self):
+        if self._server.isRunning():
+            self._server.stop()
+
+        Container.clear()
+        shutil.rmtree(self._tempDir, ignore_errors=True)
+
+    # Binds everything again, which is the same as starting a new run of Projeny
+    # The file server is kept running between runs
+    def _bindAll(self):
+        Container.clear()
+
+        config = {
+            'PathVars': {
+                'ProjenyCacheDir': os.path.join(self._tempDir, 'Cache'),
+            }
+        }
+
+        Container.bind('Config').toSingle(Config, [config])
+        Container.bind('Logger').toSingle(Logger)
+        Container.bind('VarManager').toSingle(VarManager)
+        Container.bind('SystemHelper').toSingle(SystemHelper)
+        Container.bind('UnityPackageExtractor').toSingle(UnityPackageExtractor)
+
+        if self._server == None:
+            Container.bind('ReleaseFileServer').toSingle(_RecordingFileServer)
+            self._server = Container.resolve('ReleaseFileServer')
+            self._server.start(self._serverDir, '127.0.0.1', 0)
+
+    def _getManifestUrl(self):
+        return 'http://127.0.0.1:{0}/{1}'.format(self._server._server.server_address[1], ReleaseManifestFormat.ReleaseManifestFileName)
+
+    def _createRelease(self, name, versionCode):
+        info = ReleaseInfo()
+        info.name = name
+        info.id = name
+        info.versionCode = versionCode
+        info.version = '1.{0}'.format(versionCode)
+        info.localPath = name + '.unitypackage'
+        info.compressedSize = 1234
+        info.fileModificationDate = datetime(2016, 1, 2, 3, 4, 5)
+        return info
+
+    # Writes the manifests with a modification time that is clearly newer than the previous ones
+    # Without the compact manifest this is the same as a server set up with an older version of ReleaseManifestUpdater
+    def _writeManifests(self, releases, includeCompact = True):
+        paths = [os.path.join(self._serverDir, ReleaseManifestFormat.ReleaseManifestFileName)]
+
+        with open(paths[0], 'w', encoding='utf-8') as f:
+            f.write(YamlSerializer.serialize(_ReleaseManifest(releases)))
+
+        if includeCompact:
+            paths.append(os.path.join(self._serverDir, ReleaseManifestFormat.CompactManifestFileName))
+
+            with open(paths[1], 'wb') as f:
+                f.write(ReleaseManifestFormat.serializeCompact(releases))
+
+        for path in paths:
+            newTime = os.stat(path).st_mtime + 10
+            os.utime(path, (newTime, newTime))
+
+    # Returns the status codes of the requests for the given file that were made during the last init
+    def _getRequestCodes(self, fileName):
+        return [x.split('" ')[1].split(' ')[0] for x in self._server.requests if ('/' + fileName + ' ') in x]
+
+    def _initSource(self):
+        del self._server.requests[:]
+
+        source = RemoteServerReleaseSource(self._getManifestUrl())
+        source.init()
+        return source
+
+    def testUnchangedManifestIsNotDownloadedAgain(self):
+        self._writeManifests([self._createRelease('A', 1)])
+
+        self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), ['200'])
+
+        self._bindAll()
+
+        source = self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), ['304'])
+        assertIsEqual([x.name for x in source.releases], ['A'])
+        assertIsEqual(source.releases[0].url, self._getManifestUrl().replace(ReleaseManifestFormat.ReleaseManifestFileName, 'A.unitypackage'))
+
+    def testChangedManifestIsDownloadedAgain(self):
+        self._writeManifests([self._createRelease('A', 1)])
+        self._initSource()
+
+        self._writeManifests([self._createRelease('A', 2), self._createRelease('C', 1)])
+        self._bindAll()
+
+        source = self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), ['200'])
+        assertIsEqual([(x.name, x.versionCode) for x in source.releases], [('A', 2), ('C', 1)])
+
+    def testFallsBackToYamlManifest(self):
+        self._writeManifests([self._createRelease('A', 1)], False)
+
+        source = self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), ['404'])
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.ReleaseManifestFileName), ['200'])
+        assertIsEqual([x.name for x in source.releases], ['A'])
+
+        # The compact manifest is not asked for again while the yaml manifest stays the same
+        self._bindAll()
+
+        source = self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), [])
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.ReleaseManifestFileName), ['304'])
+        assertIsEqual([x.name for x in source.releases], ['A'])
+
+    def testCompactManifestIsUsedOnceServerIsUpdated(self):
+        self._writeManifests([self._createRelease('A', 1)], False)
+        self._initSource()
+
+        self._writeManifests([self._createRelease('A', 2)])
+        self._bindAll()
+
+        # The first run after the change still only sees that the yaml manifest changed
+        source = self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), [])
+        assertIsEqual([x.versionCode for x in source.releases], [2])
+
+        self._bindAll()
+
+        source = self._initSource()
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.CompactManifestFileName), ['200'])
+        assertIsEqual(self._getRequestCodes(ReleaseManifestFormat.ReleaseManifestFileName), [])
+        assertIsEqual([x.versionCode for x in source.releases], [2])
+
+    def testUsesCachedManifestWhenServerIsDown(self):
+        self._writeManifests([self._createRelease('A', 1)])
+        url = self._getManifestUrl()
+
+        self._initSource()
+        self._server.stop()
+        self._bindAll()
+
+        source = RemoteServerReleaseSource(url)
+        source.init()
+        assertIsEqual([x.name for x in source.releases], ['A'])
+
+    def testFailsWhenServerIsDownWithoutCache(self):
+        url = self._getManifestUrl()
+        self._server.stop()
+
+        assertRaisesAny(lambda: RemoteServerReleaseSource(url).init())
+
+    # The download cache is not bound here, so the release is extracted directly from the response
+    def _installRelease(self, sha256):
+        data = createPackageData(TestAssets)
+
+        with open(os.path.join(self._serverDir, 'A.unitypackage'), 'wb') as f:
+            f.write(data)
+
+        releaseInfo = self._createRelease('A', 1)
+        releaseInfo.compressedSize = len(data)
+        releaseInfo.sha256 = sha256 or hashlib.sha256(data).hexdigest()
+
+        self._writeManifests([releaseInfo])
+
+        source = self._initSource()
+        return source.installRelease(os.path.join(self._tempDir, 'Packages'), source.releases[0], None)
+
+    def testInstallWithoutCache(self):
+        assertIsEqual(self._installRelease(None), 'Foo')
+        assertIsEqual(os.listdir(os.path.join(self._tempDir, 'Packages')), ['Foo'])
+
+    def testCorruptInstallWithoutCacheFails(self):
+        with self.assertRaises(CorruptDownloadException):
+            self._installRelease('0' * 64)
+
+        # Nothing should be left behind, including the staging directory
+        assertIsEqual(os.listdir(os.path.join(self._tempDir, 'Packages')), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import mtm.ioc.Container as Container
+from mtm.ioc.Inject import Inject
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.Config import Config
+from mtm.log.Logger import Logger
+from mtm.util.VarManager import VarManager
+from mtm.util.SystemHelper import SystemHelper
+import mtm.util.Util as Util
+
+from prj.reg.UnityPackageExporter import UnityPackageExporter, createHeaderInfo
+from prj.reg.UnityPackageExtractor import UnityPackageExtractor
+from prj.reg.UnityPackageAnalyzer import UnityPackageAnalyzer
+
+from mtm.util.Assert import *
+
+FooGuid = '0123456789abcdef0123456789abcdef'
+
+class TestUnityPackageExporter(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.mkdtemp()
+
+        Container.clear()
+        Container.bind('Config').toSingle(Config, [{}])
+        Container.bind('Logger').toSingle(Logger)
+        Container.bind('VarManager').toSingle(VarManager)
+        Container.bind('SystemHelper').toSingle(SystemHelper)
+        Container.bind('UnityPackageExporter').toSingle(UnityPackageExporter)
+        Container.bind('UnityPackageExtractor').toSingle(UnityPackageExtractor)
+        Container.bind('UnityPackageAnalyzer').toSingle(UnityPackageAnalyzer)
+
+        self._exporter = Container.resolve('UnityPackageExporter')
+        self._extractor = Container.resolve('UnityPackageExtractor')
+
+        self._packageDir = os.path.join(self._tempDir, 'Source', 'MyPackage')
+
+        self._writeFile('Foo.cs', b'class Foo {}')
+        self._writeFile('Foo.cs.meta', 'fileFormatVersion: 2\nguid: {0}\n'.format(FooGuid).encode('utf-8'))
+        self._writeFile('Sub/Bar.txt', b'bar')
+        self._writeFile('Sub/Empty/.hidden', b'ignored')
+        self._writeFile('Big.bytes', os.urandom(2 * 1024 * 1024))
+
+    def tearDown(self):
+        Container.clear()
+        shutil.rmtree(self._tempDir, ignore_errors=True)
+
+    def _writeFile(self, relativePath, data):
+        path = os.path.join(self._packageDir, relativePath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _readFile(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    # Returns a dictionary of relative path -> contents for every file in the given directory, and None for directories
+    def _getTree(self, rootDir):
+        result = {}
+
+        for root, dirs, files in os.walk(rootDir):
+            for name in dirs:
+                result[os.path.relpath(os.path.join(root, name), rootDir).replace('\\', '/')] = None
+
+            for name in files:
+                path = os.path.join(root, name)
+                result[os.path.relpath(path, rootDir).replace('\\', '/')] = self._readFile(path)
+
+        return result
+
+    def _export(self, headerInfo = None):
+        outputPath = os.path.join(self._tempDir, 'MyPackage.unitypackage')
+        sha256, numBytes = self._exporter.exportUnityPackage(self._packageDir, outputPath, headerInfo)
+
+        assertIsEqual(sha256, Util.computeFileSha256(outputPath))
+        assertIsEqual(numBytes, os.path.getsize(outputPath))
+
+        return outputPath
+
+    def testRoundTrip(self):
+        packagePath = self._export()
+
+        outputRoot = os.path.join(self._tempDir, 'Output')
+        packageName = self._extractor.extractUnityPackage(outputRoot, packagePath, 'Fallback', None)
+
+        # The name of the single directory inside the package is used
+        assertIsEqual(packageName, 'MyPackage')
+
+        sourceTree = self._getTree(self._packageDir)
+        outputTree = self._getTree(os.path.join(outputRoot, packageName))
+
+        for path, contents in sourceTree.items():
+            if path.startswith('Sub/Empty/'):
+                continue
+
+            assertIsEqual(outputTree[path], contents)
+
+        # Meta files are generated for everything that did not have one
+        assertThat('Sub/Bar.txt.meta' in outputTree)
+        assertThat('Sub.meta' in outputTree)
+        assertThat(b'folderAsset: yes' in outputTree['Sub.meta'])
+        assertThat('Sub/Empty/.hidden' not in outputTree)
+
+        # The staging directory should be gone
+        assertIsEqual(os.listdir(outputRoot), ['MyPackage'])
+
+    def testExportIsDeterministic(self):
+        firstPath = self._export()
+        firstData = self._readFile(firstPath)
+        fingerprint = self._exporter.computeFingerprint(self._packageDir)
+
+        assertIsEqual(self._readFile(self._export()), firstData)
+        assertIsEqual(self._exporter.computeFingerprint(self._packageDir), fingerprint)
+
+        self._writeFile('Sub/Bar.txt', b'changed')
+        assertThat(self._exporter.computeFingerprint(self._packageDir) != fingerprint)
+
+    def testHeaderInfo(self):
+        headerInfo = createHeaderInfo('my-id', 'My Package', '1.2', 12, datetime(2016, 5, 6))
+        packagePath = self._export(headerInfo)
+
+        analyzer = Container.resolve('UnityPackageAnalyzer')
+        releaseInfo = analyzer.getReleaseInfoFromUnityPackage(packagePath)
+
+        assertIsEqual(releaseInfo.id, 'my-id')
+        assertIsEqual(releaseInfo.name, 'My Package')
+        assertIsEqual(releaseInfo.versionCode, 12)
+
+        contents = analyzer.getContentsFromUnityPackage(packagePath)
+        fooEntry = [x for x in contents if x.pathName == 'Assets/MyPackage/Foo.cs'][0]
+
+        assertIsEqual(fooEntry.guid, FooGuid)
+        assertIsEqual(fooEntry.size, len(b'class Foo {}'))
+
+        # The header has to be skipped when extracting
+        packageName = self._extractor.extractUnityPackage(os.path.join(self._tempDir, 'Output'), packagePath, 'Fallback', 'Forced')
+        assertIsEqual(packageName, 'Forced')
+
+    def testFingerprintOnlyHashesChangedFiles(self):
+        hashedPaths = []
+        computeFileSha256 = Util.computeFileSha256
+
+        def recordHash(path):
+            hashedPaths.append(path)
+            return computeFileSha256(path)
+
+        Util.computeFileSha256 = recordHash
+
+        try:
+            first = self._exporter.computeFingerprint(self._packageDir)
+            assertIsEqual(len(hashedPaths), 3)
+
+            del hashedPaths[:]
+            assertIsEqual(self._exporter.computeFingerprint(self._packageDir), first)
+            assertIsEqual(hashedPaths, [])
+
+            self._writeFile('Sub/Bar.txt', b'changed')
+            barPath = os.path.join(self._packageDir, 'Sub', 'Bar.txt')
+            os.utime(barPath, ns=(0, 0))
+
+            assertThat(self._exporter.computeFingerprint(self._packageDir) != first)
+            assertIsEqual(hashedPaths, [barPath])
+        finally:
+            Util.computeFileSha256 = computeFileSha256
+
+if __name__ == '__main__':
+    unittest.main()
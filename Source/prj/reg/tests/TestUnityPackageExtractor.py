@@ -0,0 +1,247 @@
+import io
+import os
+import json
+import zlib
+import struct
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import unittest
+
+import mtm.ioc.Container as Container
+from mtm.ioc.Inject import Inject
+import mtm.ioc.IocAssertions as Assertions
+
+from mtm.config.Config import Config
+from mtm.log.Logger import Logger
+from mtm.util.VarManager import VarManager
+from mtm.util.SystemHelper import SystemHelper
+
+from prj.reg.UnityPackageExtractor import UnityPackageExtractor
+import prj.reg.UnityPackageStream as UnityPackageStream
+
+from mtm.util.Assert import *
+
+# Returns the bytes of a unitypackage with the given list of (pathName, contents) assets, where contents is None for folders
+# If headerInfo is given then it is stored in the gzip header the same way as the asset store does
+# If reverseEntries is true then the bodies of each asset come before its pathname
+def createPackageData(assets, headerInfo = None, reverseEntries = False):
+    tarData = io.BytesIO()
+
+    with tarfile.open(fileobj=tarData, mode='w', format=tarfile.GNU_FORMAT) as tar:
+        for pathName, contents in assets:
+            guid = hashlib.md5(pathName.encode('utf-8')).hexdigest()
+
+            entries = [
+                (guid + '/pathname', pathName.encode('utf-8')),
+                (guid + '/asset.meta', 'fileFormatVersion: 2\nguid: {0}\n'.format(guid).encode('utf-8')),
+            ]
+
+            if contents != None:
+                entries.append((guid + '/asset', contents))
+
+            if reverseEntries:
+                entries.reverse()
+
+            for name, data in entries:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    return compressGzip(tarData.getvalue(), headerInfo)
+
+def compressGzip(data, headerInfo = None):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    body = compressor.compress(data) + compressor.flush()
+
+    if headerInfo == None:
+        header = b'\x1f\x8b\x08\x00' + bytes(6)
+    else:
+        headerBytes = json.dumps(headerInfo).encode('utf-8')
+        header = b'\x1f\x8b\x08\x04' + bytes(6) + struct.pack('<H', len(headerBytes) + 4) + b'A$' + struct.pack('<H', len(headerBytes)) + headerBytes
+
+    return header + body + struct.pack('<II', zlib.crc32(data), len(data) & 0xFFFFFFFF)
+
+TestAssets = [
+    ('Assets/Foo', None),
+    ('Assets/Foo/A.cs', b'class A {}'),
+    ('Assets/Foo/Sub', None),
+    ('Assets/Foo/Sub/B.txt', b'b' * 100000),
+]
+
+class TestUnityPackageExtractor(unittest.TestCase):
+    def setUp(self):
+        self._tempDir = tempfile.mkdtemp()
+        self._packageRoot = os.path.join(self._tempDir, 'Packages')
+
+        Container.clear()
+        Container.bind('Config').toSingle(Config, [{}])
+        Container.bind('Logger').toSingle(Logger)
+        Container.bind('VarManager').toSingle(VarManager)
+        Container.bind('SystemHelper').toSingle(SystemHelper)
+        Container.bind('UnityPackageExtractor').toSingle(UnityPackageExtractor)
+
+        self._extractor = Container.resolve('UnityPackageExtractor')
+
+    def tearDown(self):
+        Container.clear()
+        shutil.rmtree(self._tempDir, ignore_errors=True)
+
+    def _readFile(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _extract(self, data, forcedName = None):
+        return self._extractor.extractUnityPackageFromStream(self._packageRoot, io.BytesIO(data), 'Fallback', forcedName)
+
+    def _assertExtracted(self, packageName):
+        packageDir = os.path.join(self._packageRoot, packageName)
+
+        assertIsEqual(self._readFile(os.path.join(packageDir, 'A.cs')), b'class A {}')
+        assertIsEqual(self._readFile(os.path.join(packageDir, 'Sub', 'B.txt')), b'b' * 100000)
+        assertThat(os.path.isfile(os.path.join(packageDir, 'A.cs.meta')))
+        assertThat(os.path.isfile(os.path.join(packageDir, 'Sub.meta')))
+
+        # The staging directory should be gone
+        assertIsEqual(os.listdir(self._packageRoot), [packageName])
+
+    def testExtract(self):
+        # The single directory inside the package is used as the name
+        packageName = self._extract(createPackageData(TestAssets))
+
+        assertIsEqual(packageName, 'Foo')
+        self._assertExtracted('Foo')
+
+        guid = hashlib.md5(b'Assets/Foo/A.cs').hexdigest()
+        assertThat(guid in self._readFile(os.path.join(self._packageRoot, 'Foo', 'A.cs.meta')).decode('utf-8'))
+
+    def testExtractFile(self):
+        packagePath = os.path.join(self._tempDir, 'Foo.unitypackage')
+
+        with open(packagePath, 'wb') as f:
+            f.write(createPackageData(TestAssets))
+
+        assertIsEqual(self._extractor.extractUnityPackage(self._packageRoot, packagePath, 'Fallback', 'Forced'), 'Forced')
+        self._assertExtracted('Forced')
+
+    def testAssetStoreHeader(self):
+        headerInfo = { 'id': '123', 'title': 'Foo', 'version': '1.0', 'version_id': '5' }
+
+        assertIsEqual(self._extract(createPackageData(TestAssets, headerInfo)), 'Foo')
+        self._assertExtracted('Foo')
+
+    def testBodiesBeforePathNames(self):
+        assertIsEqual(self._extract(createPackageData(TestAssets, reverseEntries = True)), 'Foo')
+        self._assertExtracted('Foo')
+
+    def testFallbackName(self):
+        assets = [('Assets/A.cs', b'a'), ('Assets/B.cs', b'b')]
+
+        assertIsEqual(self._extract(createPackageData(assets)), 'Fallback')
+        assertIsEqual(self._readFile(os.path.join(self._packageRoot, 'Fallback', 'B.cs')), b'b')
+
+    def testInvalidPathName(self):
+        assertRaisesAny(lambda: self._extract(createPackageData([('Assets/../../Outside.cs', b'a')])))
+        assertThat(not os.path.exists(os.path.join(self._tempDir, 'Outside.cs')))
+
+    def testCorruptChecksum(self):
+        data = bytearray(createPackageData(TestAssets))
+        data[-8] ^= 1
+
+        assertRaisesAny(lambda: self._extract(bytes(data)))
+
+        # Nothing should be moved into place
+        assertIsEqual(os.listdir(self._packageRoot), [])
+
+    def testTruncated(self):
+        data = createPackageData(TestAssets)
+
+        assertRaisesAny(lambda: self._extract(data[:len(data) // 2]))
+        assertRaisesAny(lambda: self._extract(data[:-4]))
+
+        assertIsEqual(os.listdir(self._packageRoot), [])
+
+    def _getModificationTime(self, path):
+        return os.stat(os.path.join(self._packageRoot, path)).st_mtime_ns
+
+    # Sets the modification time of every file in the package to zero, so that files that are written again can be told apart
+    def _resetModificationTimes(self, packageName):
+        for root, dirs, files in os.walk(os.path.join(self._packageRoot, packageName)):
+            for name in files:
+                os.utime(os.path.join(root, name), ns=(0, 0))
+
+    def testUpdateInPlace(self):
+        self._extract(createPackageData(TestAssets), 'Foo')
+        self._resetModificationTimes('Foo')
+
+        newAssets = [
+            ('Assets/Foo', None),
+            ('Assets/Foo/A.cs', b'class A { int x; }'),
+            ('Assets/Foo/Sub', None),
+            ('Assets/Foo/Sub/B.txt', b'b' * 100000),
+            ('Assets/Foo/C.cs', b'class C {}'),
+        ]
+
+        assertIsEqual(self._extract(createPackageData(newAssets), 'Foo'), 'Foo')
+
+        assertIsEqual(self._getModificationTime('Foo/Sub/B.txt'), 0)
+        assertIsEqual(self._getModificationTime('Foo/Sub/B.txt.meta'), 0)
+        assertThat(self._getModificationTime('Foo/A.cs') != 0)
+
+        assertIsEqual(self._readFile(os.path.join(self._packageRoot, 'Foo', 'A.cs')), b'class A { int x; }')
+        assertIsEqual(self._readFile(os.path.join(self._packageRoot, 'Foo', 'C.cs')), b'class C {}')
+        assertIsEqual(os.listdir(self._packageRoot), ['Foo'])
+
+    def testUpdateInPlaceRemovesOldFiles(self):
+        self._extract(createPackageData(TestAssets), 'Foo')
+        self._extract(createPackageData(TestAssets[:2]), 'Foo')
+
+        assertIsEqual(sorted(os.listdir(os.path.join(self._packageRoot, 'Foo'))), ['A.cs', 'A.cs.meta'])
+
+    def testUpdateInPlaceWithInvalidForcedName(self):
+        assertIsEqual(self._extract(createPackageData(TestAssets), 'Foo: Bar'), 'Foo Bar')
+        self._resetModificationTimes('Foo Bar')
+
+        assertIsEqual(self._extract(createPackageData(TestAssets), 'Foo: Bar'), 'Foo Bar')
+
+        assertIsEqual(self._getModificationTime('Foo Bar/Sub/B.txt'), 0)
+        assertIsEqual(os.listdir(self._packageRoot), ['Foo Bar'])
+
+    def testUpdateInPlaceWithMovedContents(self):
+        self._extract(createPackageData(TestAssets), 'Foo')
+
+        newAssets = [
+            ('Assets/Foo', None),
+            ('Assets/Foo/Moved', None),
+            ('Assets/Foo/Moved/B.txt', b'b' * 100000),
+            ('Assets/Foo/Moved/A.cs', b'class A {}'),
+        ]
+
+        self._extract(createPackageData(newAssets), 'Foo')
+
+        packageDir = os.path.join(self._packageRoot, 'Foo')
+
+        assertIsEqual(self._readFile(os.path.join(packageDir, 'Moved', 'B.txt')), b'b' * 100000)
+        assertIsEqual(self._readFile(os.path.join(packageDir, 'Moved', 'A.cs')), b'class A {}')
+        assertThat(not os.path.exists(os.path.join(packageDir, 'Sub')))
+        assertThat(not os.path.exists(os.path.join(packageDir, 'A.cs')))
+
+    def testDecompressedChunksAreBounded(self):
+        # Compresses to about 50kb
+        reader = UnityPackageStream._GzipStreamReader(io.BytesIO(compressGzip(bytes(50 * 1024 * 1024))))
+        numBytes = 0
+
+        while True:
+            chunk = reader.read(64 * 1024)
+
+            if not chunk:
+                break
+
+            assertThat(len(reader._buffer) <= UnityPackageStream._MaxDecompressedChunkSize)
+            numBytes += len(chunk)
+
+        assertIsEqual(numBytes, 50 * 1024 * 1024)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -38,6 +38,9 @@ namespace Projeny
         public string FileModificationDate;
         public long FileModificationDateTicks;
 
+        // Hash of the unitypackage file.  Can be empty if not known
+        public string Sha256;
+
         // Only non-empty if this release is pulled from the asset store
         public AssetStoreInfo AssetStoreInfo;
     }
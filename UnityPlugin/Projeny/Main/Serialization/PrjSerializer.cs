@@ -172,6 +172,7 @@ namespace Projeny.Internal
             newInfo.Version = info.Version;
             newInfo.LocalPath = info.LocalPath;
             newInfo.Url = info.Url;
+            newInfo.Sha256 = info.Sha256;
 
             Assert.That(!string.IsNullOrEmpty(info.Id));
             newInfo.Id = info.Id;
@@ -269,6 +270,12 @@ namespace Projeny.Internal
                 set;
             }
 
+            public string Sha256
+            {
+                get;
+                set;
+            }
+
             public AssetStoreInfoInternal AssetStoreInfo
             {
                 get;